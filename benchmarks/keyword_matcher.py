@@ -0,0 +1,76 @@
+"""
+HASS AI keyword matcher benchmark
+Compares the compiled keyword matcher with per-heuristic any() keyword chains on 50k entity_ids
+
+Usage: python benchmarks/keyword_matcher.py [entity_count]
+"""
+import importlib.util
+import random
+import sys
+import time
+from pathlib import Path
+
+KEYWORDS_PATH = Path(__file__).resolve().parent.parent / "custom_components" / "hass_ai" / "keywords.py"
+
+DOMAINS = ["sensor", "binary_sensor", "light", "switch", "climate", "cover", "update", "input_text"]
+FILLER_WORDS = ["kitchen", "living", "room", "zigbee", "shelly", "plug", "l1", "tv", "office", "hall", "main", "node"]
+
+
+def load_keywords_module():
+    # keywords.py has no Home Assistant imports, so it can be loaded on its own
+    spec = importlib.util.spec_from_file_location("hass_ai_keywords", KEYWORDS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_entity_ids(keywords_module, count: int) -> list:
+    random.seed(42)
+    words = sorted({keyword for keywords in keywords_module.KEYWORD_CLASSES.values() for keyword in keywords}) + FILLER_WORDS
+    return [
+        f"{random.choice(DOMAINS)}.{'_'.join(random.choice(words) for _ in range(random.randint(1, 4)))}_{index}"
+        for index in range(count)
+    ]
+
+
+def legacy_tags(keyword_classes: dict, entity_id: str) -> set:
+    # What the heuristics did before: lowercase and scan every keyword list with any()
+    entity_lower = entity_id.lower()
+    return {
+        class_name
+        for class_name, keywords in keyword_classes.items()
+        if any(keyword in entity_lower for keyword in list(keywords))
+    }
+
+
+def timed(label: str, function, entity_ids: list) -> float:
+    started = time.perf_counter()
+    for entity_id in entity_ids:
+        function(entity_id)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed:8.3f} s  {elapsed / len(entity_ids) * 1e6:7.2f} µs/entity")
+    return elapsed
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    keywords_module = load_keywords_module()
+    keyword_classes = keywords_module.KEYWORD_CLASSES
+    entity_ids = make_entity_ids(keywords_module, count)
+
+    mismatches = sum(
+        1 for entity_id in entity_ids[:5000]
+        if legacy_tags(keyword_classes, entity_id) != set(keywords_module.keyword_tags(entity_id))
+    )
+    keywords_module.keyword_tags.cache_clear()
+    print(f"{count} entity_ids, {len(keyword_classes)} keyword classes, {mismatches} mismatches in the first 5000\n")
+
+    legacy = timed("any() chains", lambda entity_id: legacy_tags(keyword_classes, entity_id), entity_ids)
+    cold = timed("compiled matcher (cold cache)", keywords_module.keyword_tags, entity_ids)
+    warm = timed("compiled matcher (warm cache)", keywords_module.keyword_tags, entity_ids)
+
+    print(f"\nSpeedup: {legacy / cold:.1f}x cold, {legacy / warm:.1f}x warm")
+
+
+if __name__ == "__main__":
+    main()
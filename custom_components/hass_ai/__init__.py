@@ -4,7 +4,7 @@ import logging
 import time
 from datetime import timedelta, datetime
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.components import frontend, websocket_api, http, conversation
 from homeassistant.components.conversation import async_get_agent
@@ -13,23 +13,65 @@ from homeassistant.helpers import storage, event
 from homeassistant.util import dt
 import voluptuous as vol
 
-from .const import DOMAIN, CONF_CONVERSATION_AGENT
+from .const import (
+    DOMAIN,
+    CONF_CONVERSATION_AGENT,
+    CONF_MAX_CONCURRENT_BATCHES,
+    CONF_PROMPT_TOKEN_BUDGET,
+    DEFAULT_MAX_CONCURRENT_BATCHES,
+    DEFAULT_PROMPT_TOKEN_BUDGET,
+    EXCLUDED_SCAN_DOMAINS,
+    BACKGROUND_SCAN_TICK_MINUTES,
+    CONF_SCAN_MODE,
+    CONF_GROUP_SIMILAR,
+    CONF_PROMPT_FORMAT,
+    DEFAULT_PROMPT_FORMAT,
+    CONF_RESPONSE_FORMAT,
+    DEFAULT_RESPONSE_FORMAT,
+    CONF_AGENT_POOL,
+    CONF_AGENT_MAX_CONCURRENT,
+    DEFAULT_AGENT_MAX_CONCURRENT,
+    DEFAULT_SCAN_MODE,
+    SCAN_MODE_HYBRID,
+    SCAN_MODES,
+    THRESHOLD_BATCH_MAX_ENTITIES,
+    THRESHOLD_CHECKPOINT_INTERVAL,
+    SCAN_CHECKPOINT_SAVE_DELAY,
+    AGENT_LANE_BACKGROUND,
+    AGENT_LANE_INTERACTIVE,
+)
 from .intelligence import get_entities_importance_batched
 from .services import async_setup_services, async_unload_services
 from .alert_monitor import AlertMonitor
+from .result_cache import RESULT_CACHE_KEY
+from .incremental import IncrementalScanner
+from .scheduler import BackgroundScanScheduler
+from .token_estimator import async_setup_token_estimator
+from .registry_index import async_track_registry_index
+from .threshold_queue import ThresholdWorkQueue, THRESHOLD_QUEUE_KEY
+from .jobs import JobManager, OperationJob, JOB_MANAGER_KEY
+from .request_scheduler import AgentRequestScheduler, AGENT_SCHEDULER_KEY
+from .agent_pool import AgentPool, AGENT_POOL_KEY
+from .circuit_breaker import get_circuit_breaker_status
+from .exceptions import AgentUnavailableError
 
 _LOGGER = logging.getLogger(__name__)
 STORAGE_VERSION = 1
 INTELLIGENCE_DATA_KEY = f"{DOMAIN}_intelligence_data"
 AI_RESULTS_KEY = f"{DOMAIN}_ai_results"
 CORRELATIONS_KEY = f"{DOMAIN}_correlations"
+THRESHOLD_CHECKPOINT_KEY = f"{DOMAIN}_threshold_checkpoint"
+SCAN_CHECKPOINT_KEY = f"{DOMAIN}_scan_checkpoint"
 PANEL_URL_PATH = "hass-ai-panel"
+STATIC_PATH_KEY = f"{DOMAIN}_static_path"  # hass.data flag: the static path survives entry reloads
 
 # Cache busting timestamp
 CACHE_BUSTER = int(time.time())  # v1.9.37.1 - Multi-category frontend support
 
-# Global operation tracking
-_active_operations = {}  # Dict to track active operations by hass instance ID
+def _ai_results_lock(hass: HomeAssistant) -> asyncio.Lock:
+    """Lock serializing the load-modify-save updates of the stored AI results."""
+    entry_data = hass.data[DOMAIN][next(iter(hass.data[DOMAIN]))]
+    return entry_data.setdefault("ai_results_lock", asyncio.Lock())
 
 
 async def _save_ai_results(hass: HomeAssistant, results) -> None:
@@ -53,13 +95,124 @@ async def _save_ai_results(hass: HomeAssistant, results) -> None:
             # New format - use as is
             results_data = results
         
-        await ai_results_store.async_save(results_data)
+        async with _ai_results_lock(hass):
+            await ai_results_store.async_save(results_data)
         _LOGGER.debug(f"Saved AI analysis results for {results_data['total_entities']} entities")
         
     except Exception as e:
         _LOGGER.error(f"Error saving AI results: {e}")
 
 
+async def _merge_ai_results(hass: HomeAssistant, results: list) -> None:
+    """Merge AI results for some entities into the stored results."""
+    try:
+        ai_results_store = storage.Store(hass, STORAGE_VERSION, AI_RESULTS_KEY)
+        async with _ai_results_lock(hass):
+            results_data = await ai_results_store.async_load() or {"results": {}}
+            stored = results_data.setdefault("results", {})
+            analyzed_at = dt.utcnow().isoformat()
+            for result in results:
+                previous = stored.get(result["entity_id"], {})
+                merged = {**result, "analyzed_at": analyzed_at}
+                if "auto_thresholds" not in merged and "auto_thresholds" in previous:
+                    # Keep the thresholds until the queue has generated new ones
+                    merged["auto_thresholds"] = previous["auto_thresholds"]
+                stored[result["entity_id"]] = merged
+            results_data["total_entities"] = len(stored)
+
+            await ai_results_store.async_save(results_data)
+        _LOGGER.debug(f"Merged AI results for {len(results)} entities ({len(stored)} stored)")
+
+        entry_id = next(iter(hass.data[DOMAIN]))
+        alert_monitor = hass.data[DOMAIN][entry_id].get("alert_monitor")
+        if alert_monitor:
+            await alert_monitor.update_monitored_entities(stored)
+
+    except Exception as e:
+        _LOGGER.error(f"Error merging AI results: {e}")
+
+
+async def _merge_auto_thresholds(hass: HomeAssistant, updates: dict) -> None:
+    """Store thresholds generated in the background into the stored and cached AI results."""
+    try:
+        cache = hass.data.get(RESULT_CACHE_KEY)
+        if cache:
+            for entity_id, auto_thresholds in updates.items():
+                cache.update_entity(entity_id, {"auto_thresholds": auto_thresholds})
+            cache.async_schedule_save()
+
+        ai_results_store = storage.Store(hass, STORAGE_VERSION, AI_RESULTS_KEY)
+        async with _ai_results_lock(hass):
+            results_data = await ai_results_store.async_load()
+            if not results_data:
+                return
+            stored = results_data.get("results", {})
+            updated = 0
+            for entity_id, auto_thresholds in updates.items():
+                if entity_id in stored:
+                    stored[entity_id]["auto_thresholds"] = auto_thresholds
+                    updated += 1
+            if not updated:
+                return
+
+            await ai_results_store.async_save(results_data)
+        _LOGGER.debug(f"Stored background thresholds for {updated} entities")
+
+        entry_id = next(iter(hass.data[DOMAIN]))
+        alert_monitor = hass.data[DOMAIN][entry_id].get("alert_monitor")
+        if alert_monitor:
+            await alert_monitor.update_monitored_entities(stored)
+
+    except Exception as e:
+        _LOGGER.error(f"Error storing background thresholds: {e}")
+
+
+async def _merge_alert_thresholds(hass: HomeAssistant, thresholds: dict) -> None:
+    """Store generated alert thresholds into the stored AI results."""
+    try:
+        ai_results_store = storage.Store(hass, STORAGE_VERSION, AI_RESULTS_KEY)
+        async with _ai_results_lock(hass):
+            results_data = await ai_results_store.async_load()
+            if not results_data or "results" not in results_data:
+                return
+            stored = results_data["results"]
+            for entity_id, entity_thresholds in thresholds.items():
+                if entity_id in stored:
+                    stored[entity_id]["alert_thresholds"] = entity_thresholds
+            results_data["last_threshold_update"] = dt.utcnow().isoformat()
+
+            await ai_results_store.async_save(results_data)
+        _LOGGER.debug(f"Saved alert thresholds of {len(thresholds)} entities")
+
+    except Exception as e:
+        _LOGGER.error(f"Error saving alert thresholds: {e}")
+
+
+async def _remove_ai_results(hass: HomeAssistant, entity_ids: list) -> None:
+    """Remove stored and cached AI results of deleted or renamed entities."""
+    try:
+        cache = hass.data.get(RESULT_CACHE_KEY)
+        if cache:
+            for entity_id in entity_ids:
+                cache.invalidate_entity(entity_id)
+            cache.async_schedule_save()
+
+        ai_results_store = storage.Store(hass, STORAGE_VERSION, AI_RESULTS_KEY)
+        async with _ai_results_lock(hass):
+            results_data = await ai_results_store.async_load()
+            if not results_data:
+                return
+            stored = results_data.get("results", {})
+            removed = [entity_id for entity_id in entity_ids if stored.pop(entity_id, None) is not None]
+            if removed:
+                results_data["total_entities"] = len(stored)
+                await ai_results_store.async_save(results_data)
+                _LOGGER.info(f"🗑️ Removed AI results of {len(removed)} entities no longer in the registry")
+
+    except Exception as e:
+        _LOGGER.error(f"Error removing AI results: {e}")
+
+
 async def _save_correlations(hass: HomeAssistant, correlations) -> None:
     """Save correlation analysis results to storage."""
     try:
@@ -116,15 +269,18 @@ async def _load_ai_results(hass: HomeAssistant) -> dict:
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up HASS AI from a config entry."""
     hass.data.setdefault(DOMAIN, {})
-
-    # Register the static path for the panel
-    await hass.http.async_register_static_paths([
-        StaticPathConfig(
-            f"/api/{DOMAIN}/static",
-            hass.config.path("custom_components", DOMAIN, "www"),
-            cache_headers=False
-        )
-    ])
+    await async_setup_token_estimator(hass)
+
+    # Register the static path for the panel (HTTP routes cannot be removed, so only once)
+    if not hass.data.get(STATIC_PATH_KEY):
+        await hass.http.async_register_static_paths([
+            StaticPathConfig(
+                f"/api/{DOMAIN}/static",
+                hass.config.path("custom_components", DOMAIN, "www"),
+                cache_headers=False
+            )
+        ])
+        hass.data[STATIC_PATH_KEY] = True
 
     # Register the custom panel
     frontend.async_register_built_in_panel(
@@ -152,6 +308,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     # Register the websocket API
     websocket_api.async_register_command(hass, handle_scan_entities)
+    websocket_api.async_register_command(hass, handle_resume_scan)
     websocket_api.async_register_command(hass, handle_generate_thresholds)
     websocket_api.async_register_command(hass, handle_save_overrides)
     websocket_api.async_register_command(hass, handle_load_overrides)
@@ -171,6 +328,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     websocket_api.async_register_command(hass, handle_update_filtered_alerts)
     websocket_api.async_register_command(hass, handle_clear_storage)
     websocket_api.async_register_command(hass, handle_stop_operation)
+    websocket_api.async_register_command(hass, handle_get_jobs)
     websocket_api.async_register_command(hass, handle_get_ai_logs)
 
     # Store the storage object for later use
@@ -186,15 +344,50 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         _LOGGER.warning(f"Could not load entity thresholds: {e}")
         hass.data["hass_ai_entity_thresholds"] = {}
     
+    # Several conversation agents share the requests, by observed latency and success rate
+    max_concurrent_requests = entry.options.get(CONF_MAX_CONCURRENT_BATCHES, DEFAULT_MAX_CONCURRENT_BATCHES)
+    agent_pool_ids = entry.options.get(CONF_AGENT_POOL, [])
+    if agent_pool_ids:
+        agent_pool = AgentPool(
+            agent_pool_ids,
+            entry.options.get(CONF_AGENT_MAX_CONCURRENT, DEFAULT_AGENT_MAX_CONCURRENT),
+        )
+        hass.data[AGENT_POOL_KEY] = agent_pool
+        max_concurrent_requests = max(max_concurrent_requests, agent_pool.capacity)
+        _LOGGER.info(f"🤖 Agent pool: {len(agent_pool.agent_ids)} agents, {agent_pool.capacity} requests in flight")
+    
+    # All agent requests share these slots: alerts first, then interactive work, then background runs
+    hass.data[AGENT_SCHEDULER_KEY] = AgentRequestScheduler(max_concurrent_requests)
+    
+    # Scans, threshold runs and correlation runs are cancellable jobs
+    job_manager = JobManager(hass)
+    hass.data[JOB_MANAGER_KEY] = job_manager
+    
     # Initialize alert monitor
     alert_monitor = AlertMonitor(hass)
     await alert_monitor.async_setup()
+
+    # Area/device snapshot used by scans, rebuilt after registry changes
+    entry.async_on_unload(async_track_registry_index(hass))
+
+    # Re-analyze entities as they are added, renamed or moved between areas
+    incremental_scanner = IncrementalScanner(
+        hass,
+        entry.data,
+        lambda results: _merge_ai_results(hass, results),
+        lambda entity_ids: _remove_ai_results(hass, entity_ids),
+    )
+    await incremental_scanner.async_setup()
     
     hass.data[DOMAIN][entry.entry_id] = {
         "store": store,
         "config": entry.data,
         "options": entry.options,
-        "alert_monitor": alert_monitor
+        "alert_monitor": alert_monitor,
+        "incremental_scanner": incremental_scanner,
+        "job_manager": job_manager,
+        # Scans, the incremental scanner, the background scheduler and the threshold queue all update the stored results
+        "ai_results_lock": asyncio.Lock(),
     }
 
     # Get scan interval from config entry (from data or options)
@@ -202,19 +395,43 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         entry.options.get("scan_interval") or 
         entry.data.get("scan_interval", 7)
     )
-    scan_interval = timedelta(days=scan_interval_days)
 
-    # Schedule periodic scan
-    async def periodic_scan(now):
+    # Schedule periodic scan: rescans entities older than scan_interval in small budgeted runs
+    background_scheduler = BackgroundScanScheduler(
+        hass,
+        entry,
+        lambda: storage.Store(hass, STORAGE_VERSION, AI_RESULTS_KEY).async_load(),
+        lambda results: _merge_ai_results(hass, results),
+        job_manager.has_active_jobs,
+    )
+    hass.data[DOMAIN][entry.entry_id]["background_scheduler"] = background_scheduler
+
+    # Alert thresholds of scan results are generated in the background, after the scan
+    threshold_queue = ThresholdWorkQueue(
+        hass,
+        entry,
+        lambda updates: _merge_auto_thresholds(hass, updates),
+        job_manager.has_active_jobs,
+    )
+    await threshold_queue.async_load()
+    hass.data[THRESHOLD_QUEUE_KEY] = threshold_queue
+    hass.data[DOMAIN][entry.entry_id]["threshold_queue"] = threshold_queue
+
+    @callback
+    def periodic_scan(now):
         _LOGGER.debug("Performing periodic HASS AI scan")
-        # Periodic scanning can be implemented in future versions if needed
-        pass
+        background_scheduler.async_schedule_run(now)
 
-    entry.async_on_unload(event.async_track_time_interval(hass, periodic_scan, scan_interval))
+    entry.async_on_unload(event.async_track_time_interval(
+        hass, periodic_scan, timedelta(minutes=BACKGROUND_SCAN_TICK_MINUTES)
+    ))
 
     # Setup services
     await async_setup_services(hass)
 
+    # The agent pool, request slots and scan settings are built from the options: apply changes by reloading
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
     _LOGGER.info(f"HASS AI integration loaded successfully with scan interval: {scan_interval_days} days")
     
     _LOGGER.info("🏠 HASS AI v1.9.37 - Fixed Entity Categorization + Multi-Category Support")
@@ -299,21 +516,49 @@ async def handle_load_overrides(hass: HomeAssistant, connection: websocket_api.A
     vol.Optional("new_entities_only", default=False): bool,
     vol.Optional("existing_entities", default=[]): list,
     vol.Optional("analysis_type", default="importance"): str,
+    vol.Optional("use_cache", default=True): bool,
+    vol.Optional("scan_mode"): vol.In(SCAN_MODES),
 })
 @websocket_api.async_response
 async def handle_scan_entities(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
     """Handle the command to scan entities and send results back in real-time."""
+    _async_start_job(hass, connection, msg, "entity_scan", lambda job: _async_run_entity_scan(hass, connection, msg, job))
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): "hass_ai/resume_scan",
+})
+@websocket_api.async_response
+async def handle_resume_scan(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
+    """Handle the command to continue an interrupted entity scan from its checkpoint."""
+    checkpoint = await storage.Store(hass, STORAGE_VERSION, SCAN_CHECKPOINT_KEY).async_load()
+    if not checkpoint or not checkpoint.get("pending_entity_ids"):
+        connection.send_message(websocket_api.error_message(
+            msg["id"], "no_checkpoint", "No interrupted scan to resume"
+        ))
+        return
+    
+    _async_start_job(hass, connection, msg, "entity_scan", lambda job: _async_run_entity_scan(hass, connection, msg, job, checkpoint))
+
+
+@callback
+def _async_start_job(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict, job_type: str, run) -> None:
+    """Run an operation as a job; a second job of the same type is refused."""
+    job_manager = hass.data[JOB_MANAGER_KEY]
+    if job_manager.async_start(job_type, run, connection, msg["id"]) is None:
+        running_job = job_manager.get_running(job_type)
+        connection.send_message(websocket_api.error_message(
+            msg["id"], "job_running", f"A {job_type} job is already running ({running_job.job_id})"
+        ))
+
+
+async def _async_run_entity_scan(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict, job: OperationJob, checkpoint: dict = None) -> None:
+    """Run an entity scan, keeping a checkpoint of its progress so an interrupted scan can be resumed."""
+    scan_finished = False
+    scan_checkpoint = {}
+    checkpoint_store = storage.Store(hass, STORAGE_VERSION, SCAN_CHECKPOINT_KEY)
     try:
-        # Register this operation as active
-        hass_id = id(hass)
-        _active_operations[hass_id] = {
-            "type": "entity_scan",
-            "cancelled": False,
-            "connection": connection,
-            "msg_id": msg["id"]
-        }
-        
-        connection.send_message(websocket_api.result_message(msg["id"], {"status": "started"}))
+        connection.send_message(websocket_api.result_message(msg["id"], {"status": "started", "job_id": job.job_id}))
 
         # Get language from message
         language = msg.get("language", "en")
@@ -337,97 +582,189 @@ async def handle_scan_entities(hass: HomeAssistant, connection: websocket_api.Ac
         else:
             _LOGGER.warning("No config entry found for HASS AI")
 
-        all_states = hass.states.async_all()
-        
-        # Filter out hass_ai entities and system entities
-        filtered_states = [
-            state for state in all_states 
-            if not (
-                state.domain == DOMAIN or 
-                state.entity_id.startswith(f"{DOMAIN}.") or
-                state.domain in ["persistent_notification", "system_log"]
-            )
-        ]
-        
-        # If scanning only new entities, filter out existing ones
-        if new_entities_only:
+        if checkpoint:
+            # The resumed scan covers the same entities as the interrupted one
             filtered_states = [
-                state for state in filtered_states
-                if state.entity_id not in existing_entities
+                state for state in (hass.states.get(entity_id) for entity_id in checkpoint.get("entity_ids", []))
+                if state is not None
             ]
-            scan_type = "incremental"
+            scan_type = checkpoint.get("params", {}).get("scan_type", "full")
         else:
-            scan_type = "full"
+            all_states = hass.states.async_all()
+            
+            # Filter out hass_ai entities and system entities
+            filtered_states = [
+                state for state in all_states 
+                if not (
+                    state.domain == DOMAIN or 
+                    state.entity_id.startswith(f"{DOMAIN}.") or
+                    state.domain in EXCLUDED_SCAN_DOMAINS
+                )
+            ]
+            
+            # If scanning only new entities, filter out existing ones
+            if new_entities_only:
+                filtered_states = [
+                    state for state in filtered_states
+                    if state.entity_id not in existing_entities
+                ]
+                scan_type = "incremental"
+            else:
+                scan_type = "full"
 
         _LOGGER.info(f"Starting {scan_type} scan of {len(filtered_states)} entities using {ai_provider}")
 
         # Get conversation agent from config
         conversation_agent = entry.data.get(CONF_CONVERSATION_AGENT, "auto")
         
-        # Get language from message, default to English
-        language = msg.get("language", "en")
+        # Number of batches sent to the agent at the same time
+        max_concurrent_batches = (
+            config_entry.options.get(CONF_MAX_CONCURRENT_BATCHES, DEFAULT_MAX_CONCURRENT_BATCHES)
+            if config_entry else DEFAULT_MAX_CONCURRENT_BATCHES
+        )
+        
+        # Entities are packed into each prompt up to this token budget
+        token_budget = (
+            config_entry.options.get(CONF_PROMPT_TOKEN_BUDGET, DEFAULT_PROMPT_TOKEN_BUDGET)
+            if config_entry else DEFAULT_PROMPT_TOKEN_BUDGET
+        )
+        
+        # "hybrid" lets confident rules classify entities without the agent
+        scan_mode = msg.get("scan_mode") or (
+            config_entry.options.get(CONF_SCAN_MODE, DEFAULT_SCAN_MODE)
+            if config_entry else DEFAULT_SCAN_MODE
+        )
+        
+        # Analyze one representative per cluster of near-duplicate entities
+        group_similar = config_entry.options.get(CONF_GROUP_SIMILAR, False) if config_entry else False
+        
+        # Full entity lines or the compact table encoding
+        prompt_format = (
+            config_entry.options.get(CONF_PROMPT_FORMAT, DEFAULT_PROMPT_FORMAT)
+            if config_entry else DEFAULT_PROMPT_FORMAT
+        )
+        
+        # Keyed JSON objects or compact positional rows in the answer
+        response_format = (
+            config_entry.options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT)
+            if config_entry else DEFAULT_RESPONSE_FORMAT
+        )
+        
+        # Everything that shapes the results, so a resumed scan answers like the interrupted one
+        scan_params = {
+            "scan_type": scan_type,
+            "language": language,
+            "analysis_type": analysis_type,
+            "use_cache": msg.get("use_cache", True),
+            "scan_mode": scan_mode,
+            "group_similar": group_similar,
+            "prompt_format": prompt_format,
+            "response_format": response_format,
+        }
+        if checkpoint:
+            scan_params.update(checkpoint.get("params", {}))
+        language = scan_params["language"]
         _LOGGER.info(f"Using language: {language}")
         
         # Create cancellation check function
         def is_cancelled():
-            cancelled = hass_id in _active_operations and _active_operations[hass_id].get("cancelled", False)
-            if cancelled:
-                _LOGGER.info(f"🛑 Cancellation detected for hass_id {hass_id}")
-            return cancelled
+            if job.cancelled:
+                _LOGGER.info(f"🛑 Cancellation detected for job {job.job_id}")
+            return job.cancelled
+        
+        scan_entity_ids = [state.entity_id for state in filtered_states]
+        
+        def save_checkpoint(progress: dict) -> None:
+            """Keep the latest scan progress, written to storage shortly after (and on shutdown)."""
+            completed_ids = {result["entity_id"] for result in progress["results"]}
+            scan_checkpoint.update(progress)
+            scan_checkpoint.update({
+                "params": scan_params,
+                "entity_ids": scan_entity_ids,
+                "pending_entity_ids": [entity_id for entity_id in scan_entity_ids if entity_id not in completed_ids],
+                "updated": dt.utcnow().isoformat(),
+            })
+            checkpoint_store.async_delay_save(lambda: scan_checkpoint, SCAN_CHECKPOINT_SAVE_DELAY)
         
         # Get importance for all entities in batches
         importance_results = await get_entities_importance_batched(
-            hass, filtered_states, 3, ai_provider, api_key, connection, msg["id"], conversation_agent, language, analysis_type, is_cancelled
+            hass, filtered_states, 3, ai_provider, api_key, connection, msg["id"], conversation_agent, language,
+            analysis_type=scan_params["analysis_type"],
+            cancellation_check=is_cancelled,
+            max_concurrent_batches=max_concurrent_batches,
+            token_budget=token_budget,
+            use_cache=scan_params["use_cache"],
+            preclassify=scan_params["scan_mode"] == SCAN_MODE_HYBRID,
+            group_similar=scan_params["group_similar"],
+            prompt_format=scan_params["prompt_format"],
+            response_format=scan_params["response_format"],
+            resume_state=checkpoint,
+            checkpoint_callback=save_checkpoint,
         )
+        
+        if job.cancelled:
+            # Stopped between batches: the results padded with fallbacks must not be saved
+            raise asyncio.CancelledError()
 
         # Send each result as it's processed
         for result in importance_results:
-            # Check if operation was cancelled
-            hass_id = id(hass)
-            if hass_id in _active_operations and _active_operations[hass_id].get("cancelled"):
-                _LOGGER.info("Entity scan was cancelled by user")
-                break
-                
             connection.send_message(websocket_api.event_message(msg["id"], {"type": "entity_result", "result": result}))
         
         # Save AI analysis results automatically
         await _save_ai_results(hass, importance_results)
+        scan_finished = True
+        await checkpoint_store.async_remove()
             
         connection.send_message(websocket_api.event_message(msg["id"], {"type": "scan_complete"}))
         _LOGGER.info(f"{scan_type.capitalize()} scan completed successfully for {len(importance_results)} entities")
         
     except asyncio.CancelledError:
-        _LOGGER.info("Entity scan was cancelled")
-        connection.send_message(websocket_api.event_message(msg["id"], {"type": "scan_cancelled"}))
+        # Stopped: keep what was analyzed, hass_ai/resume_scan continues with the rest
+        completed_results = scan_checkpoint.get("results", [])
+        if completed_results:
+            await _merge_ai_results(hass, completed_results)
+        _LOGGER.info(f"🛑 Entity scan was cancelled with {len(completed_results)} results, {len(scan_checkpoint.get('pending_entity_ids', []))} entities left for resume")
+        connection.send_message(websocket_api.event_message(msg["id"], {
+            "type": "scan_cancelled",
+            "completed_entities": len(completed_results),
+            "pending_entities": len(scan_checkpoint.get("pending_entity_ids", [])),
+            "resumable": bool(scan_checkpoint.get("pending_entity_ids")),
+        }))
+    except AgentUnavailableError as e:
+        # The agent stopped answering: keep what was analyzed, hass_ai/resume_scan continues once it is back
+        completed_results = scan_checkpoint.get("results", [])
+        if completed_results:
+            await _merge_ai_results(hass, completed_results)
+        _LOGGER.error(f"🔌 Entity scan stopped, agent unavailable: {e} ({len(completed_results)} results kept)")
+        connection.send_message(websocket_api.error_message(
+            msg["id"], "agent_unavailable",
+            f"{e} - {len(completed_results)} entities analyzed, {len(scan_checkpoint.get('pending_entity_ids', []))} left for hass_ai/resume_scan"
+        ))
     except Exception as e:
         _LOGGER.error(f"Error during entity scan: {e}")
         connection.send_message(websocket_api.error_message(msg["id"], "scan_failed", str(e)))
     finally:
-        # Clean up active operation
-        hass_id = id(hass)
-        if hass_id in _active_operations:
-            del _active_operations[hass_id]
+        # Interrupted scans write their checkpoint right away
+        if not scan_finished and scan_checkpoint:
+            await checkpoint_store.async_save(scan_checkpoint)
 
 
 @websocket_api.websocket_command({
     vol.Required("type"): "hass_ai/generate_thresholds",
     vol.Optional("force_regenerate", default=False): bool,
     vol.Optional("entity_id"): str,  # Optional: generate for specific entity
+    vol.Optional("resume", default=True): bool,  # Continue an interrupted run from its checkpoint
 })
 @websocket_api.async_response
 async def handle_generate_thresholds(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
     """Handle the command to generate/regenerate AI thresholds for all entities or a specific entity."""
+    _async_start_job(hass, connection, msg, "threshold_generation", lambda job: _async_run_threshold_generation(hass, connection, msg, job))
+
+
+async def _async_run_threshold_generation(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict, job: OperationJob) -> None:
+    """Generate thresholds in a bounded pool of chunked requests, checkpointing the progress."""
     try:
-        # Register this operation as active
-        hass_id = id(hass)
-        _active_operations[hass_id] = {
-            "type": "threshold_generation",
-            "cancelled": False,
-            "connection": connection,
-            "msg_id": msg["id"]
-        }
-        
-        connection.send_message(websocket_api.result_message(msg["id"], {"status": "started"}))
+        connection.send_message(websocket_api.result_message(msg["id"], {"status": "started", "job_id": job.job_id}))
         
         force_regenerate = msg.get("force_regenerate", False)
         target_entity_id = msg.get("entity_id")  # If specified, generate only for this entity
@@ -492,65 +829,113 @@ async def handle_generate_thresholds(hass: HomeAssistant, connection: websocket_
         # Import here to avoid circular imports
         from .intelligence import generate_thresholds_for_entities
         
-        # Generate thresholds for all entities
+        # Resume an interrupted run of the same kind instead of starting over
+        checkpoint_store = storage.Store(hass, STORAGE_VERSION, THRESHOLD_CHECKPOINT_KEY)
+        checkpoint = await checkpoint_store.async_load() if not target_entity_id and msg.get("resume", True) else None
+        if checkpoint and checkpoint.get("force_regenerate") == force_regenerate and checkpoint.get("remaining"):
+            pending_ids = [entity_id for entity_id in checkpoint["remaining"] if entity_id in entities]
+            _LOGGER.info(f"♻️ Resuming threshold generation from checkpoint: {len(pending_ids)} entities left")
+        else:
+            # Only generate if we don't have thresholds or force regenerate
+            pending_ids = [
+                entity_id for entity_id, entity_data in entities.items()
+                if force_regenerate or not entity_data.get("alert_thresholds")
+            ]
+        
         total_entities = len(entities)
-        processed = 0
+        processed = total_entities - len(pending_ids)  # Skipped entities count as processed
         successful = 0
-        
-        for entity_id, entity_data in entities.items():
-            # Check if operation was cancelled
-            if hass_id in _active_operations and _active_operations[hass_id]["cancelled"]:
-                break
-                
-            try:
-                # Only generate if we don't have thresholds or force regenerate
-                existing_thresholds = entity_data.get("alert_thresholds", {})
-                if not force_regenerate and existing_thresholds:
-                    _LOGGER.debug(f"Skipping {entity_id}: already has thresholds")
-                    processed += 1
-                    continue
-                
-                # Generate thresholds for this entity
-                thresholds = await generate_thresholds_for_entities(
-                    hass, [entity_data], agent, ai_provider, api_key
-                )
-                
-                if thresholds and entity_id in thresholds:
-                    entities[entity_id]["alert_thresholds"] = thresholds[entity_id]
-                    successful += 1
-                    _LOGGER.info(f"Generated thresholds for {entity_id}")
-                    
-                    # Send progress update
-                    connection.send_message(websocket_api.event_message(msg["id"], {
-                        "type": "threshold_progress",
-                        "entity_id": entity_id,
-                        "processed": processed + 1,
-                        "total": total_entities,
-                        "successful": successful
-                    }))
-                
-                processed += 1
-                
-                # Small delay to prevent overwhelming the AI service
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                _LOGGER.error(f"Error generating thresholds for {entity_id}: {e}")
+        remaining = set(pending_ids)
+        unsaved = {}
+        last_checkpoint = time.monotonic()
+        agent_error = None
+        
+        def is_cancelled() -> bool:
+            # Also stops the chunks not started yet once the agent is unavailable
+            return job.cancelled or agent_error is not None
+        
+        async def save_checkpoint() -> None:
+            """Store the thresholds generated so far and the entities still to do."""
+            nonlocal last_checkpoint
+            last_checkpoint = time.monotonic()
+            updates = dict(unsaved)
+            unsaved.clear()
+            if updates:
+                await _merge_alert_thresholds(hass, updates)
+            if not target_entity_id:
+                await checkpoint_store.async_save({
+                    "force_regenerate": force_regenerate,
+                    "remaining": [entity_id for entity_id in pending_ids if entity_id in remaining],
+                    "updated": dt.utcnow().isoformat(),
+                })
+        
+        # Bounded pool: each request covers a chunk of entities, a few chunks are in flight at once
+        max_concurrent = config_entry.options.get(CONF_MAX_CONCURRENT_BATCHES, DEFAULT_MAX_CONCURRENT_BATCHES)
+        semaphore = asyncio.Semaphore(max(1, int(max_concurrent)))
+        
+        # Thresholds of one entity are interactive work, whole runs yield to it
+        request_lane = AGENT_LANE_INTERACTIVE if target_entity_id else AGENT_LANE_BACKGROUND
+        
+        async def run_chunk(chunk: list) -> None:
+            nonlocal processed, successful, agent_error
+            async with semaphore:
+                if is_cancelled():
+                    return
+                try:
+                    thresholds = await generate_thresholds_for_entities(
+                        hass, [entities[entity_id] for entity_id in chunk], agent, ai_provider, api_key, agent_id or "auto", request_lane
+                    )
+                except AgentUnavailableError as e:
+                    # The chunk stays in the checkpoint for the next run
+                    _LOGGER.error(f"🔌 Agent unavailable, stopping threshold generation: {e}")
+                    agent_error = e
+                    return
+                except Exception as e:
+                    # Left in the checkpoint: the next run retries them
+                    _LOGGER.error(f"Error generating thresholds for {len(chunk)} entities: {e}")
+                    return
+            
+            for entity_id in chunk:
+                remaining.discard(entity_id)
                 processed += 1
+                if entity_id not in thresholds:
+                    continue
+                entities[entity_id]["alert_thresholds"] = thresholds[entity_id]
+                unsaved[entity_id] = thresholds[entity_id]
+                successful += 1
+                _LOGGER.info(f"Generated thresholds for {entity_id}")
                 
-        # Save updated results
-        if target_entity_id:
-            # Update only the specific entity in the full dataset
-            original_data = await ai_results_store.async_load()
-            if original_data and "results" in original_data:
-                original_data["results"][target_entity_id] = entities[target_entity_id]
-                original_data["last_threshold_update"] = dt.utcnow().isoformat()
-                await ai_results_store.async_save(original_data)
-        else:
-            # Save all updated entities
-            ai_data["results"] = entities
-            ai_data["last_threshold_update"] = dt.utcnow().isoformat()
-            await ai_results_store.async_save(ai_data)
+                # Send progress update
+                connection.send_message(websocket_api.event_message(msg["id"], {
+                    "type": "threshold_progress",
+                    "entity_id": entity_id,
+                    "processed": processed,
+                    "total": total_entities,
+                    "successful": successful
+                }))
+            
+            if time.monotonic() - last_checkpoint >= THRESHOLD_CHECKPOINT_INTERVAL:
+                await save_checkpoint()
+        
+        chunks = [pending_ids[i:i + THRESHOLD_BATCH_MAX_ENTITIES] for i in range(0, len(pending_ids), THRESHOLD_BATCH_MAX_ENTITIES)]
+        workers = [hass.async_create_task(run_chunk(chunk)) for chunk in chunks]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # Also on cancellation: completed thresholds are kept and the next run resumes
+            for worker in workers:
+                worker.cancel()
+            await save_checkpoint()
+        
+        if not remaining and not target_entity_id:
+            await checkpoint_store.async_remove()
+        
+        if agent_error is not None:
+            connection.send_message(websocket_api.error_message(
+                msg["id"], "agent_unavailable",
+                f"{agent_error} - thresholds generated for {successful} entities, {len(remaining)} left for the next run"
+            ))
+            return
         
         connection.send_message(websocket_api.result_message(msg["id"], {
             "success": True,
@@ -566,11 +951,6 @@ async def handle_generate_thresholds(hass: HomeAssistant, connection: websocket_
     except Exception as e:
         _LOGGER.error(f"Error during threshold generation: {e}")
         connection.send_message(websocket_api.error_message(msg["id"], "generation_failed", str(e)))
-    finally:
-        # Clean up active operation
-        hass_id = id(hass)
-        if hass_id in _active_operations:
-            del _active_operations[hass_id]
 
 
 @websocket_api.websocket_command({
@@ -625,6 +1005,12 @@ async def handle_save_ai_results(hass: HomeAssistant, connection: websocket_api.
         connection.send_message(websocket_api.error_message(msg["id"], "save_failed", str(e)))
 
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry after its options changed."""
+    _LOGGER.info("🔄 HASS AI options changed, reloading")
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     try:
@@ -636,6 +1022,27 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         alert_monitor = entry_data.get("alert_monitor")
         if alert_monitor:
             await alert_monitor.async_unload()
+
+        incremental_scanner = entry_data.get("incremental_scanner")
+        if incremental_scanner:
+            await incremental_scanner.async_unload()
+
+        background_scheduler = entry_data.get("background_scheduler")
+        if background_scheduler:
+            await background_scheduler.async_unload()
+
+        threshold_queue = entry_data.get("threshold_queue")
+        if threshold_queue:
+            await threshold_queue.async_unload()
+        hass.data.pop(THRESHOLD_QUEUE_KEY, None)
+
+        # Running jobs are cancelled and write their checkpoints
+        job_manager = entry_data.get("job_manager")
+        if job_manager:
+            await job_manager.async_shutdown()
+        hass.data.pop(JOB_MANAGER_KEY, None)
+        hass.data.pop(AGENT_SCHEDULER_KEY, None)
+        hass.data.pop(AGENT_POOL_KEY, None)
         
         # Remove panel
         frontend.async_remove_panel(hass, PANEL_URL_PATH)
@@ -686,7 +1093,9 @@ async def handle_evaluate_single_entity(hass: HomeAssistant, connection: websock
         from .intelligence import get_entities_importance_batched
         
         importance_results = await get_entities_importance_batched(
-            hass, [entity_state], 1, ai_provider, api_key, connection, msg["id"], conversation_agent, language
+            hass, [entity_state], 1, ai_provider, api_key, connection, msg["id"], conversation_agent, language,
+            use_cache=False,  # Explicit re-evaluation always asks the agent
+            request_lane=AGENT_LANE_INTERACTIVE
         )
         
         if importance_results:
@@ -719,16 +1128,12 @@ async def handle_evaluate_single_entity(hass: HomeAssistant, connection: websock
 @websocket_api.async_response
 async def handle_find_correlations(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
     """Handle the command to find correlations between entities using AI with progress tracking."""
+    _async_start_job(hass, connection, msg, "correlation_analysis", lambda job: _async_run_correlation_analysis(hass, connection, msg, job))
+
+
+async def _async_run_correlation_analysis(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict, job: OperationJob) -> None:
+    """Find the correlations of each entity, saving them as they come in."""
     try:
-        # Register this operation as active
-        hass_id = id(hass)
-        _active_operations[hass_id] = {
-            "type": "correlation_analysis",
-            "cancelled": False,
-            "connection": connection,
-            "msg_id": msg["id"]
-        }
-        
         entities = msg["entities"]
         language = msg.get("language", "en")
         
@@ -737,6 +1142,7 @@ async def handle_find_correlations(hass: HomeAssistant, connection: websocket_ap
         
         # Initialize correlations dictionary to collect results
         all_correlations = {}
+        agent_error = None
         
         # Send initial progress
         connection.send_message(websocket_api.event_message(
@@ -758,8 +1164,7 @@ async def handle_find_correlations(hass: HomeAssistant, connection: websocket_ap
         # Process entities one by one to find correlations
         for index, entity in enumerate(entities, 1):
             # Check if operation was cancelled
-            hass_id = id(hass)
-            if hass_id in _active_operations and _active_operations[hass_id].get("cancelled"):
+            if job.cancelled:
                 _LOGGER.info("Correlation analysis was cancelled by user")
                 break
                 
@@ -807,6 +1212,11 @@ async def handle_find_correlations(hass: HomeAssistant, connection: websocket_ap
                 # Small delay to show progress
                 await asyncio.sleep(0.5)
                 
+            except AgentUnavailableError as e:
+                # Stop instead of storing empty correlations for every remaining entity
+                _LOGGER.error(f"🔌 Agent unavailable, stopping correlation analysis at {entity_id}: {e}")
+                agent_error = e
+                break
             except Exception as e:
                 _LOGGER.error(f"Error finding correlations for {entity_id}: {e}")
                 
@@ -829,6 +1239,13 @@ async def handle_find_correlations(hass: HomeAssistant, connection: websocket_ap
         # Final save of all correlations
         await _save_correlations(hass, all_correlations)
         
+        if agent_error is not None:
+            connection.send_message(websocket_api.error_message(
+                msg["id"], "agent_unavailable",
+                f"{agent_error} - correlations found for {len(all_correlations)} of {total_entities} entities"
+            ))
+            return
+        
         # Send completion message
         connection.send_message(websocket_api.event_message(
             msg["id"], {
@@ -850,11 +1267,6 @@ async def handle_find_correlations(hass: HomeAssistant, connection: websocket_ap
         connection.send_message(websocket_api.error_message(
             msg["id"], "correlation_error", str(e)
         ))
-    finally:
-        # Clean up active operation
-        hass_id = id(hass)
-        if hass_id in _active_operations:
-            del _active_operations[hass_id]
 
 
 @websocket_api.websocket_command({
@@ -1085,6 +1497,17 @@ async def handle_clear_storage(hass: HomeAssistant, connection: websocket_api.Ac
         correlations_store = storage.Store(hass, STORAGE_VERSION, CORRELATIONS_KEY)
         await correlations_store.async_save({})
         
+        _LOGGER.info(f"Clearing AI result cache with key: {RESULT_CACHE_KEY}")
+        hass.data.pop(RESULT_CACHE_KEY, None)
+        result_cache_store = storage.Store(hass, STORAGE_VERSION, RESULT_CACHE_KEY)
+        await result_cache_store.async_save({})
+        
+        _LOGGER.info(f"Clearing threshold generation checkpoint with key: {THRESHOLD_CHECKPOINT_KEY}")
+        await storage.Store(hass, STORAGE_VERSION, THRESHOLD_CHECKPOINT_KEY).async_remove()
+        
+        _LOGGER.info(f"Clearing entity scan checkpoint with key: {SCAN_CHECKPOINT_KEY}")
+        await storage.Store(hass, STORAGE_VERSION, SCAN_CHECKPOINT_KEY).async_remove()
+        
         # Alert thresholds store (uses different naming convention)
         _LOGGER.info("Clearing alert thresholds store")
         alert_thresholds_store = storage.Store(hass, STORAGE_VERSION, "hass_ai_alert_thresholds")
@@ -1114,35 +1537,26 @@ async def handle_clear_storage(hass: HomeAssistant, connection: websocket_api.Ac
 
 
 @websocket_api.websocket_command({
-    vol.Required("type"): "hass_ai/stop_operation"
+    vol.Required("type"): "hass_ai/stop_operation",
+    vol.Optional("job_id"): str,  # Stop only this job (default: all running jobs)
 })
 @websocket_api.async_response
 async def handle_stop_operation(hass: HomeAssistant, connection, msg):
     """Handle stop operation command."""
     try:
-        hass_id = id(hass)
+        # Cancelling the job task also interrupts the agent call it is waiting on
+        cancelled_jobs = hass.data[JOB_MANAGER_KEY].async_cancel(msg.get("job_id"))
         
-        if hass_id in _active_operations:
-            # Mark the active operation as cancelled
-            operation_info = _active_operations[hass_id]
-            operation_info["cancelled"] = True
-            
-            _LOGGER.info(f"🛑 Marking operation as cancelled: {operation_info.get('type', 'unknown')}")
-            
-            # If there's a task handle, cancel it (but keep the operation info for checking)
-            if "task" in operation_info:
-                operation_info["task"].cancel()
-                _LOGGER.info("🛑 Cancelled task handle")
-            
-            # Don't delete the operation yet - let the function check the cancelled flag first
-            
+        if cancelled_jobs:
             connection.send_message(websocket_api.result_message(msg["id"], {
                 "success": True,
+                "cancelled_jobs": cancelled_jobs,
                 "message": "Operation stopped successfully"
             }))
         else:
             connection.send_message(websocket_api.result_message(msg["id"], {
                 "success": False,
+                "cancelled_jobs": [],
                 "message": "No active operation to stop"
             }))
             
@@ -1153,6 +1567,20 @@ async def handle_stop_operation(hass: HomeAssistant, connection, msg):
         ))
 
 
+@websocket_api.websocket_command({
+    vol.Required("type"): "hass_ai/get_jobs",
+})
+@websocket_api.async_response
+async def handle_get_jobs(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
+    """Handle the command to list the running jobs, the agent request queue of each lane, the agent pool and the agent circuits."""
+    connection.send_message(websocket_api.result_message(msg["id"], {
+        **hass.data[JOB_MANAGER_KEY].get_status(),
+        "agent_requests": hass.data[AGENT_SCHEDULER_KEY].get_status(),
+        "agent_pool": hass.data[AGENT_POOL_KEY].get_status() if AGENT_POOL_KEY in hass.data else None,
+        "agent_circuits": get_circuit_breaker_status(),
+    }))
+
+
 @websocket_api.websocket_command({
     vol.Required("type"): "hass_ai/update_filtered_alerts",
     vol.Required("min_weight"): int,
@@ -0,0 +1,181 @@
+"""
+HASS AI Agent Pool
+Spreads the agent requests over several conversation agents by observed latency and success rate
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    AGENT_POOL_LATENCY_SMOOTHING,
+    AGENT_POOL_DEFAULT_LATENCY,
+    AGENT_POOL_MIN_WEIGHT_RATIO,
+)
+from .capacity import CAPACITY_KEY
+from .circuit_breaker import get_agent_circuit_breaker
+from .exceptions import AgentCircuitOpenError
+
+_LOGGER = logging.getLogger(__name__)
+
+AGENT_POOL_KEY = f"{DOMAIN}_agent_pool"  # hass.data key of the configured pool
+
+
+class AgentPool:
+    """Conversation agents sharing the requests, each with its own concurrency limit.
+
+    A request goes to one of the agents with a free slot, picked at random with a
+    weight of success rate / average latency, so faster and more reliable agents
+    get more of the work. Agents without answers yet are weighted like the fastest
+    known agent until they have been measured. When every agent is at its limit,
+    or only agents far worse than the best one are free, the request waits for
+    the next free slot. Agents whose circuit breaker is open are skipped; when
+    every agent's circuit is open the request fails fast with AgentCircuitOpenError.
+    A lease can be limited to some of the agents, e.g. those large enough for the request.
+    """
+
+    def __init__(self, agent_ids: List[str], max_concurrent_per_agent: int):
+        self.agent_ids = list(dict.fromkeys(agent_ids))
+        self.max_concurrent_per_agent = max(1, int(max_concurrent_per_agent))
+        self._agents: Dict[str, dict] = {
+            agent_id: {"in_flight": 0, "requests": 0, "failures": 0, "latency": None}
+            for agent_id in self.agent_ids
+        }
+        self._waiters: List[asyncio.Future] = []
+
+    @property
+    def capacity(self) -> int:
+        """Requests the whole pool can have in flight."""
+        return len(self.agent_ids) * self.max_concurrent_per_agent
+
+    @contextlib.asynccontextmanager
+    async def async_lease(self, agent_ids: Optional[List[str]] = None):
+        """Hold a slot of one agent (of agent_ids, if given); the caller sets outcome["success"] once it has judged the answer."""
+        candidates = [agent_id for agent_id in self.agent_ids if agent_id in agent_ids] if agent_ids else self.agent_ids
+        agent_id = await self._async_acquire(candidates or self.agent_ids)
+        outcome = {"agent_id": agent_id, "success": None}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except Exception:
+            outcome["success"] = False
+            raise
+        finally:
+            # Cancelled requests (success still None) say nothing about the agent
+            self._record(agent_id, time.monotonic() - started, outcome["success"])
+            self._release(agent_id)
+
+    async def _async_acquire(self, candidates: List[str]) -> str:
+        while True:
+            breakers = [get_agent_circuit_breaker(agent_id) for agent_id in candidates]
+            if not any(breaker.is_available() for breaker in breakers):
+                retry_after = min(breaker.retry_after() for breaker in breakers)
+                raise AgentCircuitOpenError(
+                    f"All {len(breakers)} pooled agents have an open circuit", retry_after=retry_after
+                )
+
+            agent_id = self._pick_agent(candidates)
+            if agent_id is not None:
+                self._agents[agent_id]["in_flight"] += 1
+                return agent_id
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Woken right before the cancellation: pass the free slot on
+                    self._wake_waiters()
+                raise
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+
+    def _release(self, agent_id: str) -> None:
+        self._agents[agent_id]["in_flight"] -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        # Every waiter checks again: a lease limited to other agents cannot use the freed slot
+        while self._waiters:
+            future = self._waiters.pop(0)
+            if not future.done():
+                future.set_result(None)
+
+    def _pick_agent(self, candidates: List[str]) -> Optional[str]:
+        weights = {
+            agent_id: self._weight(agent_id) for agent_id in candidates
+            if get_agent_circuit_breaker(agent_id).is_available()
+        }
+        if not weights:
+            return None
+        min_weight = max(weights.values()) * AGENT_POOL_MIN_WEIGHT_RATIO
+        free = [
+            agent_id for agent_id in weights
+            if self._agents[agent_id]["in_flight"] < self.max_concurrent_per_agent and weights[agent_id] >= min_weight
+        ]
+        if not free:
+            return None
+        return random.choices(free, weights=[weights[agent_id] for agent_id in free])[0]
+
+    def _weight(self, agent_id: str) -> float:
+        agent = self._agents[agent_id]
+        success_rate = (agent["requests"] - agent["failures"] + 1) / (agent["requests"] + 2)
+        latency = agent["latency"]
+        if latency is None:
+            known = [other["latency"] for other in self._agents.values() if other["latency"] is not None]
+            latency = min(known) if known else AGENT_POOL_DEFAULT_LATENCY
+        return success_rate / max(latency, 0.1)
+
+    def _record(self, agent_id: str, latency: float, success: Optional[bool]) -> None:
+        if success is None:
+            return
+        agent = self._agents[agent_id]
+        agent["requests"] += 1
+        if not success:
+            agent["failures"] += 1
+            _LOGGER.debug(f"Pooled agent {agent_id} failed a request ({agent['failures']}/{agent['requests']})")
+            return
+        if agent["latency"] is None:
+            agent["latency"] = latency
+        else:
+            agent["latency"] += AGENT_POOL_LATENCY_SMOOTHING * (latency - agent["latency"])
+
+    def get_status(self) -> dict:
+        """Return the load and the observed quality of every agent."""
+        return {
+            "max_concurrent_per_agent": self.max_concurrent_per_agent,
+            "agents": {
+                agent_id: {
+                    "in_flight": agent["in_flight"],
+                    "requests": agent["requests"],
+                    "failures": agent["failures"],
+                    "average_latency": round(agent["latency"], 2) if agent["latency"] is not None else None,
+                    "weight": round(self._weight(agent_id), 3),
+                }
+                for agent_id, agent in self._agents.items()
+            },
+        }
+
+
+def agent_lease(hass: HomeAssistant, request_tokens: Optional[int] = None):
+    """Slot of a pooled agent, or no lease (None) when no agent pool is configured.
+
+    With request_tokens, agents known to fail on requests that large are skipped
+    while another pooled agent can take the request.
+    """
+    agent_pool = hass.data.get(AGENT_POOL_KEY)
+    if agent_pool is None:
+        return contextlib.nullcontext()
+    capacity = hass.data.get(CAPACITY_KEY)
+    if capacity is None or not request_tokens:
+        return agent_pool.async_lease()
+    return agent_pool.async_lease([agent_id for agent_id in agent_pool.agent_ids if capacity.fits(agent_id, request_tokens)])
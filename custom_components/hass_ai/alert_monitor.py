@@ -11,7 +11,8 @@ from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers import storage
 from homeassistant.util import dt as dt_util
 from homeassistant.const import STATE_UNKNOWN, STATE_UNAVAILABLE
-from .const import DOMAIN
+from .const import DOMAIN, AGENT_LANE_ALERTS
+from .keywords import keyword_tags
 import json
 
 _LOGGER = logging.getLogger(__name__)
@@ -23,6 +24,15 @@ ALERT_LEVELS = {
     "CRITICAL": {"color": "#d32f2f", "icon": "🔥", "priority": 3}
 }
 
+# Entity types detected from the entity_id, in order of precedence
+ENTITY_TYPE_ORDER = [
+    "temperature", "humidity", "battery", "co2", "pressure", "door",
+    "window", "motion", "smoke", "gas", "security", "emergency",
+]
+
+# Device classes that typically alert on low values
+LOW_VALUE_DEVICE_CLASSES = {"battery", "signal_strength", "power"}
+
 # No default thresholds - all thresholds must come from AI analysis
 # This ensures intelligent, context-aware threshold generation for every entity type
 
@@ -231,8 +241,10 @@ input_text:
             unit = attributes.get("unit_of_measurement")
             device_class = attributes.get("device_class")
             
+            tags = keyword_tags(entity_id)
+            
             # Battery sensors - always valid
-            if device_class == "battery" or "battery" in entity_id.lower():
+            if device_class == "battery" or "battery" in tags:
                 return True
                 
             # Temperature, humidity, pressure sensors
@@ -244,15 +256,15 @@ input_text:
                 return True
                 
             # CO2, AQI, and other measurable values
-            if any(keyword in entity_id.lower() for keyword in ["co2", "aqi", "pm", "noise", "signal"]):
+            if "measurable" in tags:
                 return self._is_numeric_state(current_state)
                 
             # Avoid text-based sensors
-            if any(keyword in entity_id.lower() for keyword in ["status", "mode", "text", "message", "name"]):
+            if "text_sensor" in tags:
                 return False
                 
             # Health monitoring sensors
-            if any(keyword in entity_id.lower() for keyword in ["heart", "oxygen", "blood", "steps"]):
+            if "vital_sign" in tags:
                 return self._is_numeric_state(current_state)
                 
             return False
@@ -270,20 +282,20 @@ input_text:
                 return True
                 
             # Generic binary sensors with meaningful names
-            if any(keyword in entity_id.lower() for keyword in ["open", "closed", "detected", "alarm", "alert"]):
+            if "binary_event" in keyword_tags(entity_id):
                 return True
                 
             return False
             
         elif domain == "switch":
             # Only security/safety switches
-            if any(keyword in entity_id.lower() for keyword in ["security", "alarm", "emergency", "safety"]):
+            if "safety_switch" in keyword_tags(entity_id):
                 return True
             return False
             
         elif domain == "light":
             # Only emergency/indicator lights
-            if any(keyword in entity_id.lower() for keyword in ["emergency", "alarm", "indicator", "warning"]):
+            if "indicator_light" in keyword_tags(entity_id):
                 return True
             return False
             
@@ -340,33 +352,12 @@ input_text:
         
     def _detect_entity_type(self, entity_id: str, entity_data: Dict) -> str:
         """Detect entity type for threshold configuration"""
-        entity_lower = entity_id.lower()
-        
-        # Check common patterns
-        if any(term in entity_lower for term in ['temp', 'temperature']):
-            return 'temperature'
-        elif any(term in entity_lower for term in ['humid', 'moisture']):
-            return 'humidity'
-        elif any(term in entity_lower for term in ['batt', 'battery']):
-            return 'battery'
-        elif any(term in entity_lower for term in ['co2', 'carbon']):
-            return 'co2'
-        elif any(term in entity_lower for term in ['pressure', 'press']):
-            return 'pressure'
-        elif any(term in entity_lower for term in ['door', 'porta']):
-            return 'door'
-        elif any(term in entity_lower for term in ['window', 'finestra']):
-            return 'window'
-        elif any(term in entity_lower for term in ['motion', 'movimento', 'pir']):
-            return 'motion'
-        elif any(term in entity_lower for term in ['smoke', 'fumo']):
-            return 'smoke'
-        elif any(term in entity_lower for term in ['gas', 'leak']):
-            return 'gas'
-        elif any(term in entity_lower for term in ['security', 'alarm']):
-            return 'security'
-        elif any(term in entity_lower for term in ['emergency', 'emer']):
-            return 'emergency'
+        tags = keyword_tags(entity_id)
+        
+        # Check common patterns (first match wins)
+        for entity_type in ENTITY_TYPE_ORDER:
+            if f"type_{entity_type}" in tags:
+                return entity_type
         
         return 'generic'
         
@@ -570,44 +561,24 @@ input_text:
 
     def _should_alert_on_low_value(self, entity_id: str, state: State) -> bool:
         """Determine if this sensor should alert when value is LOW (vs HIGH)"""
-        entity_lower = entity_id.lower()
+        tags = keyword_tags(entity_id)
         device_class = state.attributes.get('device_class', '').lower()
         unit = state.attributes.get('unit_of_measurement', '').lower()
         
-        # Sensors that should alert on LOW values
-        low_value_indicators = [
-            # Battery related
-            'battery', 'batteria', 'power_level',
-            # Signal strength
-            'signal', 'rssi', 'wifi', 'segnale', 'strength',
-            # Storage/Disk space  
-            'available', 'free', 'remaining', 'libero', 'disponibile',
-            # Health/Performance indicators
-            'uptime', 'connectivity', 'connettivita',
-            # Ink/Toner
-            'ink', 'toner', 'cartridge', 'cartuccia',
-            # Air quality (sometimes lower is better)
-            'air_quality' if 'poor' not in entity_lower else None
-        ]
-        
-        # Device classes that typically alert on low values
-        low_value_device_classes = [
-            'battery', 'signal_strength', 'power'
-        ]
-        
-        # Units that typically indicate "low is bad"
-        low_value_units = ['%', 'percent', 'gb', 'mb', 'tb']
-        
-        # Check entity name for low-value keywords
-        if any(keyword and keyword in entity_lower for keyword in low_value_indicators):
+        # Check entity name for low-value keywords (battery, signal, free space, ink...)
+        if "low_value" in tags:
+            return True
+            
+        # Air quality (sometimes lower is better)
+        if "air_quality" in tags and "poor" not in tags:
             return True
             
         # Check device class
-        if device_class in low_value_device_classes:
+        if device_class in LOW_VALUE_DEVICE_CLASSES:
             return True
             
         # Special case: if it's a percentage and looks like battery/signal/storage
-        if unit in ['%', 'percent'] and any(keyword in entity_lower for keyword in ['battery', 'signal', 'storage', 'disk', 'available', 'free']):
+        if unit in ['%', 'percent'] and "low_value_percent" in tags:
             return True
             
         # Default: most sensors alert on HIGH values (temperature, humidity, CPU usage, etc.)
@@ -781,7 +752,8 @@ FORMAT: [emoji] [critical status] + [main detail] + [recommended action]"""
 
             # Get AI response
             if conversation_agent:
-                response = await _query_local_agent(self.hass, prompt, conversation_agent)
+                # Alert messages go ahead of scan and threshold requests
+                response = await _query_local_agent(self.hass, prompt, conversation_agent, AGENT_LANE_ALERTS)
                 return response.strip()
                 
         except Exception as e:
@@ -0,0 +1,55 @@
+"""
+HASS AI Token-Budget Batching
+Packs entities into prompts by estimated token cost instead of a fixed entity count
+"""
+from __future__ import annotations
+
+import logging
+from typing import Hashable, List, Sequence, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def pack_by_token_budget(
+    items: Sequence[Tuple[Hashable, int]],
+    token_budget: int,
+    max_items_per_batch: int,
+) -> List[List[Hashable]]:
+    """Pack (key, token_cost) items into batches whose total cost fits token_budget.
+
+    First-fit decreasing: the most expensive items are placed first, so long
+    entities end up alone (or with a few short ones) while short entities share
+    prompts. An item that is larger than the budget on its own gets a batch of
+    its own instead of being dropped. Batches keep the original item order.
+    """
+    if not items:
+        return []
+
+    token_budget = max(1, token_budget)
+    max_items_per_batch = max(1, max_items_per_batch)
+    order = {key: index for index, (key, _cost) in enumerate(items)}
+
+    bins: List[List[Hashable]] = []
+    bin_costs: List[int] = []
+
+    for key, cost in sorted(items, key=lambda item: item[1], reverse=True):
+        if cost >= token_budget:
+            # Oversized entity: isolate it
+            bins.append([key])
+            bin_costs.append(token_budget)
+            continue
+
+        for index, used in enumerate(bin_costs):
+            if used + cost <= token_budget and len(bins[index]) < max_items_per_batch:
+                bins[index].append(key)
+                bin_costs[index] += cost
+                break
+        else:
+            bins.append([key])
+            bin_costs.append(cost)
+
+    batches = [sorted(keys, key=order.__getitem__) for keys in bins]
+    batches.sort(key=lambda keys: order[keys[0]])
+
+    _LOGGER.debug(f"📦 Packed {len(items)} entities into {len(batches)} batches (budget {token_budget} tokens, max {max_items_per_batch} per batch)")
+    return batches
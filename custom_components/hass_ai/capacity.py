@@ -0,0 +1,194 @@
+"""
+HASS AI Agent Capacity Model
+Learns how large a request each conversation agent handles, so scans start with the right batch size
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import storage
+from homeassistant.util import dt
+
+from .const import (
+    DOMAIN,
+    CAPACITY_SAFETY_MARGIN,
+    CAPACITY_LATENCY_SAMPLES,
+    CAPACITY_SAVE_DELAY,
+    CAPACITY_LIMIT_TTL_DAYS,
+    MIN_PROMPT_TOKEN_BUDGET,
+)
+from .token_estimator import get_token_estimator
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+CAPACITY_KEY = f"{DOMAIN}_agent_capacity"  # Storage key and hass.data key of the loaded model
+
+
+class AgentCapacityModel:
+    """Per-agent request size limits and latency, persisted between scans.
+
+    For every agent it keeps the largest request (estimated prompt + answer
+    tokens) that succeeded, the smallest one that hit the token limit and
+    recent (tokens, latency) samples. A learned limit expires after
+    CAPACITY_LIMIT_TTL_DAYS, so scans try larger requests again. The token
+    estimator's calibration is saved along with them, keyed by estimator.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._store = storage.Store(hass, STORAGE_VERSION, CAPACITY_KEY)
+        self._agents: Dict[str, dict] = {}
+        self._estimators: Dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        """Load the learned agent profiles."""
+        try:
+            data = await self._store.async_load() or {}
+        except Exception as e:
+            _LOGGER.warning(f"Could not load agent capacity profiles: {e}")
+            data = {}
+        self._agents = data.get("agents", {})
+        self._estimators = data.get("token_estimators", {})
+        estimator = get_token_estimator()
+        if estimator.name in self._estimators:
+            estimator.restore_state(self._estimators[estimator.name])
+        _LOGGER.debug(f"Loaded capacity profiles for {len(self._agents)} agents")
+
+    def _profile(self, agent_id: Optional[str]) -> dict:
+        return self._agents.setdefault(agent_id or "auto", {
+            "max_success_tokens": None,
+            "min_failure_tokens": None,
+            "latency_samples": [],
+        })
+
+    def record_success(self, agent_id: Optional[str], request_tokens: int, latency: float) -> None:
+        """Record a request the agent answered within its limits."""
+        profile = self._profile(agent_id)
+        if profile["max_success_tokens"] is None or request_tokens > profile["max_success_tokens"]:
+            profile["max_success_tokens"] = request_tokens
+        if profile["min_failure_tokens"] is not None and request_tokens >= profile["min_failure_tokens"]:
+            # The agent handles more than before (e.g. max_tokens was raised)
+            _LOGGER.info(f"📈 Agent {agent_id} now handles {request_tokens} tokens, forgetting the old {profile['min_failure_tokens']}-token limit")
+            profile["min_failure_tokens"] = None
+            profile.pop("min_failure_at", None)
+
+        samples = profile["latency_samples"]
+        samples.append([request_tokens, round(latency, 3)])
+        del samples[:-CAPACITY_LATENCY_SAMPLES]
+        profile["updated"] = dt.utcnow().isoformat()
+
+    def record_token_limit(self, agent_id: Optional[str], request_tokens: int) -> None:
+        """Record a request that exceeded the agent's token limit."""
+        profile = self._profile(agent_id)
+        limit = self._learned_limit(agent_id, profile)
+        if limit is None or request_tokens < limit:
+            profile["min_failure_tokens"] = request_tokens
+            profile["min_failure_at"] = dt.utcnow().isoformat()
+        if profile["max_success_tokens"] is not None and profile["max_success_tokens"] >= request_tokens:
+            # The limit went down (smaller model or max_tokens), old successes no longer apply
+            profile["max_success_tokens"] = None
+        profile["updated"] = dt.utcnow().isoformat()
+
+    def record_prompt_format(self, agent_id: Optional[str], prompt_format: str, entities: int, prompt_tokens: int, valid_results: int, response_tokens: int = 0) -> None:
+        """Record the size and parse outcome of a request, to compare prompt and response formats."""
+        formats = self._profile(agent_id).setdefault("prompt_formats", {})
+        totals = formats.setdefault(prompt_format, {"requests": 0, "entities": 0, "prompt_tokens": 0, "valid_results": 0})
+        totals["requests"] += 1
+        totals["entities"] += entities
+        totals["prompt_tokens"] += prompt_tokens
+        totals["valid_results"] += valid_results
+        totals["response_tokens"] = totals.get("response_tokens", 0) + response_tokens
+
+    def recommended_token_budget(self, agent_id: Optional[str], configured_budget: Optional[int]) -> Optional[int]:
+        """Token budget to start a scan with: the configured one, capped below the learned limit."""
+        profile = self._agents.get(agent_id or "auto")
+        limit = self._learned_limit(agent_id, profile)
+        if limit is None:
+            return configured_budget
+
+        learned_budget = int(limit * CAPACITY_SAFETY_MARGIN)
+        if profile.get("max_success_tokens"):
+            learned_budget = max(learned_budget, profile["max_success_tokens"])
+        learned_budget = max(MIN_PROMPT_TOKEN_BUDGET, learned_budget)
+
+        if configured_budget is None:
+            return learned_budget
+        return min(configured_budget, learned_budget)
+
+    def fits(self, agent_id: Optional[str], request_tokens: int) -> bool:
+        """Whether a request is smaller than the smallest one that hit the agent's token limit."""
+        limit = self._learned_limit(agent_id, self._agents.get(agent_id or "auto"))
+        return limit is None or request_tokens < limit
+
+    def _learned_limit(self, agent_id: Optional[str], profile: Optional[dict]) -> Optional[int]:
+        """Smallest request that hit the agent's token limit, forgotten once it is too old."""
+        if not profile or profile.get("min_failure_tokens") is None:
+            return None
+        learned_at = dt.parse_datetime(profile["min_failure_at"]) if profile.get("min_failure_at") else None
+        if learned_at is None or dt.utcnow() - learned_at > timedelta(days=CAPACITY_LIMIT_TTL_DAYS):
+            # Limits without a date were learned from any error text containing "limit" or "token"
+            _LOGGER.info(f"⏳ Forgetting the {profile['min_failure_tokens']}-token limit of agent {agent_id or 'auto'}, larger requests will be tried again")
+            profile["min_failure_tokens"] = None
+            profile.pop("min_failure_at", None)
+            return None
+        return profile["min_failure_tokens"]
+
+    def expected_latency(self, agent_id: Optional[str], request_tokens: int) -> Optional[float]:
+        """Latency predicted from a least-squares fit of latency against request size."""
+        profile = self._agents.get(agent_id or "auto")
+        samples = profile.get("latency_samples", []) if profile else []
+        if len(samples) < 2:
+            return None
+
+        count = len(samples)
+        mean_tokens = sum(tokens for tokens, _latency in samples) / count
+        mean_latency = sum(latency for _tokens, latency in samples) / count
+        variance = sum((tokens - mean_tokens) ** 2 for tokens, _latency in samples)
+        if variance == 0:
+            return mean_latency
+        slope = sum((tokens - mean_tokens) * (latency - mean_latency) for tokens, latency in samples) / variance
+        return max(0.0, mean_latency + slope * (request_tokens - mean_tokens))
+
+    def get_stats(self, agent_id: Optional[str]) -> dict:
+        """Return the learned profile of an agent."""
+        profile = self._agents.get(agent_id or "auto", {})
+        return {
+            "agent": agent_id or "auto",
+            "max_success_tokens": profile.get("max_success_tokens"),
+            "min_failure_tokens": profile.get("min_failure_tokens"),
+            "latency_samples": len(profile.get("latency_samples", [])),
+            "prompt_formats": {
+                prompt_format: {
+                    "requests": totals["requests"],
+                    "tokens_per_entity": round(totals["prompt_tokens"] / totals["entities"], 1) if totals["entities"] else 0,
+                    "response_tokens_per_entity": round(totals.get("response_tokens", 0) / totals["entities"], 1) if totals["entities"] else 0,
+                    "parse_success_rate": round(totals["valid_results"] / totals["entities"], 3) if totals["entities"] else 0,
+                }
+                for prompt_format, totals in profile.get("prompt_formats", {}).items()
+            },
+        }
+
+    def async_schedule_save(self) -> None:
+        """Save the profiles after a short delay."""
+        self._store.async_delay_save(self._data_to_save, CAPACITY_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        estimator = get_token_estimator()
+        state = estimator.get_state()
+        if state:
+            self._estimators[estimator.name] = state
+        return {"agents": self._agents, "token_estimators": self._estimators}
+
+
+async def async_get_capacity_model(hass: HomeAssistant) -> AgentCapacityModel:
+    """Get the loaded capacity model, loading it on first use."""
+    model = hass.data.get(CAPACITY_KEY)
+    if model is None:
+        model = AgentCapacityModel(hass)
+        await model.async_load()
+        hass.data[CAPACITY_KEY] = model
+    return model
@@ -0,0 +1,132 @@
+"""
+HASS AI Agent Circuit Breaker
+Stops calling a conversation agent that keeps failing until a probe request succeeds
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Dict, Optional
+
+from .const import (
+    AGENT_CIRCUIT_FAILURE_THRESHOLD,
+    AGENT_CIRCUIT_OPEN_SECONDS,
+    AGENT_CIRCUIT_MAX_OPEN_SECONDS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"        # Requests go through
+CIRCUIT_OPEN = "open"            # Requests fail fast until the wait is over
+CIRCUIT_HALF_OPEN = "half_open"  # One probe request decides whether to close or reopen
+
+
+class AgentCircuitBreaker:
+    """Failure state of one conversation agent.
+
+    AGENT_CIRCUIT_FAILURE_THRESHOLD consecutive failures open the circuit: the
+    agent is not called for AGENT_CIRCUIT_OPEN_SECONDS. After that wait a single
+    probe request is let through; its success closes the circuit, its failure
+    reopens it with a doubled wait (up to AGENT_CIRCUIT_MAX_OPEN_SECONDS).
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = AGENT_CIRCUIT_OPEN_SECONDS
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.rejected_requests = 0
+        self.times_opened = 0
+
+    def is_available(self) -> bool:
+        """Whether a request would be let through now (does not claim the probe)."""
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN:
+            return self.retry_after() <= 0
+        return not self.probe_in_flight
+
+    def allow_request(self) -> bool:
+        """Let a request through, or count it as rejected while the circuit is open.
+
+        A request let through on a circuit that is not closed is the probe: the
+        caller must report its outcome with record_success/record_failure/record_cancelled.
+        """
+        if not self.is_available():
+            self.rejected_requests += 1
+            return False
+        if self.state != CIRCUIT_CLOSED:
+            self.state = CIRCUIT_HALF_OPEN
+            self.probe_in_flight = True
+            _LOGGER.info(f"🔌 Probing agent {self.name} after {self.open_seconds:.0f}s with an open circuit")
+        return True
+
+    def record_success(self) -> None:
+        """The agent answered: close the circuit."""
+        if self.state != CIRCUIT_CLOSED:
+            _LOGGER.info(f"✅ Agent {self.name} answered again, circuit closed")
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = AGENT_CIRCUIT_OPEN_SECONDS
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """The agent failed: open the circuit after too many failures in a row, or when the probe failed."""
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.open_seconds = min(self.open_seconds * 2, AGENT_CIRCUIT_MAX_OPEN_SECONDS)
+            self._open()
+        elif self.state == CIRCUIT_CLOSED and self.consecutive_failures >= AGENT_CIRCUIT_FAILURE_THRESHOLD:
+            self._open()
+
+    def record_cancelled(self) -> None:
+        """The request was cancelled: it says nothing about the agent, another probe may go."""
+        self.probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = CIRCUIT_OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.times_opened += 1
+        _LOGGER.warning(
+            f"🔌 Agent {self.name} failed {self.consecutive_failures} times in a row, "
+            f"circuit open for {self.open_seconds:.0f}s"
+        )
+
+    def retry_after(self) -> float:
+        """Seconds until the agent can be tried again (0 when it can be now)."""
+        if self.state != CIRCUIT_OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def get_status(self) -> dict:
+        """Return the circuit state and failure counters."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(), 1),
+            "total_failures": self.total_failures,
+            "rejected_requests": self.rejected_requests,
+            "times_opened": self.times_opened,
+        }
+
+
+_breakers: Dict[str, AgentCircuitBreaker] = {}
+
+
+def get_agent_circuit_breaker(agent_id: Optional[str]) -> AgentCircuitBreaker:
+    """Get or create the circuit breaker for a conversation agent."""
+    key = agent_id or "auto"
+    if key not in _breakers:
+        _breakers[key] = AgentCircuitBreaker(key)
+    return _breakers[key]
+
+
+def get_circuit_breaker_status() -> dict:
+    """Return the state of every agent circuit breaker."""
+    return {key: breaker.get_status() for key, breaker in _breakers.items()}
@@ -2,9 +2,48 @@ from __future__ import annotations
 
 from homeassistant import config_entries
 from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
 import voluptuous as vol
 
-from .const import DOMAIN, AI_PROVIDERS, AI_PROVIDER_LOCAL, CONF_AI_PROVIDER, CONF_CONVERSATION_AGENT, CONF_SCAN_INTERVAL
+from .const import (
+    DOMAIN,
+    AI_PROVIDERS,
+    AI_PROVIDER_LOCAL,
+    CONF_AI_PROVIDER,
+    CONF_CONVERSATION_AGENT,
+    CONF_SCAN_INTERVAL,
+    CONF_MAX_CONCURRENT_BATCHES,
+    CONF_PROMPT_TOKEN_BUDGET,
+    DEFAULT_MAX_CONCURRENT_BATCHES,
+    DEFAULT_PROMPT_TOKEN_BUDGET,
+    MAX_CONCURRENT_BATCHES,
+    MIN_PROMPT_TOKEN_BUDGET,
+    MAX_PROMPT_TOKEN_BUDGET,
+    CONF_BACKGROUND_SCAN,
+    CONF_BACKGROUND_TIME_BUDGET,
+    CONF_BACKGROUND_TOKEN_BUDGET,
+    CONF_QUIET_HOURS_START,
+    CONF_QUIET_HOURS_END,
+    DEFAULT_BACKGROUND_TIME_BUDGET,
+    DEFAULT_BACKGROUND_TOKEN_BUDGET,
+    MAX_BACKGROUND_TIME_BUDGET,
+    MIN_BACKGROUND_TOKEN_BUDGET,
+    MAX_BACKGROUND_TOKEN_BUDGET,
+    CONF_SCAN_MODE,
+    CONF_GROUP_SIMILAR,
+    CONF_PROMPT_FORMAT,
+    PROMPT_FORMATS,
+    DEFAULT_PROMPT_FORMAT,
+    CONF_RESPONSE_FORMAT,
+    RESPONSE_FORMATS,
+    DEFAULT_RESPONSE_FORMAT,
+    CONF_AGENT_POOL,
+    CONF_AGENT_MAX_CONCURRENT,
+    DEFAULT_AGENT_MAX_CONCURRENT,
+    MAX_AGENT_MAX_CONCURRENT,
+    DEFAULT_SCAN_MODE,
+    SCAN_MODES,
+)
 
 class HassAiConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Hass AI config flow."""
@@ -125,6 +164,27 @@ class HassAiOptionsFlowHandler(config_entries.OptionsFlow):
         ai_provider = self.config_entry.data.get("ai_provider", AI_PROVIDER_LOCAL)
         scan_interval = self.config_entry.options.get("scan_interval", 
                                                      self.config_entry.data.get("scan_interval", 7))
+        max_concurrent_batches = self.config_entry.options.get(CONF_MAX_CONCURRENT_BATCHES, DEFAULT_MAX_CONCURRENT_BATCHES)
+        prompt_token_budget = self.config_entry.options.get(CONF_PROMPT_TOKEN_BUDGET, DEFAULT_PROMPT_TOKEN_BUDGET)
+        scan_mode = self.config_entry.options.get(CONF_SCAN_MODE, DEFAULT_SCAN_MODE)
+        group_similar = self.config_entry.options.get(CONF_GROUP_SIMILAR, False)
+        prompt_format = self.config_entry.options.get(CONF_PROMPT_FORMAT, DEFAULT_PROMPT_FORMAT)
+        response_format = self.config_entry.options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT)
+        agent_pool = self.config_entry.options.get(CONF_AGENT_POOL, [])
+        agent_max_concurrent = self.config_entry.options.get(CONF_AGENT_MAX_CONCURRENT, DEFAULT_AGENT_MAX_CONCURRENT)
+        background_scan = self.config_entry.options.get(CONF_BACKGROUND_SCAN, True)
+        background_time_budget = self.config_entry.options.get(CONF_BACKGROUND_TIME_BUDGET, DEFAULT_BACKGROUND_TIME_BUDGET)
+        background_token_budget = self.config_entry.options.get(CONF_BACKGROUND_TOKEN_BUDGET, DEFAULT_BACKGROUND_TOKEN_BUDGET)
+        quiet_hours_start = self.config_entry.options.get(CONF_QUIET_HOURS_START)
+        quiet_hours_end = self.config_entry.options.get(CONF_QUIET_HOURS_END)
+
+        # Conversation agents that can join the agent pool
+        conversation_agents = {}
+        for entity_id in self.hass.states.async_entity_ids("conversation"):
+            state = self.hass.states.get(entity_id)
+            if state:
+                conversation_agents[entity_id] = state.attributes.get("friendly_name", entity_id)
+        agent_pool = [agent_id for agent_id in agent_pool if agent_id in conversation_agents]
 
         # Determine description based on language
         if self.hass.config.language == "it":
@@ -145,6 +205,35 @@ class HassAiOptionsFlowHandler(config_entries.OptionsFlow):
             data_schema=vol.Schema({
                 vol.Required("ai_provider", default=ai_provider): vol.In(AI_PROVIDERS),
                 vol.Optional("scan_interval", default=scan_interval): vol.All(vol.Coerce(int), vol.Range(min=1, max=30)),
+                vol.Optional(CONF_MAX_CONCURRENT_BATCHES, default=max_concurrent_batches): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=MAX_CONCURRENT_BATCHES)
+                ),
+                vol.Optional(CONF_PROMPT_TOKEN_BUDGET, default=prompt_token_budget): vol.All(
+                    vol.Coerce(int), vol.Range(min=MIN_PROMPT_TOKEN_BUDGET, max=MAX_PROMPT_TOKEN_BUDGET)
+                ),
+                vol.Optional(CONF_SCAN_MODE, default=scan_mode): vol.In(SCAN_MODES),
+                vol.Optional(CONF_GROUP_SIMILAR, default=group_similar): bool,
+                vol.Optional(CONF_PROMPT_FORMAT, default=prompt_format): vol.In(PROMPT_FORMATS),
+                vol.Optional(CONF_RESPONSE_FORMAT, default=response_format): vol.In(RESPONSE_FORMATS),
+                # Empty pool: every request goes to the configured agent
+                vol.Optional(CONF_AGENT_POOL, default=agent_pool): cv.multi_select(conversation_agents),
+                vol.Optional(CONF_AGENT_MAX_CONCURRENT, default=agent_max_concurrent): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=MAX_AGENT_MAX_CONCURRENT)
+                ),
+                vol.Optional(CONF_BACKGROUND_SCAN, default=background_scan): bool,
+                vol.Optional(CONF_BACKGROUND_TIME_BUDGET, default=background_time_budget): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=MAX_BACKGROUND_TIME_BUDGET)
+                ),
+                vol.Optional(CONF_BACKGROUND_TOKEN_BUDGET, default=background_token_budget): vol.All(
+                    vol.Coerce(int), vol.Range(min=MIN_BACKGROUND_TOKEN_BUDGET, max=MAX_BACKGROUND_TOKEN_BUDGET)
+                ),
+                # Quiet hours are optional: leave empty to allow background scans at any time
+                vol.Optional(CONF_QUIET_HOURS_START, description={"suggested_value": quiet_hours_start}): vol.All(
+                    vol.Coerce(int), vol.Range(min=0, max=23)
+                ),
+                vol.Optional(CONF_QUIET_HOURS_END, description={"suggested_value": quiet_hours_end}): vol.All(
+                    vol.Coerce(int), vol.Range(min=0, max=23)
+                ),
             }),
             description_placeholders={
                 "description": description
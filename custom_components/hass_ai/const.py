@@ -4,6 +4,19 @@ DOMAIN = "hass_ai"
 CONF_AI_PROVIDER = "ai_provider"
 CONF_CONVERSATION_AGENT = "conversation_agent"
 CONF_SCAN_INTERVAL = "scan_interval"
+CONF_MAX_CONCURRENT_BATCHES = "max_concurrent_batches"
+CONF_PROMPT_TOKEN_BUDGET = "prompt_token_budget"
+CONF_BACKGROUND_SCAN = "background_scan"
+CONF_BACKGROUND_TIME_BUDGET = "background_time_budget"
+CONF_BACKGROUND_TOKEN_BUDGET = "background_token_budget"
+CONF_QUIET_HOURS_START = "quiet_hours_start"
+CONF_QUIET_HOURS_END = "quiet_hours_end"
+CONF_SCAN_MODE = "scan_mode"
+CONF_GROUP_SIMILAR = "group_similar_entities"
+CONF_PROMPT_FORMAT = "prompt_format"
+CONF_RESPONSE_FORMAT = "response_format"
+CONF_AGENT_POOL = "agent_pool"
+CONF_AGENT_MAX_CONCURRENT = "agent_max_concurrent"
 
 # AI Provider options - Only Local Agent supported
 AI_PROVIDER_LOCAL = "Local Agent"
@@ -53,12 +66,147 @@ MAX_TOKEN_ERROR_KEYWORDS = [
     "quota",
     "rate limit"
 ]
+# Phrases of real context-length errors: only these (or a reported token count) teach the capacity model a limit
+CONTEXT_LENGTH_ERROR_KEYWORDS = [
+    "context length",
+    "context window",
+    "maximum context",
+    "prompt is too long",
+    "input too large",
+    "too many tokens",
+    "token limit",
+]
+
+# Adaptive pacing (no delay unless the agent is rate limiting or overloaded)
+RATE_LIMIT_ERROR_KEYWORDS = [
+    "rate limit",
+    "rate_limit",
+    "ratelimit",
+    "too many requests",
+    "429",
+    "overloaded",
+    "resource exhausted",
+    "resource_exhausted",
+    "try again later",
+    "server busy"
+]
+PACING_MAX_DELAY = 30.0                # seconds
+PACING_BACKOFF_STEP = 1.0              # First delay after a rate-limit error (doubles after)
+PACING_RECOVERY_FACTOR = 0.5           # Delay multiplier after each healthy response
+PACING_OVERLOAD_LATENCY_FACTOR = 3.0   # Latency above N x baseline means overloaded
+PACING_LATENCY_SMOOTHING = 0.3         # EWMA weight of the newest latency sample
+PACING_MAX_RATE_LIMIT_RETRIES = 3      # Re-sends of the same batch after rate-limit errors
 
 # Dynamic batch size management
 MIN_BATCH_SIZE = 1
 MAX_BATCH_SIZE = 50
 DEFAULT_BATCH_SIZE = 10
-BATCH_REDUCTION_FACTOR = 0.8  # Reduce by 20% each time
+MAX_ENTITY_RETRIES = 2  # Re-sends of an entity the agent skipped or answered badly
+
+# Token-budget batching (entities are packed into prompts by estimated size)
+DEFAULT_PROMPT_TOKEN_BUDGET = 2000  # Prompt + expected answer tokens per batch
+MIN_PROMPT_TOKEN_BUDGET = 500
+MAX_PROMPT_TOKEN_BUDGET = 32000
+MIN_ENTITY_TOKEN_BUDGET = 100       # Never leave less than this for entity lines
+RESPONSE_TOKENS_PER_ENTITY = 40     # Expected JSON answer size for one entity
+
+# Token estimation
+TOKEN_ESTIMATE_CACHE_SIZE = 20000   # Cached per-line estimates (entity lines repeat across batches)
+TOKEN_CALIBRATION_SMOOTHING = 0.3   # Weight of a new observed/estimated ratio
+TOKEN_CALIBRATION_MIN = 0.5         # Observed ratios outside this range are ignored
+TOKEN_CALIBRATION_MAX = 2.0
+
+# Learned per-agent capacity (request size limits and latency)
+CAPACITY_SAFETY_MARGIN = 0.85   # Start scans this far below the smallest failed request
+CAPACITY_LATENCY_SAMPLES = 50   # Recent (tokens, latency) samples kept per agent
+CAPACITY_SAVE_DELAY = 10        # seconds
+CAPACITY_LIMIT_TTL_DAYS = 7     # A learned token limit is forgotten after this, so scans probe above it again
+
+# AI result cache (keyed by entity fingerprint + prompt version)
+RESULT_CACHE_TTL_DAYS = 30
+RESULT_CACHE_MAX_ENTRIES = 20000
+RESULT_CACHE_SAVE_DELAY = 10  # seconds
+
+# Incremental rescans driven by registry changes
+INCREMENTAL_SCAN_DELAY = 60   # seconds of registry quiet before analyzing changes
+INCREMENTAL_BATCH_SIZE = 5    # Changed entities per background batch
+INCREMENTAL_MAX_RETRIES = 3   # Runs an entity is retried after errors or fallback-only results
+EXCLUDED_SCAN_DOMAINS = ["persistent_notification", "system_log"]
+
+# States that carry no information for the analysis (compared lowercased)
+INVALID_STATES = frozenset({"unavailable", "unknown", "error", "null", "", "none"})
+
+# Scan modes: "ai" sends every entity to the agent, "hybrid" lets confident rules answer first
+SCAN_MODE_AI = "ai"
+SCAN_MODE_HYBRID = "hybrid"
+SCAN_MODES = [SCAN_MODE_AI, SCAN_MODE_HYBRID]
+DEFAULT_SCAN_MODE = SCAN_MODE_AI
+PRECLASSIFY_MIN_CONFIDENCE = 0.85  # Rule classifications below this still go to the agent
+
+# Prompt formats: "full" describes entities in free-form lines, "table" is a compact coded table
+PROMPT_FORMAT_FULL = "full"
+PROMPT_FORMAT_TABLE = "table"
+PROMPT_FORMATS = [PROMPT_FORMAT_FULL, PROMPT_FORMAT_TABLE]
+DEFAULT_PROMPT_FORMAT = PROMPT_FORMAT_FULL
+
+# Response formats: "json" keyed objects, "positional" rows [index, rating, category bits, U/S, reason]
+RESPONSE_FORMAT_JSON = "json"
+RESPONSE_FORMAT_POSITIONAL = "positional"
+RESPONSE_FORMATS = [RESPONSE_FORMAT_JSON, RESPONSE_FORMAT_POSITIONAL]
+DEFAULT_RESPONSE_FORMAT = RESPONSE_FORMAT_JSON
+POSITIONAL_CATEGORY_BITS = {"DATA": 1, "CONTROL": 2, "ALERTS": 4, "SERVICE": 8}
+POSITIONAL_REASON_MAX_LENGTH = 80
+RESPONSE_TOKENS_PER_ENTITY_POSITIONAL = 25  # Expected positional answer size for one entity
+
+# Alert threshold generation
+THRESHOLD_LEVELS = ["LOW", "MEDIUM", "HIGH"]
+THRESHOLD_BATCH_MAX_ENTITIES = 25  # Entities per threshold request to the agent
+
+# Background threshold work queue (thresholds are generated after the scan, off its critical path)
+THRESHOLD_QUEUE_CONCURRENCY = 2      # Threshold requests in flight at once
+THRESHOLD_QUEUE_MIN_INTERVAL = 2.0   # seconds between the starts of two threshold requests
+THRESHOLD_QUEUE_IDLE_DELAY = 30      # seconds to wait while an interactive operation is running
+THRESHOLD_QUEUE_SAVE_DELAY = 10      # seconds to batch queue writes to storage
+EVENT_THRESHOLDS_UPDATED = f"{DOMAIN}_thresholds_updated"  # Fired with the new auto_thresholds for the panel
+THRESHOLD_CHECKPOINT_INTERVAL = 15     # seconds between checkpoint saves of a threshold generation run
+SCAN_CHECKPOINT_SAVE_DELAY = 10        # seconds to batch checkpoint writes of a running entity scan
+
+# Agent request scheduling (all features share the agent through priority lanes)
+AGENT_LANE_ALERTS = "alerts"            # Alert messages
+AGENT_LANE_INTERACTIVE = "interactive"  # Single-entity work the user is waiting for
+AGENT_LANE_BACKGROUND = "background"    # Scans, threshold and correlation runs
+AGENT_REQUEST_LANES = [AGENT_LANE_ALERTS, AGENT_LANE_INTERACTIVE, AGENT_LANE_BACKGROUND]  # Priority order
+AGENT_LANE_WEIGHTS = {AGENT_LANE_ALERTS: 8, AGENT_LANE_INTERACTIVE: 4, AGENT_LANE_BACKGROUND: 1}  # Grants per round while lanes compete
+
+# Agent pool (several conversation agents share the requests)
+DEFAULT_AGENT_MAX_CONCURRENT = 1   # Requests in flight per pooled agent
+MAX_AGENT_MAX_CONCURRENT = 4       # Hard upper bound for the option
+AGENT_POOL_LATENCY_SMOOTHING = 0.3 # Weight of the newest latency in the moving average
+AGENT_POOL_DEFAULT_LATENCY = 10.0  # seconds assumed for an agent without any answer yet
+AGENT_POOL_MIN_WEIGHT_RATIO = 0.2  # Agents weighted below this share of the best one wait instead of taking requests
+
+# Agent circuit breaker (a failing agent is not called again until a probe request succeeds)
+AGENT_CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failed requests that open the circuit
+AGENT_CIRCUIT_OPEN_SECONDS = 30.0    # First wait before a probe request
+AGENT_CIRCUIT_MAX_OPEN_SECONDS = 600.0  # Longest wait, doubled after every failed probe
+AGENT_UNAVAILABLE_RETRY_DELAY = 2.0  # seconds a scan worker waits at least before asking the agent again
+AGENT_UNAVAILABLE_MAX_WAIT = 300     # seconds a scan waits for an unavailable agent before it stops (and stays resumable)
+
+# Near-duplicate grouping (one representative per cluster is analyzed)
+GROUPING_MIN_CLUSTER_SIZE = 3  # Smaller clusters are analyzed entity by entity
+
+# Background rescans of stale entities (periodic scan)
+BACKGROUND_SCAN_TICK_MINUTES = 60       # How often the scheduler looks for stale entities
+BACKGROUND_SCAN_CHUNK_SIZE = 10         # Entities per background request round
+DEFAULT_BACKGROUND_TIME_BUDGET = 10     # minutes per run
+MAX_BACKGROUND_TIME_BUDGET = 120
+DEFAULT_BACKGROUND_TOKEN_BUDGET = 20000  # estimated tokens per run
+MIN_BACKGROUND_TOKEN_BUDGET = 1000
+MAX_BACKGROUND_TOKEN_BUDGET = 1000000
+
+# Concurrent batch dispatch
+DEFAULT_MAX_CONCURRENT_BATCHES = 2  # Batches in flight at once
+MAX_CONCURRENT_BATCHES = 8          # Hard upper bound for the option
 
 # Error messages for token limits
 TOKEN_LIMIT_ERROR_MESSAGE = (
@@ -17,3 +17,16 @@ class ConfigurationError(HassAiError):
 
 class EntityAnalysisError(HassAiError):
     """Error during entity analysis."""
+
+
+class AgentUnavailableError(AIProviderError):
+    """The conversation agent failed to answer, or is not called while its circuit is open."""
+
+    def __init__(self, message: str, agent_id: str = None, retry_after: float = 0.0) -> None:
+        super().__init__(message)
+        self.agent_id = agent_id
+        self.retry_after = retry_after  # seconds before the agent is tried again
+
+
+class AgentCircuitOpenError(AgentUnavailableError):
+    """The agent failed repeatedly and its circuit breaker rejects requests for now."""
@@ -0,0 +1,116 @@
+"""
+HASS AI Entity Grouping
+Clusters structurally identical entities so one representative is analyzed per cluster
+"""
+from __future__ import annotations
+
+import copy
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant, State
+
+from .registry_index import async_get_registry_index
+
+_LOGGER = logging.getLogger(__name__)
+
+_DIGITS = re.compile(r"\d+")
+_TRAILING_NUMBER = re.compile(r"_?\d+$")
+
+
+def _slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def _device_names(hass: HomeAssistant, states: List[State]) -> Dict[str, str]:
+    """Slugified device name of each entity that belongs to a device."""
+    registry_index = async_get_registry_index(hass)
+    names = {}
+    for state in states:
+        device_name = registry_index.device_name(state.entity_id)
+        if device_name:
+            names[state.entity_id] = _slugify(device_name)
+    return names
+
+
+def entity_pattern(state: State, device_slug: str = None) -> Optional[str]:
+    """Normalized name pattern: the part of the object_id that is not the device name.
+
+    sensor.kitchen_motion_battery and sensor.hall_door_battery of the devices
+    "Kitchen Motion" and "Hall Door" both become "battery"; sensor.meter_power_l1
+    of the device "Meter" becomes "power_l#". Without a device name only numbered
+    entities have a pattern (sensor.power_1 and sensor.power_2 become "power#"):
+    binary_sensor.front_door and binary_sensor.fridge_door are different things.
+    """
+    object_id = state.entity_id.split(".", 1)[1]
+    if device_slug and object_id.startswith(f"{device_slug}_"):
+        return _DIGITS.sub("#", object_id[len(device_slug) + 1:])
+    if _TRAILING_NUMBER.search(object_id) and not object_id.isdigit():
+        return _TRAILING_NUMBER.sub("#", object_id)
+    return None
+
+
+def cluster_key(state: State, device_slug: str = None) -> Optional[Tuple[str, str, str, str]]:
+    """Entities with the same key are analyzed once; None for entities that are never grouped."""
+    pattern = entity_pattern(state, device_slug)
+    if pattern is None:
+        return None
+    attributes = state.attributes
+    return (
+        state.domain,
+        attributes.get("device_class") or "",
+        attributes.get("unit_of_measurement") or "",
+        pattern,
+    )
+
+
+def group_similar_states(
+    hass: HomeAssistant, states: List[State], min_cluster_size: int
+) -> Tuple[List[State], Dict[str, List[State]]]:
+    """Split states into representatives and the members each representative stands for.
+
+    Clusters smaller than min_cluster_size are not grouped: their entities are all
+    representatives of themselves.
+    """
+    device_names = _device_names(hass, states)
+    clusters: Dict[Tuple[str, str, str, str], List[State]] = {}
+    representatives = []
+    for state in states:
+        key = cluster_key(state, device_names.get(state.entity_id))
+        if key is None:
+            representatives.append(state)
+            continue
+        clusters.setdefault(key, []).append(state)
+
+    members: Dict[str, List[State]] = {}
+    for cluster in clusters.values():
+        if len(cluster) < min_cluster_size:
+            representatives.extend(cluster)
+            continue
+        representatives.append(cluster[0])
+        members[cluster[0].entity_id] = cluster[1:]
+
+    # Keep the original scan order
+    order = {state.entity_id: index for index, state in enumerate(states)}
+    representatives.sort(key=lambda state: order[state.entity_id])
+
+    if members:
+        grouped = sum(len(cluster) for cluster in members.values())
+        _LOGGER.info(f"🧬 Grouped {grouped} near-duplicate entities into {len(members)} clusters, {len(representatives)} entities left to analyze")
+    return representatives, members
+
+
+def fan_out_result(result: dict, member: State, area: str = None, reason: str = "") -> dict:
+    """Copy a representative's result to another member of its cluster.
+
+    The representative's reason is replaced, since it describes (and often names) that entity.
+    """
+    member_result = copy.deepcopy(result)
+    member_result["entity_id"] = member.entity_id
+    member_result["grouped_from"] = result["entity_id"]
+    member_result["reason"] = reason
+    member_result.pop("area", None)
+    if area:
+        member_result["area"] = area
+    return member_result
@@ -0,0 +1,242 @@
+"""
+HASS AI Incremental Scanner
+Re-analyzes only entities that were added, renamed or moved to another area
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from homeassistant.core import HomeAssistant, Event, callback
+from homeassistant.helpers import entity_registry as er, device_registry as dr, area_registry as ar
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    DOMAIN,
+    AI_PROVIDER_LOCAL,
+    CONF_CONVERSATION_AGENT,
+    INCREMENTAL_SCAN_DELAY,
+    INCREMENTAL_BATCH_SIZE,
+    INCREMENTAL_MAX_RETRIES,
+    EXCLUDED_SCAN_DOMAINS,
+    AGENT_UNAVAILABLE_RETRY_DELAY,
+)
+from .exceptions import AgentUnavailableError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Entity registry changes that alter what the AI sees about an entity
+RELEVANT_ENTITY_CHANGES = {
+    "entity_id", "name", "original_name", "area_id", "device_id",
+    "device_class", "original_device_class", "unit_of_measurement",
+}
+
+# Device registry changes that alter the entities of the device
+RELEVANT_DEVICE_CHANGES = {"area_id", "name", "name_by_user"}
+
+
+class IncrementalScanner:
+    """Keeps AI results fresh by analyzing registry changes in small background batches"""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config: dict,
+        store_results: Callable[[list], Awaitable[None]],
+        removed_entities: Callable[[list], Awaitable[None]],
+    ):
+        self.hass = hass
+        self.config = config
+        self._store_results = store_results
+        self._removed_entities = removed_entities
+        self.dirty_entities: Set[str] = set()
+        self._retries: Dict[str, int] = {}
+        self._removed: Set[str] = set()
+        self._unsub_listeners: list = []
+        self._unsub_timer: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+        self.analyzed_count = 0
+
+    async def async_setup(self) -> None:
+        """Subscribe to entity, device and area registry updates."""
+        self._unsub_listeners = [
+            self.hass.bus.async_listen(er.EVENT_ENTITY_REGISTRY_UPDATED, self._handle_entity_registry_updated),
+            self.hass.bus.async_listen(dr.EVENT_DEVICE_REGISTRY_UPDATED, self._handle_device_registry_updated),
+            self.hass.bus.async_listen(ar.EVENT_AREA_REGISTRY_UPDATED, self._handle_area_registry_updated),
+        ]
+        _LOGGER.info("🔭 Incremental scanner listening for registry changes")
+
+    async def async_unload(self) -> None:
+        """Stop listening and cancel pending work."""
+        for unsub in self._unsub_listeners:
+            unsub()
+        self._unsub_listeners = []
+        if self._unsub_timer:
+            self._unsub_timer()
+            self._unsub_timer = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+        _LOGGER.info("Incremental scanner stopped")
+
+    @callback
+    def _handle_entity_registry_updated(self, event: Event) -> None:
+        """Mark created, renamed or re-areaed entities as dirty."""
+        action = event.data.get("action")
+        entity_id = event.data.get("entity_id")
+        if not entity_id:
+            return
+
+        if action == "remove":
+            self.dirty_entities.discard(entity_id)
+            self._removed.add(entity_id)
+            self._schedule()
+            return
+
+        if action == "create":
+            self._mark_dirty([entity_id])
+            return
+
+        if action == "update":
+            changes = event.data.get("changes", {})
+            if not RELEVANT_ENTITY_CHANGES.intersection(changes):
+                return
+            old_entity_id = event.data.get("old_entity_id")
+            if old_entity_id and old_entity_id != entity_id:
+                self.dirty_entities.discard(old_entity_id)
+                self._removed.add(old_entity_id)
+            self._mark_dirty([entity_id])
+
+    @callback
+    def _handle_device_registry_updated(self, event: Event) -> None:
+        """Mark the entities of a moved or renamed device as dirty."""
+        if event.data.get("action") != "update":
+            return
+        if not RELEVANT_DEVICE_CHANGES.intersection(event.data.get("changes", {})):
+            return
+
+        entity_registry = er.async_get(self.hass)
+        entries = er.async_entries_for_device(entity_registry, event.data["device_id"])
+        # Entities with their own area are not affected by the device area
+        self._mark_dirty([entry.entity_id for entry in entries if not entry.area_id])
+
+    @callback
+    def _handle_area_registry_updated(self, event: Event) -> None:
+        """Mark the entities of a renamed area as dirty."""
+        if event.data.get("action") != "update":
+            return
+
+        area_id = event.data.get("area_id")
+        entity_registry = er.async_get(self.hass)
+        device_registry = dr.async_get(self.hass)
+
+        entity_ids = [entry.entity_id for entry in er.async_entries_for_area(entity_registry, area_id)]
+        for device in dr.async_entries_for_area(device_registry, area_id):
+            entity_ids.extend(
+                entry.entity_id
+                for entry in er.async_entries_for_device(entity_registry, device.id)
+                if not entry.area_id
+            )
+        self._mark_dirty(entity_ids)
+
+    @callback
+    def _mark_dirty(self, entity_ids: list) -> None:
+        entity_ids = [entity_id for entity_id in entity_ids if self._should_scan(entity_id)]
+        if not entity_ids:
+            return
+        for entity_id in entity_ids:
+            # A new change deserves a fresh set of retries
+            self._retries.pop(entity_id, None)
+        self.dirty_entities.update(entity_ids)
+        _LOGGER.debug(f"🔭 Marked {len(entity_ids)} entities for incremental analysis ({len(self.dirty_entities)} pending)")
+        self._schedule()
+
+    @callback
+    def _schedule(self, delay: float = INCREMENTAL_SCAN_DELAY) -> None:
+        """Debounce registry bursts (integration reloads, bulk renames) into one run."""
+        if self._unsub_timer:
+            self._unsub_timer()
+        self._unsub_timer = async_call_later(self.hass, delay, self._start_processing)
+
+    @callback
+    def _start_processing(self, _now=None) -> None:
+        self._unsub_timer = None
+        if self._task and not self._task.done():
+            # The running task picks up the new dirty entities
+            return
+        self._task = self.hass.async_create_task(self._async_process_dirty())
+
+    async def _async_process_dirty(self) -> None:
+        """Analyze dirty entities in small batches until none are left."""
+        from .intelligence import get_entities_importance_batched
+
+        if self._removed:
+            removed = list(self._removed)
+            self._removed.clear()
+            await self._removed_entities(removed)
+
+        conversation_agent = self.config.get(CONF_CONVERSATION_AGENT, "auto")
+        language = self.hass.config.language or "en"
+        retry_later: Set[str] = set()
+        retry_in = AGENT_UNAVAILABLE_RETRY_DELAY
+
+        while self.dirty_entities:
+            batch_ids = [self.dirty_entities.pop() for _ in range(min(INCREMENTAL_BATCH_SIZE, len(self.dirty_entities)))]
+            states = [state for state in (self.hass.states.get(entity_id) for entity_id in batch_ids) if state]
+            if not states:
+                continue
+
+            _LOGGER.info(f"🔭 Incremental analysis of {len(states)} changed entities ({len(self.dirty_entities)} still pending)")
+            try:
+                results = await get_entities_importance_batched(
+                    self.hass, states, INCREMENTAL_BATCH_SIZE, AI_PROVIDER_LOCAL, None, None, None,
+                    conversation_agent, language, max_concurrent_batches=1
+                )
+            except AgentUnavailableError as e:
+                # Keep the entities and try again once the agent's circuit lets requests through
+                self.dirty_entities.update(batch_ids)
+                retry_in = max(e.retry_after, AGENT_UNAVAILABLE_RETRY_DELAY)
+                _LOGGER.warning(f"🔌 Incremental analysis paused, agent unavailable: {e} (retry in {retry_in:.0f}s)")
+                break
+            except Exception as e:
+                # The entities are analyzed with the next run
+                _LOGGER.error(f"Error during incremental analysis: {e}")
+                retry_later.update(batch_ids)
+                break
+
+            # Only real analyses: a stored fallback would look fresh and never be rescanned
+            fresh = [result for result in results if result.get("analysis_method") in ("ai_conversation", "rule_based")]
+            if fresh:
+                await self._store_results(fresh)
+                self.analyzed_count += len(fresh)
+            fresh_ids = {result["entity_id"] for result in fresh}
+            for entity_id in fresh_ids:
+                self._retries.pop(entity_id, None)
+            retry_later.update(state.entity_id for state in states if state.entity_id not in fresh_ids)
+
+        self._requeue(retry_later)
+        if self.dirty_entities:
+            self._schedule(retry_in)
+
+    def _requeue(self, entity_ids: Iterable[str]) -> None:
+        """Put entities back for the next run, at most INCREMENTAL_MAX_RETRIES times each."""
+        for entity_id in entity_ids:
+            retries = self._retries.get(entity_id, 0) + 1
+            if retries > INCREMENTAL_MAX_RETRIES:
+                self._retries.pop(entity_id, None)
+                _LOGGER.warning(f"🔭 Giving up incremental analysis of {entity_id} after {INCREMENTAL_MAX_RETRIES} retries")
+                continue
+            self._retries[entity_id] = retries
+            self.dirty_entities.add(entity_id)
+
+    def _should_scan(self, entity_id: str) -> bool:
+        domain = entity_id.split(".")[0]
+        return domain != DOMAIN and domain not in EXCLUDED_SCAN_DOMAINS
+
+    def get_status(self) -> dict:
+        """Return the incremental scanner status."""
+        return {
+            "pending_entities": len(self.dirty_entities),
+            "running": bool(self._task and not self._task.done()),
+            "analyzed_entities": self.analyzed_count,
+        }
@@ -2,21 +2,58 @@ from __future__ import annotations
 import logging
 import json
 import asyncio
+import hashlib
+import time
+from collections import deque
 from datetime import datetime
 from typing import Optional
 
 from .const import (
     AI_PROVIDER_LOCAL, 
-    CONF_CONVERSATION_AGENT, 
     MAX_TOKEN_ERROR_KEYWORDS,
-    TOKEN_LIMIT_ERROR_MESSAGE,
-    MIN_BATCH_SIZE,
-    BATCH_REDUCTION_FACTOR
+    MAX_BATCH_SIZE,
+    RESPONSE_TOKENS_PER_ENTITY,
+    MIN_ENTITY_TOKEN_BUDGET,
+    DEFAULT_MAX_CONCURRENT_BATCHES,
+    MAX_CONCURRENT_BATCHES,
+    PACING_MAX_RATE_LIMIT_RETRIES,
+    PRECLASSIFY_MIN_CONFIDENCE,
+    GROUPING_MIN_CLUSTER_SIZE,
+    MAX_ENTITY_RETRIES,
+    INVALID_STATES,
+    PROMPT_FORMAT_FULL,
+    PROMPT_FORMAT_TABLE,
+    RESPONSE_FORMAT_JSON,
+    RESPONSE_FORMAT_POSITIONAL,
+    RESPONSE_TOKENS_PER_ENTITY_POSITIONAL,
+    POSITIONAL_REASON_MAX_LENGTH,
+    THRESHOLD_LEVELS,
+    THRESHOLD_BATCH_MAX_ENTITIES,
+    AGENT_LANE_BACKGROUND,
+    AGENT_LANE_INTERACTIVE,
+    AGENT_UNAVAILABLE_RETRY_DELAY,
+    AGENT_UNAVAILABLE_MAX_WAIT
 )
 from homeassistant.core import HomeAssistant, State
 from homeassistant.components import conversation, websocket_api
 from homeassistant.exceptions import HomeAssistantError
 from .ai_logger import AILogger
+from .pacing import get_agent_pacer, is_rate_limited_response
+from .batching import pack_by_token_budget
+from .result_cache import async_get_result_cache, entity_fingerprint
+from .preclassifier import preclassify_entity
+from .grouping import group_similar_states, fan_out_result
+from .response_parser import parse_json_items, decode_positional_item
+from .capacity import CAPACITY_KEY, async_get_capacity_model
+from .token_estimator import get_token_estimator, extract_actual_tokens, is_context_length_error
+from .registry_index import async_get_registry_index
+from .keywords import keyword_tags, matched_keywords
+from .prompt_encoding import table_row, encode_entity_table
+from .threshold_queue import THRESHOLD_QUEUE_KEY
+from .request_scheduler import agent_request_slot
+from .agent_pool import AGENT_POOL_KEY, agent_lease
+from .circuit_breaker import get_agent_circuit_breaker
+from .exceptions import AgentUnavailableError, AgentCircuitOpenError
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,8 +68,25 @@ def _get_ai_logger(hass: HomeAssistant) -> AILogger:
     return _ai_logger
 
 def _estimate_tokens(text: str) -> int:
-    """Estimate token count for text (rough approximation: 1 token ≈ 4 characters)."""
-    return len(text) // 4
+    """Estimate token count for text with the active token estimator."""
+    return get_token_estimator().estimate(text)
+
+def _estimate_line_tokens(line: str) -> int:
+    """Estimate token count of an entity line (cached, lines repeat across batches)."""
+    return get_token_estimator().estimate_line(line)
+
+def _batch_token_stats(prompt: str, response_text: Optional[str]) -> dict:
+    """Token and size statistics of one agent request."""
+    response_text = response_text or ""
+    prompt_tokens = _estimate_tokens(prompt)
+    response_tokens = _estimate_tokens(response_text)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "total_tokens": prompt_tokens + response_tokens,
+        "prompt_chars": len(prompt),
+        "response_chars": len(response_text),
+    }
 
 def _get_localized_message(message_key: str, language: str, **kwargs) -> str:
     """Get localized messages based on language."""
@@ -58,15 +112,40 @@ def _get_localized_message(message_key: str, language: str, **kwargs) -> str:
         'token_limit_message': {
             'it': f"Scansione fermata al gruppo {kwargs.get('batch')}. Riprova con gruppi più piccoli.",
             'en': f"Scan stopped at group {kwargs.get('batch')}. Try again with smaller groups."
+        },
+        'grouped_reason': {
+            'it': "Valutazione condivisa con entità simili dello stesso tipo",
+            'en': "Rating shared with similar entities of the same type"
         }
     }
     
     return messages.get(message_key, {}).get('it' if is_italian else 'en', f"Message key '{message_key}' not found")
 
-def _create_localized_prompt(batch_states: list[State], entity_details: list[str], language: str, compact_mode: bool = False, analysis_type: str = "comprehensive") -> str:
-    """Create a comprehensive prompt for entity analysis that includes all types of analysis."""
+def _positional_response_spec(is_italian: bool) -> str:
+    """Instructions of the positional answer: one [row, rating, category bits, U/S, reason] array per entity."""
+    if is_italian:
+        return (
+            f"Rispondi SOLO con un array JSON compatto, una riga per entità: [#,rating,categorie,gestione,\"reason\"]\n"
+            f"# = numero di riga; rating 0-5; categorie = somma di DATA 1, CONTROL 2, ALERTS 4, SERVICE 8; "
+            f"gestione \"U\" (USER) o \"S\" (SERVICE); reason max {POSITIONAL_REASON_MAX_LENGTH} caratteri.\n"
+            f"Esempio: [[0,4,5,\"U\",\"Temperatura cucina per comfort e allarmi\"]]"
+        )
+    return (
+        f"Reply ONLY with a compact JSON array, one row per entity: [#,rating,categories,management,\"reason\"]\n"
+        f"# = row number; rating 0-5; categories = sum of DATA 1, CONTROL 2, ALERTS 4, SERVICE 8; "
+        f"management \"U\" (USER) or \"S\" (SERVICE); reason max {POSITIONAL_REASON_MAX_LENGTH} characters.\n"
+        f"Example: [[0,4,5,\"U\",\"Kitchen temperature for comfort and alerts\"]]"
+    )
+
+def _create_localized_prompt(batch_states: list[State], entity_details: list[str], language: str, compact_mode: bool = False, analysis_type: str = "comprehensive", prompt_format: str = PROMPT_FORMAT_FULL, response_format: str = RESPONSE_FORMAT_JSON) -> str:
+    """Create a comprehensive prompt for entity analysis that includes all types of analysis.
+    
+    With the table prompt format entity_details are table rows (see prompt_encoding). With
+    the positional response format the entities are numbered and the agent answers with
+    positional rows instead of keyed objects (the compact prompt always asks for objects)."""
     
     is_italian = language.startswith('it')
+    positional = response_format == RESPONSE_FORMAT_POSITIONAL
     
     if compact_mode:
         # Ultra-compact prompt when hitting token limits
@@ -90,6 +169,42 @@ def _create_localized_prompt(batch_states: list[State], entity_details: list[str
                 f"REASON: Explain WHY this score (e.g., 'bedroom light control', 'temperature monitoring', 'device battery'). Entities: " + ", ".join(entity_summary[:30])
             )
     
+    if prompt_format == PROMPT_FORMAT_TABLE:
+        # Minimal instructions, entities as table rows with areas coded once
+        area_legend, entity_table = encode_entity_table(entity_details, numbered=positional)
+        if is_italian:
+            prompt = (
+                f"Valuta {len(batch_states)} entità Home Assistant per utilità domotica, 0-5 (0=inutile, 5=essenziale; salute, sicurezza e protezione mai basse).\n"
+                f"category: tutte quelle applicabili tra DATA (dati/misure), CONTROL (controllabile), ALERTS (batterie, aggiornamenti, guasti, salute o valori estremi), SERVICE (usata da automazioni/API).\n"
+                f"management_type: USER (controllo diretto) o SERVICE (automazioni, cloud, telecamere).\n"
+                f"reason: cosa fa l'entità e perché è utile.\n"
+                + (_positional_response_spec(is_italian) if positional else (
+                    f"Rispondi SOLO con un array JSON, un oggetto per riga:\n"
+                    f"[{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"...\",\"category\":[\"DATA\"],\"management_type\":\"USER\"}}]"
+                )) + "\n"
+                f"Righe: name \"-\" = come entity_id; area \"-\" = nessuna.\n"
+                f"Aree: {area_legend or '-'}\n" + entity_table
+            )
+        else:
+            prompt = (
+                f"Rate {len(batch_states)} Home Assistant entities for smart home usefulness, 0-5 (0=useless, 5=essential; health, safety and security are never low).\n"
+                f"category: every one that applies of DATA (information/measurements), CONTROL (controllable), ALERTS (batteries, updates, faults, health or extreme values), SERVICE (used by automations/APIs).\n"
+                f"management_type: USER (controlled directly) or SERVICE (automations, cloud, cameras).\n"
+                f"reason: what the entity does and why it matters.\n"
+                + (_positional_response_spec(is_italian) if positional else (
+                    f"Reply ONLY with a JSON array, one object per row:\n"
+                    f"[{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"...\",\"category\":[\"DATA\"],\"management_type\":\"USER\"}}]"
+                )) + "\n"
+                f"Rows: name \"-\" = same as entity_id; area \"-\" = none.\n"
+                f"Areas: {area_legend or '-'}\n" + entity_table
+            )
+        _LOGGER.info(f"Prompt tokens estimated: {_estimate_tokens(prompt)}, type: {analysis_type}, format: table, response: {response_format}")
+        return prompt
+    
+    if positional:
+        # Positional answers refer to entities by their line number
+        entity_details = [f"{index}: {line}" for index, line in enumerate(entity_details)]
+    
     # Comprehensive analysis prompt that covers all aspects
     if is_italian:
         prompt = (
@@ -113,7 +228,7 @@ def _create_localized_prompt(batch_states: list[State], entity_details: list[str
             f"• Sensore presenza: ['DATA']\n"
             f"• Conversation agent: ['CONTROL', 'SERVICE']\n"
             f"\nAssegna tutte le categorie che si applicano.\n"
-            f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"DESCRIZIONE SPECIFICA del valore\",\"category\":[\"DATA\",\"ALERTS\",\"CONTROL\",\"SERVICE\"],\"management_type\":\"USER/SERVICE\"}}]\n"
+            + (f"\n{_positional_response_spec(is_italian)}\n" if positional else f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"DESCRIZIONE SPECIFICA del valore\",\"category\":[\"DATA\",\"ALERTS\",\"CONTROL\",\"SERVICE\"],\"management_type\":\"USER/SERVICE\"}}]\n") +
             f"- ALERTS: Monitoraggio critico (batterie, salute fuori norma, emergenze, manutenzione)\n"
             f"\nVALUTAZIONE ALERTS:\n"
             f"• Sensori batteria → SEMPRE ALERTS\n"
@@ -125,7 +240,7 @@ def _create_localized_prompt(batch_states: list[State], entity_details: list[str
             f"- SERVICE: Richiede automazioni/servizi (conversation, telecamere, cloud)\n"
             f"\nREASON: Spiega COSA FA e PERCHÉ è importante per casa intelligente O benessere personale!\n"
             f"ESEMPI BUONI: 'Monitora saturazione ossigeno per salute cardiovascolare', 'Controlla illuminazione per comfort', 'Rileva presenza per sicurezza'\n"
-            f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"DESCRIZIONE SPECIFICA del valore per domotica/salute/benessere\",\"category\":\"DATA/CONTROL/ALERTS\",\"management_type\":\"USER/SERVICE\"}}]\n"
+            + ("" if positional else f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"DESCRIZIONE SPECIFICA del valore per domotica/salute/benessere\",\"category\":\"DATA/CONTROL/ALERTS\",\"management_type\":\"USER/SERVICE\"}}]\n") +
             f"REASON OBBLIGATORIO: NON sottovalutare mai i parametri di salute! Saturazione ossigeno, battito cardiaco, pressione sono VITALI. Descrivi COSA FA l'entità e PERCHÉ è importante per domotica/salute/benessere!\n\n" + "\n".join(entity_details)
         )
     else:
@@ -154,7 +269,7 @@ def _create_localized_prompt(batch_states: list[State], entity_details: list[str
             f"- USER: User controls directly\n"
             f"- SERVICE: Requires automations/services (conversation, cameras, cloud)\n"
             f"\nREASON: Explain WHAT IT DOES and WHY it's important for at least ONE of the 4 criteria above!\n"
-            f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"SPECIFIC description of value\",\"category\":[\"DATA\",\"ALERTS\"] or [\"CONTROL\"] etc,\"management_type\":\"USER/SERVICE\"}}]\n" + "\n".join(entity_details)
+            + (f"\n{_positional_response_spec(is_italian)}\n" if positional else f"\nJSON: [{{\"entity_id\":\"...\",\"rating\":0-5,\"reason\":\"SPECIFIC description of value\",\"category\":[\"DATA\",\"ALERTS\"] or [\"CONTROL\"] etc,\"management_type\":\"USER/SERVICE\"}}]\n") + "\n".join(entity_details)
         )
     
     # Log token estimation
@@ -163,6 +278,26 @@ def _create_localized_prompt(batch_states: list[State], entity_details: list[str
     
     return prompt
 
+# Hash of the analysis prompt templates, computed once
+_prompt_version: Optional[str] = None
+
+def _get_prompt_version() -> str:
+    """Get a version hash of the prompt templates used by _create_localized_prompt.
+    
+    Rendering the templates without entities leaves only the instruction text, so any
+    change to the templates changes the hash and invalidates cached results."""
+    global _prompt_version
+    if _prompt_version is None:
+        templates = [
+            _create_localized_prompt([], [], language, compact_mode=compact_mode, prompt_format=prompt_format, response_format=response_format)
+            for language in ("en", "it")
+            for compact_mode in (False, True)
+            for prompt_format in (PROMPT_FORMAT_FULL, PROMPT_FORMAT_TABLE)
+            for response_format in (RESPONSE_FORMAT_JSON, RESPONSE_FORMAT_POSITIONAL)
+        ]
+        _prompt_version = hashlib.sha1("\n".join(templates).encode("utf-8")).hexdigest()[:12]
+    return _prompt_version
+
 # Entity importance categories for better classification
 ENTITY_IMPORTANCE_MAP = {
     "climate": 4,  # HVAC controls are typically important
@@ -191,19 +326,18 @@ def _auto_categorize_entity(state: State) -> tuple[list[str], str]:
     attributes = state.attributes
     entity_state = state.state
     
-    categories = []
+    tags = keyword_tags(entity_id)
     
     # Skip entities with invalid states - they shouldn't be analyzed
-    invalid_states = ['unavailable', 'unknown', 'error', 'null', '', 'none', 'None']
-    if entity_state is None or str(entity_state).lower() in [s.lower() for s in invalid_states]:
+    if entity_state is None or str(entity_state).lower() in INVALID_STATES:
         return ['DATA'], 'USER'  # Minimal fallback category for invalid entities
     
     # Battery sensors should be both DATA and ALERTS
-    if 'battery' in entity_id.lower() or attributes.get('battery_level') is not None:
+    if 'battery' in tags or attributes.get('battery_level') is not None:
         return ['DATA', 'ALERTS'], 'USER'  # Data for monitoring + alerts for low battery
     
     # Update entities are both DATA and ALERTS
-    if domain == 'update' or 'update' in entity_id.lower():
+    if domain == 'update' or 'update' in tags:
         return ['DATA', 'ALERTS'], 'SERVICE'  # Information + maintenance alerts
     
     # Domain-based categorization with multi-category support
@@ -218,31 +352,30 @@ def _auto_categorize_entity(state: State) -> tuple[list[str], str]:
         return ['DATA'], 'SERVICE'
     elif domain in ['sensor', 'binary_sensor']:
         # Improved sensor categorization with multi-category support
-        entity_lower = entity_id.lower()
         
         # Health and fitness sensors - can have alerts for out-of-range values
-        if any(keyword in entity_lower for keyword in ['heart_rate', 'calories', 'steps', 'distance', 'sleep', 'weight', 'blood', 'fitness', 'oxygen', 'saturation', 'pulse', 'bp', 'pressure', 'glucose', 'cholesterol', 'bmi', 'body_mass', 'hydration', 'stress', 'recovery']):
+        if 'health_metric' in tags:
             # Health sensors provide data but can also alert if values are abnormal
             return ['DATA', 'ALERTS'], 'USER'
         
         # Environmental sensors that can trigger alerts
-        if any(keyword in entity_lower for keyword in ['wind', 'storm', 'flood', 'earthquake', 'emergency']):
+        if 'severe_weather' in tags:
             return ['DATA', 'ALERTS'], 'USER'
         
         # Temperature sensors - data + alerts for extreme values
-        if any(keyword in entity_lower for keyword in ['temperature', 'temp', 'temperatura']):
+        if 'temperature_any' in tags:
             return ['DATA', 'ALERTS'], 'USER'
         
         # Humidity sensors - data + alerts for extreme values
-        if any(keyword in entity_lower for keyword in ['humidity', 'umidita', 'umidità', 'moisture']):
+        if 'humidity_any' in tags:
             return ['DATA', 'ALERTS'], 'USER'
         
         # Average/Mean sensors for important metrics (like temperatura_media_casa)
-        if any(keyword in entity_lower for keyword in ['media', 'average', 'mean', 'avg']) and any(metric in entity_lower for metric in ['temperature', 'temp', 'humidity', 'umidita', 'energia', 'energy', 'power', 'potenza']):
+        if 'average' in tags and 'average_metric' in tags:
             return ['DATA', 'ALERTS'], 'USER'
             
         # System diagnostic sensors
-        if any(keyword in entity_lower for keyword in ['rssi', 'linkquality', 'uptime', 'memory', 'cpu', 'disk', 'connection']):
+        if 'system_diagnostic' in tags:
             return ['DATA'], 'SERVICE'
         
         # Default sensors are DATA only
@@ -260,29 +393,28 @@ def _auto_categorize_entity(state: State) -> tuple[list[str], str]:
         return ['CONTROL'], 'USER'
     elif domain == 'input_text':
         # Special case: HASS AI alerts entity should not be categorized as ALERT
-        if 'hass_ai_alerts' in entity_id.lower():
+        if 'hass_ai_alerts' in tags:
             return ['CONTROL'], 'SERVICE'  # It's a service entity for HASS AI
         return ['CONTROL'], 'USER'
     elif domain in ['alert', 'automation']:
         return ['ALERTS'], 'SERVICE'
     else:
         # Enhanced pattern matching for unknown domains
-        entity_lower = entity_id.lower()
         
         # Weather patterns - for custom weather sensors
-        if any(keyword in entity_lower for keyword in ['meteo', 'weather', 'forecast', 'temperatura', 'temperature', 'humidity', 'pressure', 'wind', 'rain', 'snow', 'precipitation']):
+        if 'weather_info' in tags:
             return ['DATA'], 'USER'
         
         # Health and wellness patterns - data + alerts
-        if any(keyword in entity_lower for keyword in ['health', 'heart', 'calories', 'steps', 'fitness', 'sleep', 'weight', 'oxygen', 'saturation', 'pulse', 'blood', 'pressure', 'glucose', 'bmi', 'hydration', 'stress', 'recovery']):
+        if 'wellness' in tags:
             return ['DATA', 'ALERTS'], 'USER'
         
         # Alert patterns - only alerts
-        if any(keyword in entity_lower for keyword in ['error', 'warning', 'alert', 'alarm']):
+        if 'alert_word' in tags:
             return ['ALERTS'], 'USER'
         
         # Control patterns  
-        if any(keyword in entity_lower for keyword in ['switch', 'control', 'toggle', 'button', 'command']):
+        if 'control_word' in tags:
             return ['CONTROL'], 'USER'
             
         # Default to DATA for informational entities
@@ -297,13 +429,148 @@ ALERT_SEVERITY_LEVELS = {
 }
 
 # Auto-threshold generation for different entity types
-async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state: State) -> dict:
-    """Generate automatic thresholds for an entity using AI evaluation."""
+def _needs_ai_thresholds(entity_id: str, state: State) -> bool:
+    """Check if an entity warrants AI-generated alert thresholds (inclusive on purpose)."""
+    domain = state.domain
+    attributes = state.attributes
+    unit = attributes.get('unit_of_measurement', '')
+    device_class = attributes.get('device_class', '')
+    tags = keyword_tags(entity_id)
+    
+    if domain == 'binary_sensor':
+        return (device_class in ['battery', 'problem', 'safety', 'smoke', 'gas', 'moisture', 'update'] or
+                'binary_threshold' in tags)
+    
+    if domain == 'sensor':
+        try:
+            float(state.state)
+        except (ValueError, TypeError):
+            # Even non-numeric sensors might need thresholds if they're alert-related
+            return 'text_threshold' in tags
+        # VERY inclusive criteria for sensors that need thresholds
+        return ('numeric_threshold' in tags or
+                device_class in ['battery', 'temperature', 'humidity', 'signal_strength', 'power'] or
+                'update' in tags or 
+                'health' in tags or
+                unit in ['%', 'percent', '°C', '°F', 'bpm', 'mmHg'] or
+                ('hp_printer' in tags and 'ink' in tags) or  # HP ink sensors
+                'oxygen_saturation' in tags)  # Health sensors
+    
+    # Update entities should always have thresholds
+    return domain == 'update'
+
+
+def _create_threshold_prompt(states: list[State]) -> str:
+    """Create one threshold prompt for several entities, answered with a JSON object keyed by entity_id."""
+    entity_lines = [
+        f"{state.entity_id} ({state.state}, {state.attributes.get('unit_of_measurement') or '-'}, {state.attributes.get('device_class') or '-'})"
+        for state in states
+    ]
+    return (
+        f"🎯 Genera soglie di allerta per {len(states)} entità Home Assistant.\n"
+        f"Per OGNI entità TUTTE E 3 le soglie LOW, MEDIUM, HIGH (gravità crescente): "
+        f"{{\"value\":numero,\"operator\":\"<\",\"description\":\"problema\"}}\n"
+        f"• operator: \"<\" sotto soglia (batterie, freddo), \">\" sopra soglia (caldo, CPU), \"==\" o \"!=\" per stati\n"
+        f"• value: SOLO numero senza unità; per sensori binari lo stato di PROBLEMA (\"on\"/\"off\") con \"==\"\n"
+        f"ESEMPI: batterie < 30/20/10; temperature casa < 15/10/5 o > 28/32/35; umidità < 30/25/20 o > 70/80/90; "
+        f"vento > 20/40/60; CPU > 70/85/95; battiti < 50/40/35 o > 100/120/140; fumo/gas/problema == \"on\"; connettività == \"off\"\n"
+        f"Rispondi SOLO con un oggetto JSON con chiave entity_id:\n"
+        f"{{\"sensor.x\":{{\"LOW\":{{...}},\"MEDIUM\":{{...}},\"HIGH\":{{...}}}}}}\n"
+        f"Entità (entity_id, stato, unità, device_class):\n" + "\n".join(entity_lines)
+    )
+
+
+async def _query_ai_thresholds(hass: HomeAssistant, states: list[State], conversation_agent: str, request_lane: str = AGENT_LANE_BACKGROUND) -> dict:
+    """Ask the agent for the thresholds of several entities at once.
+    
+    Returns the results of the entities that got all 3 levels; the others are left to the caller."""
+    ai_logger = _get_ai_logger(hass)
+    prompt = _create_threshold_prompt(states)
+    entity_ids = [state.entity_id for state in states]
+    results = {}
+    
+    try:
+        _LOGGER.debug(f"Generating AI thresholds for {len(states)} entities in one request")
+        ai_logger.log_prompt(prompt, context={
+            "entity_ids": entity_ids,
+            "entities_count": len(states),
+            "analysis_type": "threshold_generation"
+        })
+        
+        response_text = await _query_local_agent(hass, prompt, conversation_agent, request_lane)
+        ai_logger.log_response(response_text, context={
+            "entity_ids": entity_ids,
+            "analysis_type": "threshold_generation",
+            "response_length": len(response_text)
+        })
+        
+        # One object keyed by entity_id; tolerate an array of objects carrying their entity_id
+        thresholds_by_entity = {}
+        parsed_items, _parser = parse_json_items(response_text)
+        for item in parsed_items:
+            if not isinstance(item, dict):
+                continue
+            if "entity_id" in item:
+                thresholds_by_entity[item["entity_id"]] = item
+            else:
+                thresholds_by_entity.update(item)
+        
+        for entity_id in entity_ids:
+            threshold_data = thresholds_by_entity.get(entity_id)
+            if not isinstance(threshold_data, dict):
+                _LOGGER.debug(f"No AI thresholds for {entity_id} in the batched answer")
+                continue
+            missing_levels = [level for level in THRESHOLD_LEVELS if not isinstance(threshold_data.get(level), dict)]
+            if missing_levels:
+                _LOGGER.warning(f"❌ AI response for {entity_id} missing levels: {missing_levels}")
+                continue
+            results[entity_id] = {
+                "auto_generated": True,
+                "thresholds": {level: threshold_data[level] for level in THRESHOLD_LEVELS},
+                "entity_type": "ai_generated"
+            }
+        
+        _LOGGER.debug(f"AI generated thresholds for {len(results)}/{len(states)} entities in one request")
+    except AgentUnavailableError:
+        # Rule-based thresholds would silently replace the AI ones: the caller decides
+        raise
+    except Exception as e:
+        ai_logger.log_error(f"AI threshold generation failed for {len(states)} entities", str(e), context={
+            "entity_ids": entity_ids,
+            "error_type": "threshold_generation_error",
+            "analysis_type": "threshold_generation"
+        })
+        _LOGGER.warning(f"❌ AI threshold generation failed for {len(states)} entities: {e}")
+    
+    return results
+
+
+async def generate_auto_thresholds_batch(hass: HomeAssistant, states: list[State], conversation_agent: Optional[str] = None, request_lane: str = AGENT_LANE_BACKGROUND) -> dict:
+    """Generate automatic thresholds for several entities, keyed by entity_id.
+    
+    The entities that warrant AI thresholds are sent to the agent together (up to
+    THRESHOLD_BATCH_MAX_ENTITIES per request). Entities the agent skipped or answered
+    incompletely, and every entity when no agent is given, get the rule-based thresholds.
+    Raises AgentUnavailableError when the agent does not answer."""
+    results = {}
+    
+    ai_states = [state for state in states if _needs_ai_thresholds(state.entity_id, state)] if conversation_agent else []
+    for start in range(0, len(ai_states), THRESHOLD_BATCH_MAX_ENTITIES):
+        results.update(await _query_ai_thresholds(hass, ai_states[start:start + THRESHOLD_BATCH_MAX_ENTITIES], conversation_agent, request_lane))
+    
+    for state in states:
+        if state.entity_id not in results:
+            results[state.entity_id] = _fallback_thresholds(state.entity_id, state)
+    return results
+
+
+def _fallback_thresholds(entity_id: str, state: State) -> dict:
+    """Rule-based thresholds for obvious cases (batteries, temperatures, updates...)."""
     domain = state.domain
     attributes = state.attributes
     current_value = state.state
+    device_class = attributes.get('device_class', '')
     
-    # Default thresholds
     result = {
         "auto_generated": True,
         "thresholds": {},
@@ -311,207 +578,31 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
     }
     
     try:
-        # Get conversation agent for AI threshold generation
-        conversation_agent = hass.data.get("hass_ai", {}).get("conversation_agent")
-        if conversation_agent:
-            # Create AI prompt for threshold generation
-            unit = attributes.get('unit_of_measurement', '')
-            device_class = attributes.get('device_class', '')
-            
-            # Check if this entity warrants alert thresholds - be more inclusive
-            needs_thresholds = False
-            entity_lower = entity_id.lower()
-            
-            if domain == 'binary_sensor':
-                device_class = attributes.get('device_class', '')
-                if (device_class in ['battery', 'problem', 'safety', 'smoke', 'gas', 'moisture', 'update'] or
-                    any(keyword in entity_lower for keyword in ['battery', 'update', 'problem', 'error', 'warning', 'alert'])):
-                    needs_thresholds = True
-                    
-            elif domain == 'sensor':
-                try:
-                    num_value = float(current_value)
-                    # VERY inclusive criteria for sensors that need thresholds
-                    if (any(keyword in entity_lower for keyword in [
-                        'battery', 'temperature', 'humidity', 'wind', 'cpu', 'memory', 'disk', 
-                        'signal', 'rssi', 'heart_rate', 'blood', 'weight', 'calories', 'steps',
-                        'oxygen', 'saturation', 'spo2', 'pulse', 'pressure', 'ink', 'toner',
-                        'cartridge', 'level', 'remaining', 'health', 'sensor', 'monitor'
-                    ]) or
-                        device_class in ['battery', 'temperature', 'humidity', 'signal_strength', 'power'] or
-                        'update' in entity_lower or 
-                        'health' in entity_lower or
-                        unit in ['%', 'percent', '°C', '°F', 'bpm', 'mmHg'] or
-                        ('hp_' in entity_lower and 'ink' in entity_lower) or  # HP ink sensors
-                        'oxygen' in entity_lower or 'saturation' in entity_lower):  # Health sensors
-                        needs_thresholds = True
-                        _LOGGER.debug(f"Entity {entity_id} marked for thresholds: numeric sensor with relevant keywords")
-                except (ValueError, TypeError):
-                    # Even non-numeric sensors might need thresholds if they're alert-related
-                    if any(keyword in entity_lower for keyword in ['battery', 'update', 'status', 'state', 'error', 'warning', 'ink', 'toner']):
-                        needs_thresholds = True
-                        _LOGGER.debug(f"Entity {entity_id} marked for thresholds: non-numeric but alert-related")
-            
-            elif domain == 'update':
-                # Update entities should always have thresholds
-                needs_thresholds = True
-            
-            if needs_thresholds:
-                # Enhanced AI-generated thresholds prompt with binary sensor support
-                if domain == 'binary_sensor':
-                    threshold_prompt = (
-                        f"Analizza il sensore binario: {entity_id}\n"
-                        f"Stato attuale: {current_value}\n"
-                        f"Tipo dispositivo: {device_class}\n"
-                        f"Dominio: {domain}\n\n"
-                        f"Per sensori binari, determina quale stato rappresenta un PROBLEMA/PERICOLO:\n\n"
-                        f"ESEMPI:\n"
-                        f"• Batteria scarica: 'on' = problema (LOW)\n"
-                        f"• Problema/errore: 'on' = problema (MEDIUM)\n"
-                        f"• Fumo/gas: 'on' = pericolo (HIGH)\n"
-                        f"• Porta/finestra: 'on' = aperta (context-dependent)\n"
-                        f"• Connettività: 'off' = disconnesso (problema)\n\n"
-                        f"Rispondi in JSON: {{\"alert_state\":\"on/off\",\"severity\":\"LOW/MEDIUM/HIGH\",\"description\":\"descrizione problema\"}}"
-                    )
-                else:
-                    threshold_prompt = (
-                        f"🎯 ANALISI SOGLIE INTELLIGENTI per: {entity_id}\n"
-                        f"📊 Valore attuale: {current_value} {unit}\n"
-                        f"🏷️ Tipo dispositivo: {device_class}\n"
-                        f"🔧 Dominio: {domain}\n\n"
-                        f"🚨 Genera 3 soglie di allerta (LOW, MEDIUM, HIGH) specifiche per questa entità:\n\n"
-                        f"📋 ESEMPI PER CATEGORIA:\n"
-                        f"• 🔋 Batterie: LOW=30, MEDIUM=20, HIGH=10 (valori percentuali)\n"
-                        f"• 🌡️ Temperature casa: LOW=15, MEDIUM=10, HIGH=5 (freddo) o LOW=28, MEDIUM=32, HIGH=35 (caldo)\n"
-                        f"• 💧 Umidità: LOW=30, MEDIUM=25, HIGH=20 (secco) o LOW=70, MEDIUM=80, HIGH=90 (umido)\n"
-                        f"• 💨 Vento: LOW=20, MEDIUM=40, HIGH=60\n"
-                        f"• 💻 CPU/Sistema: LOW=70, MEDIUM=85, HIGH=95\n"
-                        f"• ❤️ Battiti cardiaci: LOW=50, MEDIUM=40, HIGH=35 (basso) o LOW=100, MEDIUM=120, HIGH=140 (alto)\n"
-                        f"• 📦 Update: disponibilità aggiornamenti\n\n"
-                        f"🔥 OBBLIGATORIO: TUTTE E 3 LE SOGLIE (LOW, MEDIUM, HIGH)!\n\n"
-                        f"⚡ FORMATO RICHIESTO - SOGLIE VALUTABILI DALL'AI:\n"
-                        f"{{\"LOW\":{{\"value\":numero,\"operator\":\"<\",\"description\":\"problema lieve\"}},\"MEDIUM\":{{\"value\":numero,\"operator\":\"<\",\"description\":\"problema medio\"}},\"HIGH\":{{\"value\":numero,\"operator\":\"<\",\"description\":\"problema grave\"}}}}\n\n"
-                        f"🎯 OPERATORI DISPONIBILI:\n"
-                        f"• \"<\" per valori sotto soglia (batterie, temperature basse)\n"
-                        f"• \">\" per valori sopra soglia (temperature alte, CPU)\n"
-                        f"• \"==\" per valori esatti (stati, stringhe)\n"
-                        f"• \"!=\" per valori diversi\n\n"
-                        f"🚨 IMPORTANTE: \n"
-                        f"- value deve essere SOLO NUMERO (senza unità)\n"
-                        f"- operator deve essere uno dei 4 simboli sopra\n"
-                        f"- description breve e chiara del problema\n\n"
-                        f"🚨 NON dimenticare nessuna delle 3 soglie!"
-                    )
-                
-                try:
-                    # Initialize AI logger
-                    ai_logger = _get_ai_logger(hass)
-                    
-                    # Send to AI for threshold generation with enhanced logging
-                    _LOGGER.debug(f"Generating AI thresholds for {entity_id} (domain: {domain}, device_class: {device_class})")
-                    
-                    # Log the threshold prompt
-                    ai_logger.log_prompt(threshold_prompt, context={
-                        "entity_id": entity_id,
-                        "domain": domain,
-                        "device_class": device_class,
-                        "current_state": str(state.state),
-                        "unit_of_measurement": attributes.get('unit_of_measurement', ''),
-                        "analysis_type": "threshold_generation"
-                    })
-                    
-                    ai_response = await conversation_agent.async_process(threshold_prompt, None, None)
-                    
-                    if ai_response and hasattr(ai_response, 'response') and ai_response.response:
-                        # Try to parse AI response
-                        import json
-                        response_text = ai_response.response.speech.get('plain', {}).get('speech', '') if hasattr(ai_response.response, 'speech') else str(ai_response.response)
-                        
-                        # Log the AI response
-                        ai_logger.log_response(response_text, context={
-                            "entity_id": entity_id,
-                            "analysis_type": "threshold_generation",
-                            "response_length": len(response_text)
-                        })
-                        
-                        _LOGGER.debug(f"🤖 AI Response for {entity_id}: {response_text[:200]}...")
-                        
-                        # Extract JSON from response
-                        json_start = response_text.find('{')
-                        json_end = response_text.rfind('}') + 1
-                        if json_start >= 0 and json_end > json_start:
-                            try:
-                                threshold_data = json.loads(response_text[json_start:json_end])
-                                
-                                # Validate that all 3 thresholds are present
-                                required_levels = ['LOW', 'MEDIUM', 'HIGH']
-                                missing_levels = [level for level in required_levels if level not in threshold_data]
-                                
-                                if missing_levels:
-                                    _LOGGER.warning(f"❌ AI response for {entity_id} missing levels: {missing_levels}")
-                                    _LOGGER.warning(f"❌ Partial response: {threshold_data}")
-                                else:
-                                    _LOGGER.debug(f"AI generated ALL 3 thresholds for {entity_id}: {threshold_data}")
-                                    result.update({
-                                        "entity_type": "ai_generated",
-                                        "thresholds": threshold_data
-                                    })
-                                    return result
-                                    
-                            except json.JSONDecodeError as je:
-                                # Log JSON parse error
-                                ai_logger.log_error(f"JSON parse error for thresholds: {entity_id}", str(je), context={
-                                    "entity_id": entity_id,
-                                    "error_type": "json_decode_error",
-                                    "raw_response": response_text[json_start:json_end] if 'json_start' in locals() and 'json_end' in locals() else response_text,
-                                    "analysis_type": "threshold_generation"
-                                })
-                                
-                                _LOGGER.warning(f"❌ JSON parse error for {entity_id}: {je}")
-                                _LOGGER.warning(f"❌ Raw response: {response_text[json_start:json_end]}")
-                        else:
-                            _LOGGER.warning(f"❌ No valid JSON found in AI response for {entity_id}")
-                    else:
-                        _LOGGER.warning(f"❌ Empty AI response for {entity_id}")
-                            
-                except Exception as e:
-                    # Log threshold generation error
-                    ai_logger.log_error(f"AI threshold generation failed: {entity_id}", str(e), context={
-                        "entity_id": entity_id,
-                        "domain": domain,
-                        "device_class": device_class,
-                        "error_type": "threshold_generation_error",
-                        "analysis_type": "threshold_generation"
-                    })
-                    
-                    _LOGGER.warning(f"❌ AI threshold generation failed for {entity_id}: {e}")
-        
-        # Fallback to basic thresholds for obvious cases
+        tags = keyword_tags(entity_id)
         if domain == 'binary_sensor':
             device_class = attributes.get('device_class', '')
-            entity_lower = entity_id.lower()
             
             # Identify what should trigger alerts for binary sensors
             if (device_class in ['battery', 'problem', 'safety', 'smoke', 'gas', 'moisture', 'motion', 'door', 'window', 'connectivity', 'update'] or
-                any(keyword in entity_lower for keyword in ['battery', 'problem', 'error', 'offline', 'disconnected', 'fault', 'alarm', 'warning', 'update', 'maintenance'])):
+                'binary_alert' in tags):
                 
                 # Determine what state is "alerting" based on device class and name patterns
                 alert_state = 'on'  # Default
                 alert_description = "Sensor activated"
                 
-                if device_class == 'battery' or 'battery' in entity_lower:
+                if device_class == 'battery' or 'battery' in tags:
                     alert_state = 'on'  # Battery low = on
                     alert_description = "Battery is low"
-                elif device_class in ['problem', 'safety', 'smoke', 'gas'] or any(word in entity_lower for word in ['problem', 'error', 'fault', 'smoke', 'gas']):
+                elif device_class in ['problem', 'safety', 'smoke', 'gas'] or 'problem' in tags:
                     alert_state = 'on'  # Problem detected = on
                     alert_description = "Problem detected"
-                elif device_class == 'connectivity' or any(word in entity_lower for word in ['offline', 'disconnected', 'connection']):
+                elif device_class == 'connectivity' or 'disconnected' in tags:
                     alert_state = 'off'  # Disconnected = off
                     alert_description = "Device disconnected"
-                elif device_class == 'update' or 'update' in entity_lower:
+                elif device_class == 'update' or 'update' in tags:
                     alert_state = 'on'  # Update available = on
                     alert_description = "Update available"
-                elif device_class in ['door', 'window'] or any(word in entity_lower for word in ['door', 'window']):
+                elif device_class in ['door', 'window'] or 'opening' in tags:
                     alert_state = 'on'  # Open = on (may be alerting depending on context)
                     alert_description = "Opening detected"
                 
@@ -532,10 +623,9 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                 num_value = float(current_value)
                 unit = attributes.get('unit_of_measurement', '')
                 device_class = attributes.get('device_class', '')
-                entity_lower = entity_id.lower()
                 
                 # Battery percentage - only generate if clearly a battery sensor
-                if (device_class == 'battery' or 'battery_level' in entity_lower) and 0 <= num_value <= 100:
+                if (device_class == 'battery' or 'battery_level' in tags) and 0 <= num_value <= 100:
                     result.update({
                         "entity_type": "battery_percent",
                         "thresholds": {
@@ -546,7 +636,7 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                     })
                 
                 # Temperature sensors (°C)
-                elif (device_class == 'temperature' or 'temperature' in entity_lower) and unit in ['°C', 'C']:
+                elif (device_class == 'temperature' or 'temperature' in tags) and unit in ['°C', 'C']:
                     if 5 <= num_value <= 40:  # Reasonable indoor range
                         result.update({
                             "entity_type": "temperature_indoor",
@@ -558,7 +648,7 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                         })
                 
                 # Heart rate sensors (BPM)
-                elif any(keyword in entity_lower for keyword in ['heart_rate', 'pulse', 'bpm']) and 30 <= num_value <= 200:
+                elif 'heart_rate' in tags and 30 <= num_value <= 200:
                     result.update({
                         "entity_type": "heart_rate",
                         "thresholds": {
@@ -569,7 +659,7 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                     })
                 
                 # CPU/Memory usage (percentage)
-                elif any(keyword in entity_lower for keyword in ['cpu', 'memory', 'disk']) and 0 <= num_value <= 100:
+                elif 'system_usage' in tags and 0 <= num_value <= 100:
                     result.update({
                         "entity_type": "system_usage",
                         "thresholds": {
@@ -580,7 +670,7 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                     })
                 
                 # Signal strength (negative dBm or positive %)
-                elif any(keyword in entity_lower for keyword in ['rssi', 'signal', 'linkquality']):
+                elif 'signal' in tags:
                     if unit == 'dBm' and -100 <= num_value <= 0:
                         result.update({
                             "entity_type": "signal_dbm",
@@ -593,7 +683,7 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
                         
             except (ValueError, TypeError):
                 # Non-numeric sensor - check for update sensors
-                if 'update' in entity_lower or device_class == 'update':
+                if 'update' in tags or device_class == 'update':
                     result.update({
                         "entity_type": "update_status",
                         "thresholds": {
@@ -615,10 +705,11 @@ async def _generate_auto_thresholds(hass: HomeAssistant, entity_id: str, state:
             })
                 
     except Exception as e:
-        _LOGGER.warning(f"Error generating auto-thresholds for {entity_id}: {e}")
+        _LOGGER.warning(f"Error generating fallback thresholds for {entity_id}: {e}")
     
     return result
 
+
 # Alert Severity Levels for user notification thresholds (moved definition)
 ALERT_SEVERITY_LEVELS = {
     "MEDIUM": {
@@ -869,10 +960,38 @@ async def get_entities_importance_batched(
     conversation_agent: str = None,
     language: str = "en",  # Add language parameter
     analysis_type: str = "importance",  # Add analysis type parameter
-    cancellation_check: callable = None  # Function to check if operation is cancelled
+    cancellation_check: callable = None,  # Function to check if operation is cancelled
+    max_concurrent_batches: int = DEFAULT_MAX_CONCURRENT_BATCHES,  # Batches in flight at once
+    token_budget: int = None,  # Prompt token budget per batch (None = cut by batch_size)
+    use_cache: bool = True,  # Serve unchanged entities from the result cache
+    preclassify: bool = False,  # Classify confident cases by rules instead of asking the agent
+    group_similar: bool = False,  # Analyze one representative per cluster of near-duplicate entities
+    prompt_format: str = PROMPT_FORMAT_FULL,  # Entity encoding in the prompt (full lines or compact table)
+    response_format: str = RESPONSE_FORMAT_JSON,  # Answer contract (keyed objects or positional rows)
+    resume_state: dict = None,  # Checkpoint of an interrupted scan: completed results, batch jobs and token budget
+    checkpoint_callback: callable = None,  # Receives the progress after every batch job, to persist a checkpoint
+    request_lane: str = AGENT_LANE_BACKGROUND  # Priority lane of the agent requests
 ) -> list[dict]:
     """Calculate the importance of multiple entities using external AI providers in batches with dynamic size reduction.
     
+    Entities whose fingerprint (identity, area, language and prompt version) is in the
+    result cache are answered without calling the agent. With preclassify, entities that a
+    rule classifies with high confidence (batteries, updates, diagnostics...) are not sent
+    to the agent either. With group_similar, structurally identical entities (same domain,
+    device_class, unit and name pattern) are analyzed once and the representative's result
+    is copied to the other members with their own area. With the positional response_format the
+    agent answers with [row, rating, category bits, U/S, reason] rows that are decoded back to
+    the same results. With a token_budget, entities are packed into each prompt by the estimated size of their
+    rendered line instead of batch_size. Up to max_concurrent_batches batches are sent to the
+    agent at the same time; a batch that hits the token limit is split in half until the oversized entity is isolated.
+    Entities the agent skipped or answered with a malformed item are queued again on their
+    own (up to MAX_ENTITY_RETRIES times) while the valid results of the batch are kept.
+    After every batch job, checkpoint_callback gets the results so far, the remaining batch jobs
+    and the token budget in use; passing that back as resume_state continues the scan from there.
+    When the agent does not answer, the batch is kept and its worker waits for the agent's
+    circuit breaker; once the agent has been unavailable for AGENT_UNAVAILABLE_MAX_WAIT seconds
+    the scan raises AgentUnavailableError instead of padding the remaining entities with fallbacks.
+    
     analysis_type can be: 'importance', 'health', 'enhanced'
     """
     
@@ -881,13 +1000,12 @@ async def get_entities_importance_batched(
         return []
     
     # Filter out entities with invalid/unavailable states before AI analysis
-    invalid_states = ['unavailable', 'unknown', 'error', 'null', '', 'none', 'None']
     original_count = len(states)
     filtered_states = []
     skipped_entities = []
     
     for state in states:
-        if state.state is None or str(state.state).lower() in [s.lower() for s in invalid_states]:
+        if state.state is None or str(state.state).lower() in INVALID_STATES:
             skipped_entities.append(state.entity_id)
             # Create a fallback result for skipped entities
             continue
@@ -945,150 +1063,471 @@ async def get_entities_importance_batched(
         return all_results
     
     all_results = []
-    current_batch_size = batch_size
-    remaining_states = states.copy()
-    overall_batch_num = 0
-    token_limit_retries = 0
-    max_retries = 3
-    use_compact_mode = False  # Start with full mode
-    
-    # Token usage tracking
+    
+    # Results of an interrupted scan are kept, only its unfinished entities are analyzed
+    completed_ids = set()
+    if resume_state:
+        state_ids = {state.entity_id for state in states}
+        for result in resume_state.get("results", []):
+            if result.get("entity_id") not in state_ids or result["entity_id"] in completed_ids:
+                continue
+            completed_ids.add(result["entity_id"])
+            all_results.append(result)
+            if connection and msg_id:
+                connection.send_message(websocket_api.event_message(msg_id, {
+                    "type": "entity_result",
+                    "result": result
+                }))
+        token_budget = resume_state.get("token_budget") or token_budget
+        _LOGGER.info(f"♻️ Resuming scan: {len(completed_ids)} results from the checkpoint, {len(states) - len(completed_ids)} entities left")
+    pending_states = [state for state in states if state.entity_id not in completed_ids]
+    
+    # Serve entities whose identity did not change from the result cache, only send misses to the agent
+    result_cache = None
+    fingerprints = {}
+    if use_cache:
+        prompt_version = _get_prompt_version()
+        result_cache = await async_get_result_cache(hass, prompt_version)
+        cache_misses = []
+        for state in states:
+            fingerprint = entity_fingerprint(state, _get_entity_area(hass, state.entity_id), language, prompt_version)
+            fingerprints[state.entity_id] = fingerprint
+            if state.entity_id in completed_ids:
+                continue
+            cached_result = result_cache.get(fingerprint)
+            if cached_result is None:
+                cache_misses.append(state)
+                continue
+            
+            cached_result["from_cache"] = True
+            cached_result["batch_number"] = 0
+            all_results.append(cached_result)
+            if connection and msg_id:
+                connection.send_message(websocket_api.event_message(msg_id, {
+                    "type": "entity_result",
+                    "result": cached_result
+                }))
+        
+        _LOGGER.info(f"🗃️ Result cache: {len(all_results) - len(completed_ids)} hits, {len(cache_misses)} entities to analyze")
+        analysis_states = cache_misses
+    else:
+        analysis_states = pending_states
+    # With an agent pool, every pooled agent gets batches in flight
+    agent_pool = hass.data.get(AGENT_POOL_KEY)
+    if agent_pool is not None:
+        max_concurrent_batches = max(int(max_concurrent_batches or 1), agent_pool.capacity)
+    max_concurrent_batches = max(1, min(int(max_concurrent_batches or 1), MAX_CONCURRENT_BATCHES))
+    
+    # Token usage tracking (shared by all batch workers)
     total_tokens_used = 0
     total_prompt_chars = 0
     total_response_chars = 0
-    
-    _LOGGER.info(f"🚀 Starting batch processing with initial batch size: {current_batch_size}")
-    
-    hass_id = id(hass)
-    while remaining_states:
-        # STOP: Check if operation was cancelled using the provided callback
-        if cancellation_check and cancellation_check():
-            _LOGGER.info("🛑 Batch analysis STOPPED by user request (immediate)")
-            break
-        overall_batch_num += 1
-        
-        # Take entities for current batch
-        batch_states = remaining_states[:current_batch_size]
-        
-        _LOGGER.info(f"📦 Processing batch {overall_batch_num} with {len(batch_states)} entities (batch size: {current_batch_size}, retry: {token_limit_retries}, compact: {use_compact_mode})")
-        
-        # Send batch info to frontend
-        if connection and msg_id:
-            connection.send_message(websocket_api.event_message(msg_id, {
-                "type": "batch_info",
-                "data": {
-                    "batch_number": overall_batch_num,
-                    "batch_size": current_batch_size,
-                    "entities_in_batch": len(batch_states),
-                    "remaining_entities": len(remaining_states) - len(batch_states),
-                    "retry_attempt": token_limit_retries,
-                    "compact_mode": use_compact_mode,
-                    "total_entities": len(states),
-                    "processed_entities": len(all_results)
-                }
-            }))
+    batch_counter = 0
+    
+    # Start from what the agents are known to handle instead of rediscovering their limits through failures.
+    # With a pool, batches fit the largest agent: each request only goes to agents large enough for it
+    capacity = await async_get_capacity_model(hass)
+    scan_agents = agent_pool.agent_ids if agent_pool is not None else [conversation_agent]
+    agent_budgets = [capacity.recommended_token_budget(agent_id, token_budget) for agent_id in scan_agents]
+    learned_budget = None if None in agent_budgets else max(agent_budgets)
+    configured_token_budget = token_budget
+    if learned_budget != token_budget:
+        if token_budget is None:
+            _LOGGER.info(f"🧠 Packing batches by the learned token budget {learned_budget} of agents {', '.join(map(str, scan_agents))} instead of batch size {batch_size}")
+        else:
+            _LOGGER.info(f"🧠 Using learned token budget {learned_budget} for agents {', '.join(map(str, scan_agents))} (configured: {token_budget})")
+        token_budget = learned_budget
+    
+    # Cut the entities into batches: by token budget when configured, otherwise by entity count
+    entity_lines = None
+    if token_budget:
+        entity_lines = dict(zip((state.entity_id for state in analysis_states), _render_entity_details(hass, analysis_states, prompt_format)))
+    
+    def _plan_batches(plan_states: list[State]) -> list[list[State]]:
+        if token_budget:
+            return _pack_states_by_token_budget(plan_states, entity_lines, token_budget, language, analysis_type, prompt_format, response_format)
+        return [plan_states[i:i + batch_size] for i in range(0, len(plan_states), batch_size)]
+    
+    # Rule-based tier: confident classifications never reach the agent
+    preclassify_stats = None
+    if preclassify and analysis_states:
+        candidate_states = analysis_states
+        analysis_states = []
+        rules_used = {}
+        rule_results = []
+        for state in candidate_states:
+            classification = preclassify_entity(hass, state)
+            if classification is None or classification["confidence"] < PRECLASSIFY_MIN_CONFIDENCE:
+                analysis_states.append(state)
+                continue
+            
+            rule_results.append(_create_rule_result(hass, state, classification))
+            rules_used[classification["rule"]] = rules_used.get(classification["rule"], 0) + 1
         
-        success, batch_stats = await _process_single_batch(
-            hass, batch_states, overall_batch_num, ai_provider, 
-            connection, msg_id, conversation_agent, all_results, language, use_compact_mode, analysis_type, cancellation_check
-        )
+        # Their thresholds are generated by the threshold queue, like those of the agent's results
+        for result in rule_results:
+            all_results.append(result)
+            if connection and msg_id:
+                connection.send_message(websocket_api.event_message(msg_id, {
+                    "type": "entity_result",
+                    "result": result
+                }))
         
-        # Accumulate token statistics
-        total_tokens_used += batch_stats.get("total_tokens", 0)
-        total_prompt_chars += batch_stats.get("prompt_chars", 0)
-        total_response_chars += batch_stats.get("response_chars", 0)
+        rule_classified = len(candidate_states) - len(analysis_states)
+        preclassify_stats = {
+            "rule_classified": rule_classified,
+            "sent_to_agent": len(analysis_states),
+            "agent_calls_avoided": len(_plan_batches(candidate_states)) - len(_plan_batches(analysis_states)) if rule_classified else 0,
+            "rules": rules_used,
+        }
+        _LOGGER.info(f"📐 Rule-based tier: {rule_classified} entities classified without the agent, {len(analysis_states)} sent to the agent ({preclassify_stats['agent_calls_avoided']} agent calls avoided)")
+    
+    # Cache hits and rule results are kept even if the scan is stopped before its first batch
+    if checkpoint_callback is not None and len(all_results) > len(completed_ids):
+        checkpoint_callback({
+            "results": list(all_results),
+            "batch_jobs": resume_state.get("batch_jobs", []) if resume_state else [],
+            "token_budget": token_budget,
+        })
+    
+    # Near-duplicate entities: only one representative per cluster goes to the agent
+    grouped_members = {}
+    grouping_stats = None
+    if group_similar and analysis_states:
+        candidate_count = len(analysis_states)
+        analysis_states, grouped_members = group_similar_states(hass, analysis_states, GROUPING_MIN_CLUSTER_SIZE)
+        grouping_stats = {
+            "clusters": len(grouped_members),
+            "grouped_entities": candidate_count - len(analysis_states),
+            "analyzed_entities": len(analysis_states),
+        }
+    
+    # A resumed scan keeps the batch jobs it had already split or switched to compact mode
+    resumed_jobs = []
+    unplanned_states = analysis_states
+    if resume_state and resume_state.get("batch_jobs"):
+        states_by_id = {state.entity_id: state for state in analysis_states}
+        for saved_job in resume_state["batch_jobs"]:
+            job_states = [states_by_id.pop(entity_id) for entity_id in saved_job["entity_ids"] if entity_id in states_by_id]
+            if job_states:
+                resumed_jobs.append({"states": job_states, "batch_size": len(job_states), "compact": saved_job.get("compact", False), "retries": 0, "batch_num": None})
+        unplanned_states = [state for state in analysis_states if state.entity_id in states_by_id]
+    
+    batches = _plan_batches(unplanned_states)
+    
+    # Queue of independent batch jobs - each job keeps its own compact-mode and shrink state
+    pending_batches = deque(resumed_jobs)
+    pending_batches.extend(
+        {"states": batch, "batch_size": len(batch), "compact": False, "retries": 0, "batch_num": None}
+        for batch in batches
+    )
+    
+    _LOGGER.info(f"🚀 Starting batch processing: {len(analysis_states)} entities in {len(pending_batches)} batches ({f'token budget: {token_budget}' if token_budget else f'batch size: {batch_size}'}), up to {max_concurrent_batches} batches in flight")
+    
+    # Per-entity accounting: only entities without a valid result are queued again
+    entity_failures = {}
+    retry_stats = {"entities_retried": 0, "entities_failed": 0}
+    
+    # Job each worker is running, part of the checkpoint until it is done
+    jobs_in_flight = {}
+    
+    # Start of the current agent outage; after AGENT_UNAVAILABLE_MAX_WAIT all workers stop and the scan raises agent_error
+    unavailable_since = None
+    agent_error = None
+    
+    def _report_progress() -> None:
+        if checkpoint_callback is None:
+            return
+        checkpoint_callback({
+            "results": list(all_results),
+            "batch_jobs": [
+                {"entity_ids": [state.entity_id for state in job["states"]], "compact": job["compact"]}
+                for job in [*jobs_in_flight.values(), *pending_batches]
+            ],
+            "token_budget": token_budget,
+        })
+    
+    # Notified whenever a worker is done with a job, which may have queued split halves or retries
+    queue_changed = asyncio.Condition()
+    
+    async def _finish_job(worker_id: int) -> None:
+        jobs_in_flight.pop(worker_id, None)
+        _report_progress()
+        async with queue_changed:
+            queue_changed.notify_all()
+    
+    async def _batch_worker(worker_id: int) -> None:
+        """Take batch jobs from the queue until no job is queued or in flight, retrying each job on its own."""
+        nonlocal batch_counter, total_tokens_used, total_prompt_chars, total_response_chars, unavailable_since, agent_error
         
-        if success:
-            # Batch successful - remove processed entities and reset retry counter
-            remaining_states = remaining_states[current_batch_size:]
-            token_limit_retries = 0
-            use_compact_mode = False  # Reset to full mode on success
-            _LOGGER.debug(f"Batch {overall_batch_num} completed successfully")
+        while True:
+            # The previous job of this worker is finished (or queued again)
+            await _finish_job(worker_id)
             
-            # Log successful batch completion
-            ai_logger.log_info(f"Batch {overall_batch_num} completed successfully", {
-                "batch_number": overall_batch_num,
-                "entities_processed": current_batch_size,
-                "remaining_entities": len(remaining_states),
-                "tokens_used": batch_stats.get("tokens_used", 0) if batch_stats else 0,
-                "compact_mode": use_compact_mode
-            })
+            # STOP: Check if operation was cancelled using the provided callback
+            if cancellation_check and cancellation_check():
+                _LOGGER.info(f"🛑 Batch worker {worker_id} STOPPED by user request")
+                break
+            if agent_error is not None:
+                break
             
-        else:
-            # Token limit exceeded - try different strategies
-            token_limit_retries += 1
+            if not pending_batches:
+                if not jobs_in_flight:
+                    break
+                # The jobs still in flight may be split or queued again
+                async with queue_changed:
+                    await queue_changed.wait_for(lambda: pending_batches or not jobs_in_flight or agent_error is not None)
+                continue
+            
+            job = pending_batches.popleft()
+            jobs_in_flight[worker_id] = job
+            
+            # Retries of the same batch keep their batch number
+            if job["batch_num"] is None:
+                batch_counter += 1
+                job["batch_num"] = batch_counter
+            batch_num = job["batch_num"]
+            current_batch_size = job["batch_size"]
+            use_compact_mode = job["compact"]
+            batch_states = job["states"]
             
-            # First try: enable compact mode if not already enabled
-            if not use_compact_mode and token_limit_retries == 1:
-                use_compact_mode = True
-                _LOGGER.warning(f"🔄 Token limit in batch {overall_batch_num}, trying compact mode (retry {token_limit_retries}/{max_retries})")
+            _LOGGER.info(f"📦 Processing batch {batch_num} with {len(batch_states)} entities (batch size: {current_batch_size}, retry: {job['retries']}, compact: {use_compact_mode}, worker: {worker_id})")
+            
+            # Send batch info to frontend
+            if connection and msg_id:
+                connection.send_message(websocket_api.event_message(msg_id, {
+                    "type": "batch_info",
+                    "data": {
+                        "batch_number": batch_num,
+                        "batch_size": current_batch_size,
+                        "entities_in_batch": len(batch_states),
+                        "remaining_entities": max(0, len(states) - len(all_results) - len(batch_states)),
+                        "retry_attempt": job["retries"],
+                        "compact_mode": use_compact_mode,
+                        "total_entities": len(states),
+                        "processed_entities": len(all_results)
+                    }
+                }))
+            
+            committed_entities = set()
+            try:
+                success, batch_stats = await _process_single_batch(
+                    hass, batch_states, batch_num, ai_provider, 
+                    connection, msg_id, conversation_agent, all_results, language, use_compact_mode, analysis_type, cancellation_check,
+                    entity_lines, committed_entities, prompt_format, response_format, request_lane
+                )
+            except AgentUnavailableError as e:
+                # No answer at all: the job is kept as it is and the worker waits for the agent
+                pending_batches.appendleft(job)
+                if unavailable_since is None:
+                    unavailable_since = time.monotonic()
+                unavailable_for = time.monotonic() - unavailable_since
+                if unavailable_for >= AGENT_UNAVAILABLE_MAX_WAIT:
+                    _LOGGER.error(f"🔌 Agent unavailable for {unavailable_for:.0f}s, stopping the scan with {len(pending_batches)} batches left: {e}")
+                    agent_error = e
+                    break
                 
-                # Send compact mode info to frontend
+                pause = max(e.retry_after, AGENT_UNAVAILABLE_RETRY_DELAY)
+                _LOGGER.warning(f"🔌 Agent unavailable for batch {batch_num}, worker {worker_id} retries in {pause:.0f}s (unavailable for {unavailable_for:.0f}s): {e}")
                 if connection and msg_id:
                     connection.send_message(websocket_api.event_message(msg_id, {
-                        "type": "batch_compact_mode",
+                        "type": "agent_unavailable",
                         "data": {
-                            "batch": overall_batch_num,
-                            "retry_attempt": token_limit_retries,
-                            "reason": "Attivazione modalità compatta per gestire limite token",
-                            "message": _get_localized_message('batch_reduction', language, 
-                                                            retry_attempt=token_limit_retries)
+                            "batch_number": batch_num,
+                            "agent_id": e.agent_id,
+                            "retry_after": round(pause, 1),
+                            "unavailable_for": round(unavailable_for, 1),
+                            "max_wait": AGENT_UNAVAILABLE_MAX_WAIT,
+                            "message": str(e)
                         }
                     }))
-                
-                # Don't increment overall_batch_num since we're retrying the same batch
-                overall_batch_num -= 1
+                await _finish_job(worker_id)
+                await asyncio.sleep(pause)
                 continue
+            unavailable_since = None
             
-            if token_limit_retries > max_retries:
-                # Max retries exceeded, try with minimum batch size one more time
-                if current_batch_size > MIN_BATCH_SIZE:
-                    _LOGGER.warning(f"🔄 Max retries exceeded, trying with minimum batch size {MIN_BATCH_SIZE}")
-                    current_batch_size = MIN_BATCH_SIZE
-                    use_compact_mode = True  # Force compact mode
-                    token_limit_retries = 1  # Reset for one final attempt
+            # Stopped before the agent was asked: the job stays queued for the checkpoint
+            if not success and not committed_entities and cancellation_check and cancellation_check():
+                pending_batches.appendleft(job)
+                break
+            
+            # Tokens per entity and parse success of the prompt format (token-limit failures say nothing about parsing)
+            if success and batch_stats.get("prompt_tokens"):
+                if use_compact_mode:
+                    format_name = "compact"
+                elif response_format == RESPONSE_FORMAT_POSITIONAL:
+                    format_name = f"{prompt_format}/{response_format}"
                 else:
-                    # Even minimum batch size failed, use fallback for remaining entities
-                    _LOGGER.error(f"🛑 Even minimum batch size {MIN_BATCH_SIZE} failed after {max_retries} retries")
-                    _LOGGER.info(f"📋 Using fallback classification for remaining {len(remaining_states)} entities")
+                    format_name = prompt_format
+                capacity.record_prompt_format(
+                    batch_stats.get("agent_id", conversation_agent), format_name,
+                    len(batch_states), batch_stats["prompt_tokens"], len(committed_entities),
+                    batch_stats.get("response_tokens", 0)
+                )
+            
+            # Accumulate token statistics
+            total_tokens_used += batch_stats.get("total_tokens", 0)
+            total_prompt_chars += batch_stats.get("prompt_chars", 0)
+            total_response_chars += batch_stats.get("response_chars", 0)
+            
+            if success:
+                # Missing, malformed or invalid entities go back to the queue (bounded), the rest is kept
+                retry_states = []
+                for state in batch_states:
+                    if state.entity_id in committed_entities:
+                        continue
+                    entity_failures[state.entity_id] = entity_failures.get(state.entity_id, 0) + 1
+                    if entity_failures[state.entity_id] <= MAX_ENTITY_RETRIES:
+                        retry_states.append(state)
+                        continue
                     
-                    # Send fallback results to frontend immediately
-                    for state in remaining_states:
-                        fallback_result = _create_fallback_result(state.entity_id, overall_batch_num, "token_limit_exceeded", state, hass)
-                        all_results.append(fallback_result)
-                        
-                        # Send each fallback result to frontend
-                        if connection and msg_id:
-                            connection.send_message(websocket_api.event_message(msg_id, {
-                                "type": "entity_result",
-                                "result": fallback_result
-                            }))
-                    break
-            else:
-                new_batch_size = max(MIN_BATCH_SIZE, int(current_batch_size * BATCH_REDUCTION_FACTOR))
+                    retry_stats["entities_failed"] += 1
+                    fallback_result = _create_fallback_result(state.entity_id, batch_num, "missing_result", state, hass)
+                    all_results.append(fallback_result)
+                    if connection and msg_id:
+                        connection.send_message(websocket_api.event_message(msg_id, {
+                            "type": "entity_result",
+                            "result": fallback_result
+                        }))
                 
-                _LOGGER.warning(f"⚠️ Token limit in batch {overall_batch_num}, reducing batch size from {current_batch_size} to {new_batch_size} (retry {token_limit_retries}/{max_retries})")
+                if retry_states:
+                    retry_stats["entities_retried"] += len(retry_states)
+                    _LOGGER.warning(f"🔁 Batch {batch_num}: {len(committed_entities)} results kept, {len(retry_states)} missing or invalid entities queued for retry")
+                    pending_batches.append({
+                        "states": retry_states,
+                        "batch_size": len(retry_states),
+                        "compact": False,
+                        "retries": 0,
+                        "batch_num": None
+                    })
+                _LOGGER.debug(f"Batch {batch_num} completed successfully")
+                
+                # Log successful batch completion
+                ai_logger.log_info(f"Batch {batch_num} completed successfully", {
+                    "batch_number": batch_num,
+                    "entities_processed": len(batch_states),
+                    "remaining_entities": max(0, len(states) - len(all_results)),
+                    "tokens_used": batch_stats.get("tokens_used", 0) if batch_stats else 0,
+                    "compact_mode": use_compact_mode
+                })
+                continue
+            
+            # Token limit exceeded - bisect the job so an oversized entity is isolated in ~log2(n) requests
+            job["retries"] += 1
+            failed_states = job["states"]
+            
+            if len(failed_states) > 1:
+                middle = len(failed_states) // 2
+                halves = [failed_states[:middle], failed_states[middle:]]
+                _LOGGER.warning(f"✂️ Token limit in batch {batch_num}, splitting {len(failed_states)} entities into {len(halves[0])} + {len(halves[1])}")
                 
                 # Send reduction info to frontend
                 if connection and msg_id:
                     connection.send_message(websocket_api.event_message(msg_id, {
                         "type": "batch_size_reduced",
                         "data": {
-                            "old_size": current_batch_size,
-                            "new_size": new_batch_size,
-                            "retry_attempt": token_limit_retries,
+                            "old_size": len(failed_states),
+                            "new_size": len(halves[1]),
+                            "retry_attempt": job["retries"],
                             "reason": "Token limit exceeded",
                             "message": _get_localized_message('batch_reduction', language, 
-                                                            old_size=current_batch_size, 
-                                                            new_size=new_batch_size, 
-                                                            retry_attempt=token_limit_retries)
+                                                            old_size=len(failed_states), 
+                                                            new_size=len(halves[1]), 
+                                                            retry_attempt=job["retries"])
                         }
                     }))
                 
-                current_batch_size = new_batch_size
+                # Both halves go to the front of the queue, first half first
+                for half in reversed(halves):
+                    pending_batches.appendleft({
+                        "states": half,
+                        "batch_size": len(half),
+                        "compact": use_compact_mode,
+                        "retries": job["retries"],
+                        "batch_num": None
+                    })
+                continue
+            
+            # A single entity: give it one more chance with the compact prompt
+            if not use_compact_mode:
+                job["compact"] = True
+                _LOGGER.warning(f"🔄 Token limit for single entity {failed_states[0].entity_id} in batch {batch_num}, trying compact mode")
                 
-                # Don't increment overall_batch_num since we're retrying the same batch
-                overall_batch_num -= 1  # Counteract the increment that will happen at loop start
+                # Send compact mode info to frontend
+                if connection and msg_id:
+                    connection.send_message(websocket_api.event_message(msg_id, {
+                        "type": "batch_compact_mode",
+                        "data": {
+                            "batch": batch_num,
+                            "retry_attempt": job["retries"],
+                            "reason": "Attivazione modalità compatta per gestire limite token",
+                            "message": _get_localized_message('batch_reduction', language, 
+                                                            retry_attempt=job["retries"])
+                        }
+                    }))
+                
+                pending_batches.appendleft(job)
+                continue
+            
+            # Only the oversized entity falls back
+            state = failed_states[0]
+            _LOGGER.error(f"🛑 Entity {state.entity_id} exceeds the token limit on its own even in compact mode, using fallback classification")
+            fallback_result = _create_fallback_result(state.entity_id, batch_num, "token_limit_exceeded", state, hass)
+            all_results.append(fallback_result)
+            if connection and msg_id:
+                connection.send_message(websocket_api.event_message(msg_id, {
+                    "type": "entity_result",
+                    "result": fallback_result
+                }))
+        
+        await _finish_job(worker_id)
+    
+    # Every worker starts, even for fewer initial batches: split halves and retries are shared out too
+    worker_count = max_concurrent_batches if pending_batches else 0
+    await asyncio.gather(*(_batch_worker(worker_id) for worker_id in range(1, worker_count + 1)))
+    
+    capacity.async_schedule_save()
+    
+    if agent_error is not None:
+        # The results so far are in the checkpoint; padding the rest with fallbacks would store garbage
+        raise agent_error
+    
+    # Copy each representative's answer to the rest of its cluster
+    if grouped_members:
+        grouped_reason = _get_localized_message('grouped_reason', language)
+        for result in list(all_results):
+            members = grouped_members.get(result["entity_id"])
+            if not members or result.get("analysis_method") != "ai_conversation":
+                continue
+            for member in members:
+                area_name = _get_entity_area(hass, member.entity_id)
+                member_result = fan_out_result(result, member, area_name if area_name != "Casa" else None, grouped_reason)
+                all_results.append(member_result)
+                if connection and msg_id:
+                    connection.send_message(websocket_api.event_message(msg_id, {
+                        "type": "entity_result",
+                        "result": member_result
+                    }))
+    
+    # Thresholds of the fresh results are generated in the background and pushed when ready
+    threshold_queue = hass.data.get(THRESHOLD_QUEUE_KEY)
+    if threshold_queue is not None:
+        states_by_id = {state.entity_id: state for state in states}
+        threshold_queue.async_enqueue(
+            result["entity_id"] for result in all_results
+            if result.get("analysis_method") in ("ai_conversation", "rule_based")
+            and not result.get("from_cache")
+            and not result.get("auto_thresholds")
+            and result["entity_id"] in states_by_id
+            and _should_generate_thresholds(states_by_id[result["entity_id"]], result.get("category", []))
+        )
+    
+    # Remember fresh AI answers for the next scan
+    if result_cache is not None:
+        for result in all_results:
+            if result.get("analysis_method") == "ai_conversation" and not result.get("from_cache") and result["entity_id"] in fingerprints:
+                result_cache.put(fingerprints[result["entity_id"]], result)
+        result_cache.async_schedule_save()
 
     # Ensure all entities have a result (fallback for any missing)
     processed_entity_ids = {res["entity_id"] for res in all_results}
@@ -1103,10 +1542,20 @@ async def get_entities_importance_batched(
             "data": {
                 "total_entities": len(all_results),
                 "message": f"Scansione completata! Analizzate {len(all_results)} entità",
+                "cache_stats": result_cache.get_stats() if result_cache else None,
+                "preclassify_stats": preclassify_stats,
+                "grouping_stats": grouping_stats,
+                "retry_stats": retry_stats,
+                "capacity": [capacity.get_stats(agent_id) for agent_id in scan_agents],
                 "token_stats": {
                     "total_tokens": total_tokens_used,
                     "prompt_chars": total_prompt_chars,
                     "response_chars": total_response_chars,
+                    "estimator": get_token_estimator().get_stats(),
+                    "prompt_format": prompt_format,
+                    "response_format": response_format,
+                    "token_budget": token_budget,
+                    "configured_token_budget": configured_token_budget,
                     "average_tokens_per_entity": round(total_tokens_used / len(all_results), 1) if all_results else 0
                 }
             }
@@ -1125,11 +1574,75 @@ async def get_entities_importance_batched(
         "prompt_chars": total_prompt_chars,
         "response_chars": total_response_chars,
         "avg_tokens_per_entity": round(total_tokens_used / len(all_results), 1) if all_results else 0,
+        "pacing": [get_agent_pacer(agent_id).get_stats() for agent_id in scan_agents],
+        "preclassification": preclassify_stats,
+        "grouping": grouping_stats,
+        "entity_retries": retry_stats,
         "completion_status": "success"
     })
     
     return all_results
         
+def _response_tokens_per_entity(response_format: str) -> int:
+    """Expected answer tokens for one entity in the given response format."""
+    if response_format == RESPONSE_FORMAT_POSITIONAL:
+        return RESPONSE_TOKENS_PER_ENTITY_POSITIONAL
+    return RESPONSE_TOKENS_PER_ENTITY
+
+
+def _pack_states_by_token_budget(states: list[State], entity_lines: dict, token_budget: int, language: str, analysis_type: str, prompt_format: str = PROMPT_FORMAT_FULL, response_format: str = RESPONSE_FORMAT_JSON) -> list[list[State]]:
+    """Pack entities into batches whose full prompt (and expected answer) fits token_budget."""
+    # Fixed instruction block of the prompt, paid once per batch
+    prompt_overhead = _estimate_tokens(_create_localized_prompt([], [], language, analysis_type=analysis_type, prompt_format=prompt_format, response_format=response_format))
+    entity_budget = token_budget - prompt_overhead
+    if entity_budget < MIN_ENTITY_TOKEN_BUDGET:
+        _LOGGER.warning(f"⚠️ Token budget {token_budget} leaves only {entity_budget} tokens for entities after the {prompt_overhead}-token instructions, using {MIN_ENTITY_TOKEN_BUDGET}")
+        entity_budget = MIN_ENTITY_TOKEN_BUDGET
+    
+    costs = [
+        (state.entity_id, _estimate_line_tokens(entity_lines[state.entity_id]) + _response_tokens_per_entity(response_format))
+        for state in states
+    ]
+    states_by_id = {state.entity_id: state for state in states}
+    packed = pack_by_token_budget(costs, entity_budget, MAX_BATCH_SIZE)
+    
+    return [[states_by_id[entity_id] for entity_id in batch] for batch in packed]
+
+
+def _estimate_batch_tokens(hass: HomeAssistant, states: list[State], language: str, analysis_type: str = "importance", prompt_format: str = PROMPT_FORMAT_FULL, response_format: str = RESPONSE_FORMAT_JSON) -> int:
+    """Estimate prompt + answer tokens of analyzing states in a single request."""
+    prompt_overhead = _estimate_tokens(_create_localized_prompt([], [], language, analysis_type=analysis_type, prompt_format=prompt_format, response_format=response_format))
+    return prompt_overhead + sum(
+        _estimate_line_tokens(line) + _response_tokens_per_entity(response_format)
+        for line in _render_entity_details(hass, states, prompt_format)
+    )
+
+
+def _render_entity_details(hass: HomeAssistant, states: list[State], prompt_format: str = PROMPT_FORMAT_FULL) -> list[str]:
+    """Render the one-line description of each entity used in the analysis prompt."""
+    entity_details = []
+    
+    # Areas come from the registry snapshot shared by the whole scan
+    registry_index = async_get_registry_index(hass)
+    
+    # Create minimal entity information for AI analysis
+    for state in states:
+        if prompt_format == PROMPT_FORMAT_TABLE:
+            entity_details.append(table_row(
+                state.entity_id, state.state, state.attributes.get('friendly_name'), registry_index.area_name(state.entity_id)
+            ))
+            continue
+        
+        area_name = registry_index.area_name(state.entity_id) or "Casa"  # Default fallback
+        
+        # Just the basics: entity_id, domain, state, name, area
+        name = state.attributes.get('friendly_name', state.entity_id.split('.')[-1])
+        entity_description = f"{state.entity_id} ({state.domain}, {state.state}, {name[:20]}, {area_name})"
+        entity_details.append(entity_description)
+    
+    return entity_details
+
+
 async def _process_single_batch(
     hass: HomeAssistant,
     batch_states: list[State], 
@@ -1142,71 +1655,39 @@ async def _process_single_batch(
     language: str = "en",  # Add language parameter
     use_compact_prompt: bool = False,  # Add compact mode flag
     analysis_type: str = "importance",  # Add analysis type parameter
-    cancellation_check: callable = None  # Function to check if operation is cancelled
+    cancellation_check: callable = None,  # Function to check if operation is cancelled
+    entity_lines: dict = None,  # Pre-rendered entity lines keyed by entity_id
+    committed_entities: set = None,  # Filled with the entity_ids that got a valid AI result
+    prompt_format: str = PROMPT_FORMAT_FULL,  # Encoding of the entities in the prompt
+    response_format: str = RESPONSE_FORMAT_JSON,  # Keyed objects or positional rows in the answer
+    request_lane: str = AGENT_LANE_BACKGROUND  # Priority lane of the agent requests
 ) -> tuple[bool, dict]:
-    """Process a single batch and return success status and token statistics."""
+    """Process a single batch and return success status and token statistics.
+    
+    Only valid AI results are added to all_results (and committed_entities); entities that
+    were missing, malformed or had an invalid rating are left to the caller to retry.
+    """
+    if committed_entities is None:
+        committed_entities = set()
     
     # Check for cancellation before processing
     if cancellation_check and cancellation_check():
         _LOGGER.info(f"Batch {batch_num} cancelled before processing")
         return False, {"prompt_tokens": 0, "response_tokens": 0, "total_tokens": 0}
     
-    # Create detailed entity information for AI analysis
-    entity_details = []
-    
-    # Get registries for area information
-    try:
-        from homeassistant.helpers import entity_registry as er, device_registry as dr, area_registry as ar
-        
-        entity_registry = er.async_get(hass)
-        device_registry = dr.async_get(hass)
-        area_registry = ar.async_get(hass)
-    except Exception as e:
-        _LOGGER.warning(f"Could not access registries for area information: {e}")
-        entity_registry = None
-        device_registry = None
-        area_registry = None
-    
-    # Create minimal entity information for AI analysis
-    for state in batch_states:
-        # Get area information
-        area_name = "Casa"  # Default fallback
-        
-        if entity_registry and device_registry and area_registry:
-            try:
-                # First try to get area from entity registry
-                entity_entry = entity_registry.async_get(state.entity_id)
-                area_id = None
-                
-                if entity_entry:
-                    # Entity can have area directly
-                    if entity_entry.area_id:
-                        area_id = entity_entry.area_id
-                    # Or get area from device
-                    elif entity_entry.device_id:
-                        device_entry = device_registry.async_get(entity_entry.device_id)
-                        if device_entry and device_entry.area_id:
-                            area_id = device_entry.area_id
-                
-                # Convert area_id to area name
-                if area_id:
-                    area_entry = area_registry.async_get_area(area_id)
-                    if area_entry:
-                        area_name = area_entry.name
-                        
-            except Exception as e:
-                _LOGGER.debug(f"Could not get area for {state.entity_id}: {e}")
-        
-        # Just the basics: entity_id, domain, state, name, area
-        name = state.attributes.get('friendly_name', state.entity_id.split('.')[-1])
-        entity_description = f"{state.entity_id} ({state.domain}, {state.state}, {name[:20]}, {area_name})"
-        entity_details.append(entity_description)
+    # Create detailed entity information for AI analysis (reuse lines rendered by the batcher)
+    if entity_lines is not None and all(state.entity_id in entity_lines for state in batch_states):
+        entity_details = [entity_lines[state.entity_id] for state in batch_states]
+    else:
+        entity_details = _render_entity_details(hass, batch_states, prompt_format)
     
-    # Add delay to make AI analysis visible
-    await asyncio.sleep(1.5 if use_compact_prompt else 2.5)
+    # Agent that served the request (the pooled agent, if any) and its latency, for pacing and the capacity profile
+    served = {}
     
     # Create localized prompt based on user's language and mode
-    prompt = _create_localized_prompt(batch_states, entity_details, language, compact_mode=use_compact_prompt, analysis_type=analysis_type)
+    prompt = _create_localized_prompt(batch_states, entity_details, language, compact_mode=use_compact_prompt, analysis_type=analysis_type, prompt_format=prompt_format, response_format=response_format)
+    positional = response_format == RESPONSE_FORMAT_POSITIONAL and not use_compact_prompt
+    response_tokens_per_entity = _response_tokens_per_entity(response_format if not use_compact_prompt else RESPONSE_FORMAT_JSON)
     
     # Log prompt size for debugging
     prompt_size = len(prompt)
@@ -1249,7 +1730,35 @@ async def _process_single_batch(
                 "entity_ids": [state.entity_id for state in batch_states]
             })
             
-            response_text = await _query_local_agent(hass, prompt, conversation_agent)
+            # Estimated request size (prompt + expected answer) for the learned capacity profile
+            capacity = hass.data.get(CAPACITY_KEY)
+            request_tokens = _estimate_tokens(prompt) + response_tokens_per_entity * len(batch_states)
+            
+            for rate_limit_attempt in range(PACING_MAX_RATE_LIMIT_RETRIES + 1):
+                response_text = await _query_local_agent(
+                    hass, prompt, conversation_agent, request_lane, request_tokens=request_tokens, served=served
+                )
+                served_agent = served["agent_id"]
+                pacer = get_agent_pacer(served_agent)
+                
+                if not is_rate_limited_response(response_text):
+                    expected_latency = capacity.expected_latency(served_agent, request_tokens) if capacity else None
+                    pacer.record_success(served["latency"], expected_latency)
+                    if capacity and not _check_token_limit_exceeded(response_text):
+                        capacity.record_success(served_agent, request_tokens, served["latency"])
+                    break
+                
+                pacer.record_rate_limited()
+                if rate_limit_attempt < PACING_MAX_RATE_LIMIT_RETRIES:
+                    _LOGGER.warning(f"🚦 Agent rate limited batch {batch_num}, retrying in {pacer.delay:.1f}s (attempt {rate_limit_attempt + 1}/{PACING_MAX_RATE_LIMIT_RETRIES})")
+            else:
+                # Still rate limited: not an answer, and not a token limit (which would split the batch
+                # and teach the capacity model a false size limit); the caller waits and retries the batch
+                raise AgentUnavailableError(
+                    f"Agent {served_agent} still rate limiting after {PACING_MAX_RATE_LIMIT_RETRIES} retries: {response_text[:100]}",
+                    served_agent, pacer.delay
+                )
+            
             _LOGGER.debug(f"Local Agent response for batch {batch_num}: {response_text[:200]}...")
             
             # Log the response
@@ -1274,6 +1783,14 @@ async def _process_single_batch(
             # Check for token limit exceeded
             if _check_token_limit_exceeded(response_text):
                 _LOGGER.error(f"🚨 Token limit exceeded in batch {batch_num} ({'compact' if use_compact_prompt else 'full'} mode)")
+                actual_tokens = extract_actual_tokens(response_text)
+                if actual_tokens:
+                    # The agent reported the real request size: calibrate the estimator and learn the real limit
+                    get_token_estimator().observe(prompt, actual_tokens)
+                    request_tokens = _estimate_tokens(prompt) + response_tokens_per_entity * len(batch_states)
+                if capacity and (actual_tokens or is_context_length_error(response_text)):
+                    # Only a real context-length error is a size limit, not any refusal or quota message
+                    capacity.record_token_limit(served_agent, request_tokens)
                 
                 # Log the error
                 ai_logger.log_error(f"Token limit exceeded in batch {batch_num}", {
@@ -1297,14 +1814,7 @@ async def _process_single_batch(
                     }))
                 
                 # Return minimal stats even on token limit
-                prompt_tokens = _estimate_tokens(prompt)
-                batch_stats = {
-                    "prompt_tokens": prompt_tokens,
-                    "response_tokens": _estimate_tokens(response_text),
-                    "total_tokens": prompt_tokens + _estimate_tokens(response_text)
-                }
-                
-                return False, batch_stats  # Signal token limit exceeded
+                return False, _batch_token_stats(prompt, response_text)  # Signal token limit exceeded
                 
         else:
             _LOGGER.error(f"AI provider {ai_provider} not supported. Only Local Agent is available.")
@@ -1322,6 +1832,7 @@ async def _process_single_batch(
             for state in batch_states:
                 fallback_result = _create_fallback_result(state.entity_id, batch_num, "unsupported_provider", state, hass)
                 all_results.append(fallback_result)
+                committed_entities.add(state.entity_id)  # Retrying cannot help
                 
                 # Send fallback result to frontend
                 if connection and msg_id:
@@ -1329,132 +1840,95 @@ async def _process_single_batch(
                         "type": "entity_result",
                         "result": fallback_result
                     }))
-            return True  # Continue processing
-
-        # Clean response text (remove markdown formatting if present)
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-
-        # Parse JSON response
-        parsed_response = json.loads(response_text)
-
-        if isinstance(parsed_response, list):
-            for item in parsed_response:
-                if isinstance(item, dict) and all(key in item for key in ["entity_id", "rating", "reason"]):
-                    # Validate rating is within bounds
+            return True, {"prompt_tokens": 0, "response_tokens": 0, "total_tokens": 0}  # Continue processing
+
+        # Parse the response item by item: markdown fences and surrounding text are skipped,
+        # and a truncated or partly broken answer still yields every complete item
+        parsed_items, response_parser = parse_json_items(response_text)
+        if response_parser.truncated or response_parser.items_malformed:
+            _LOGGER.warning(f"⚠️ Batch {batch_num}: recovered {len(parsed_items)} items from a {'truncated' if response_parser.truncated else 'partly malformed'} response ({response_parser.items_malformed} malformed items skipped)")
+        if not parsed_items and not response_parser.array_closed:
+            raise json.JSONDecodeError("No complete JSON item in response", response_text, 0)
+
+        if positional:
+            # Rows refer to entities by their position in the prompt: map them back to entity_ids
+            batch_entity_ids = [state.entity_id for state in batch_states]
+            parsed_items = [
+                decode_positional_item(item, batch_entity_ids) or item if isinstance(item, list) else item
+                for item in parsed_items
+            ]
+
+        states_by_id = {state.entity_id: state for state in batch_states}
+        for item in parsed_items:
+            if isinstance(item, dict) and all(key in item for key in ["entity_id", "rating", "reason"]):
+                if item["entity_id"] not in states_by_id:
+                    _LOGGER.warning(f"AI returned entity {item['entity_id']} which is not in batch {batch_num}, ignoring it")
+                    continue
+                if item["entity_id"] in committed_entities:
+                    _LOGGER.debug(f"Duplicate AI result for {item['entity_id']} in batch {batch_num}, keeping the first one")
+                    continue
+                
+                # Validate rating is within bounds
+                try:
                     rating = int(item["rating"])
-                    if 0 <= rating <= 5:
-                        # Get category - can be string or array
-                        category = item.get("category", ["DATA"])  # Default to DATA instead of UNKNOWN
-                        if isinstance(category, str):
-                            # Convert single category to array
-                            category = [category]
-                        elif not isinstance(category, list):
-                            category = ["DATA"]  # Default to DATA instead of UNKNOWN
-                        
-                        # Validate all categories (now includes SERVICE)
-                        valid_categories = ["DATA", "CONTROL", "ALERTS", "SERVICE"]
-                        category = [cat for cat in category if cat in valid_categories]
-                        if not category:
-                            category = ["DATA"]
-                        
-                        # Get management_type, default to 'user' if not provided
-                        management_type = item.get("management_type", "user")
-                        if management_type.lower() not in ["user", "service"]:
-                            management_type = "user"
-                        else:
-                            management_type = management_type.lower()
-                            
-                        result = {
-                            "entity_id": item["entity_id"],
-                            "overall_weight": rating,
-                            "overall_reason": item["reason"],
-                            "category": category,
-                            "management_type": management_type,
-                            "analysis_method": "ai_conversation",
-                            "batch_number": batch_num,
-                        }
-                        
-                        # Add area information to result
-                        state = next((s for s in batch_states if s.entity_id == item["entity_id"]), None)
-                        if state:
-                            area_name = _get_entity_area(hass, state.entity_id)
-                            if area_name and area_name != "Casa":  # Only add if not default
-                                result["area"] = area_name
-                        
-                        # Generate auto-thresholds for relevant entities (more inclusive approach)
-                        if state and hass:
-                            # Check if entity warrants automatic threshold generation
-                            should_generate_thresholds = (
-                                'ALERTS' in category or  # Entities categorized as ALERTS
-                                'battery' in item["entity_id"].lower() or  # Battery entities
-                                state.domain in ['binary_sensor', 'update'] or  # Binary sensors and update entities
-                                (state.domain == 'sensor' and state.attributes.get('device_class') in ['battery', 'temperature', 'humidity', 'signal_strength']) or  # Specific sensor types
-                                any(keyword in item["entity_id"].lower() for keyword in ['temperature', 'humidity', 'cpu', 'memory', 'disk', 'heart_rate', 'signal'])  # Keyword matching
-                            )
-                            
-                            # Exclude auto_update_enabled switches and other configuration entities
-                            should_generate_thresholds = should_generate_thresholds and not any(
-                                keyword in item["entity_id"].lower() for keyword in ['auto_update_enabled', '_enabled', '_config', '_setting']
-                            )
-                            
-                            if should_generate_thresholds:
-                                auto_thresholds = await _generate_auto_thresholds(hass, item["entity_id"], state)
-                                if auto_thresholds.get("thresholds"):
-                                    result["auto_thresholds"] = auto_thresholds
-                                    _LOGGER.debug(f"Generated auto-thresholds for {item['entity_id']}: {auto_thresholds['entity_type']}")
-                        
-                        
-                        all_results.append(result)
-                        
-                        # Send result to frontend immediately
-                        if connection and msg_id:
-                            connection.send_message(websocket_api.event_message(msg_id, {
-                                "type": "entity_result",
-                                "result": result
-                            }))
+                except (TypeError, ValueError):
+                    rating = -1
+                if 0 <= rating <= 5:
+                    # Get category - can be string or array
+                    category = item.get("category", ["DATA"])  # Default to DATA instead of UNKNOWN
+                    if isinstance(category, str):
+                        # Convert single category to array
+                        category = [category]
+                    elif not isinstance(category, list):
+                        category = ["DATA"]  # Default to DATA instead of UNKNOWN
+                    
+                    # Validate all categories (now includes SERVICE)
+                    valid_categories = ["DATA", "CONTROL", "ALERTS", "SERVICE"]
+                    category = [cat for cat in category if cat in valid_categories]
+                    if not category:
+                        category = ["DATA"]
+                    
+                    # Get management_type, default to 'user' if not provided
+                    management_type = item.get("management_type", "user")
+                    if management_type.lower() not in ["user", "service"]:
+                        management_type = "user"
                     else:
-                        _LOGGER.warning(f"Invalid rating {rating} for entity {item['entity_id']}, using fallback")
-                        # Find the corresponding state
-                        entity_state = next((s for s in batch_states if s.entity_id == item["entity_id"]), None)
-                        fallback_result = _create_fallback_result(item["entity_id"], batch_num, "invalid_rating", entity_state, hass)
-                        all_results.append(fallback_result)
+                        management_type = management_type.lower()
                         
-                        # Send fallback result to frontend
-                        if connection and msg_id:
-                            connection.send_message(websocket_api.event_message(msg_id, {
-                                "type": "entity_result",
-                                "result": fallback_result
-                            }))
+                    result = {
+                        "entity_id": item["entity_id"],
+                        "overall_weight": rating,
+                        "overall_reason": item["reason"],
+                        "category": category,
+                        "management_type": management_type,
+                        "analysis_method": "ai_conversation",
+                        "batch_number": batch_num,
+                    }
+                    
+                    # Add area information to result
+                    state = states_by_id[item["entity_id"]]
+                    if state:
+                        area_name = _get_entity_area(hass, state.entity_id)
+                        if area_name and area_name != "Casa":  # Only add if not default
+                            result["area"] = area_name
+                    
+                    # Auto-thresholds are generated after the scan by the threshold queue
+                    all_results.append(result)
+                    committed_entities.add(item["entity_id"])
+                    
+                    # Send result to frontend immediately
+                    if connection and msg_id:
+                        connection.send_message(websocket_api.event_message(msg_id, {
+                            "type": "entity_result",
+                            "result": result
+                        }))
                 else:
-                    _LOGGER.warning(f"Malformed AI response item: {item}")
-        else:
-            _LOGGER.warning(f"AI response is not a list, using fallback for batch {batch_num}")
-            # Use fallback for all entities in this batch
-            for state in batch_states:
-                fallback_result = _create_fallback_result(state.entity_id, batch_num, "invalid_response", state, hass)
-                all_results.append(fallback_result)
-                
-                # Send fallback result to frontend
-                if connection and msg_id:
-                    connection.send_message(websocket_api.event_message(msg_id, {
-                        "type": "entity_result",
-                        "result": fallback_result
-                    }))
+                    _LOGGER.warning(f"Invalid rating {item['rating']} for entity {item['entity_id']}, it will be retried")
+            else:
+                _LOGGER.warning(f"Malformed AI response item: {item}")
         
         # Return minimal stats for fallback cases
-        prompt_tokens = _estimate_tokens(prompt)
-        batch_stats = {
-            "prompt_tokens": prompt_tokens,
-            "response_tokens": _estimate_tokens(response_text) if 'response_text' in locals() else 0,
-            "total_tokens": prompt_tokens + (_estimate_tokens(response_text) if 'response_text' in locals() else 0)
-        }
-        
-        return True, batch_stats  # Fallback success with stats
+        return True, _batch_token_stats(prompt, response_text if 'response_text' in locals() else None)  # Fallback success with stats
 
     except json.JSONDecodeError as e:
         # Log the error
@@ -1465,28 +1939,17 @@ async def _process_single_batch(
         })
         
         _LOGGER.warning(f"AI response is not valid JSON for batch {batch_num} - Raw response: {response_text} - Error: {e}")
-        _LOGGER.info(f"Falling back to domain-based classification for batch {batch_num}")
-        # Use fallback for all entities in this batch
-        for state in batch_states:
-            fallback_result = _create_fallback_result(state.entity_id, batch_num, "json_decode_error", state, hass)
-            all_results.append(fallback_result)
-            
-            # Send fallback result to frontend
-            if connection and msg_id:
-                connection.send_message(websocket_api.event_message(msg_id, {
-                    "type": "entity_result",
-                    "result": fallback_result
-                }))
-        
-        # Return minimal stats for JSON decode error
-        prompt_tokens = _estimate_tokens(prompt)
-        batch_stats = {
-            "prompt_tokens": prompt_tokens,
-            "response_tokens": _estimate_tokens(response_text) if 'response_text' in locals() else 0,
-            "total_tokens": prompt_tokens + (_estimate_tokens(response_text) if 'response_text' in locals() else 0)
-        }
         
-        return True, batch_stats  # Fallback success with stats
+        # Return minimal stats for JSON decode error (the entities of the batch are retried)
+        return True, _batch_token_stats(prompt, response_text if 'response_text' in locals() else None)  # Fallback success with stats
+    except AgentUnavailableError as e:
+        ai_logger.log_error(f"Agent unavailable for batch {batch_num}", str(e), context={
+            "batch_number": batch_num,
+            "entities_count": len(batch_states),
+            "error_type": "agent_unavailable"
+        })
+        # No answer to parse: the caller waits for the agent instead of burning the batch
+        raise
     except Exception as e:
         # Log the error
         ai_logger.log_error(f"Error querying AI for batch {batch_num}", str(e), context={
@@ -1497,45 +1960,46 @@ async def _process_single_batch(
         })
         
         _LOGGER.error(f"Error querying AI for batch {batch_num}: {e}")
-        _LOGGER.info(f"Falling back to domain-based classification for batch {batch_num}")
-        # Use fallback for all entities in this batch
-        for state in batch_states:
-            fallback_result = _create_fallback_result(state.entity_id, batch_num, "processing_error", state, hass)
-            all_results.append(fallback_result)
-            
-            # Send fallback result to frontend
-            if connection and msg_id:
-                connection.send_message(websocket_api.event_message(msg_id, {
-                    "type": "entity_result",
-                    "result": fallback_result
-                }))
+        # Entities without a committed result are retried by the caller
 
     # Calculate token statistics for this batch
-    prompt_tokens = _estimate_tokens(prompt)
-    response_tokens = _estimate_tokens(response_text) if 'response_text' in locals() else 0
-    
-    batch_stats = {
-        "prompt_tokens": prompt_tokens,
-        "response_tokens": response_tokens,
-        "total_tokens": prompt_tokens + response_tokens
-    }
+    batch_stats = _batch_token_stats(prompt, response_text if 'response_text' in locals() else None)
+    batch_stats["agent_id"] = served.get("agent_id", conversation_agent)
     
     # Log successful batch completion
     ai_logger.log_info(f"Batch {batch_num} completed successfully", {
         "batch_number": batch_num,
         "entities_processed": len(batch_states),
-        "prompt_tokens": prompt_tokens,
-        "response_tokens": response_tokens,
+        "prompt_tokens": batch_stats["prompt_tokens"],
+        "response_tokens": batch_stats["response_tokens"],
         "total_tokens": batch_stats["total_tokens"]
     })
     
     return True, batch_stats  # Success with statistics
 
 
+def _should_generate_thresholds(state: State, category: list) -> bool:
+    """Check if an analyzed entity warrants automatic thresholds (more inclusive approach)."""
+    tags = keyword_tags(state.entity_id)
+    should_generate_thresholds = (
+        'ALERTS' in category or  # Entities categorized as ALERTS
+        'battery' in tags or  # Battery entities
+        state.domain in ['binary_sensor', 'update'] or  # Binary sensors and update entities
+        (state.domain == 'sensor' and state.attributes.get('device_class') in ['battery', 'temperature', 'humidity', 'signal_strength']) or  # Specific sensor types
+        'threshold_candidate' in tags  # Keyword matching
+    )
+    
+    # Exclude auto_update_enabled switches and other configuration entities
+    return should_generate_thresholds and 'configuration' not in tags
+
+
 def _check_token_limit_exceeded(response_text: str) -> bool:
     """Check if the response indicates a token limit was exceeded."""
     if not response_text:
         return False
+    # A JSON answer is never an error message, whatever its reasons say
+    if response_text.lstrip().startswith(("[", "{", "```")):
+        return False
     
     response_lower = response_text.lower()
     for keyword in MAX_TOKEN_ERROR_KEYWORDS:
@@ -1548,42 +2012,11 @@ def _check_token_limit_exceeded(response_text: str) -> bool:
 
 def _get_entity_area(hass: HomeAssistant, entity_id: str) -> str:
     """Get area name for an entity."""
-    try:
-        from homeassistant.helpers import entity_registry as er, device_registry as dr, area_registry as ar
-        
-        entity_registry = er.async_get(hass)
-        device_registry = dr.async_get(hass)
-        area_registry = ar.async_get(hass)
-        
-        if not all([entity_registry, device_registry, area_registry]):
-            return _get_area_fallback(entity_id)
-            
-        # First try to get area from entity registry
-        entity_entry = entity_registry.async_get(entity_id)
-        area_id = None
-        
-        if entity_entry:
-            # Entity can have area directly
-            if entity_entry.area_id:
-                area_id = entity_entry.area_id
-            # Or get area from device
-            elif entity_entry.device_id:
-                device_entry = device_registry.async_get(entity_entry.device_id)
-                if device_entry and device_entry.area_id:
-                    area_id = device_entry.area_id
-        
-        # Convert area_id to area name
-        if area_id:
-            area_entry = area_registry.async_get_area(area_id)
-            if area_entry:
-                return area_entry.name
-                
-        # If no area found, use intelligent fallback
-        return _get_area_fallback(entity_id)
-                
-    except Exception as e:
-        _LOGGER.debug(f"Error getting area for {entity_id}: {e}")
-        return _get_area_fallback(entity_id)
+    area_name = async_get_registry_index(hass).area_name(entity_id)
+    if area_name:
+        return area_name
+    # If no area found, use intelligent fallback
+    return _get_area_fallback(entity_id)
 
 def _get_area_fallback(entity_id: str) -> str:
     """Provide intelligent area fallback based on entity domain and name."""
@@ -1611,24 +2044,45 @@ def _get_area_fallback(entity_id: str) -> str:
         return domain_areas[domain]
     
     # Name-based area detection (Italian)
-    name_lower = entity_name.lower()
-    if any(word in name_lower for word in ['cucina', 'kitchen']):
+    tags = keyword_tags(entity_name)
+    if 'area_kitchen' in tags:
         return 'Cucina'
-    elif any(word in name_lower for word in ['bagno', 'bathroom', 'wc']):
+    elif 'area_bathroom' in tags:
         return 'Bagno'
-    elif any(word in name_lower for word in ['camera', 'bedroom', 'letto']):
+    elif 'area_bedroom' in tags:
         return 'Camera da Letto'
-    elif any(word in name_lower for word in ['salotto', 'living', 'soggiorno']):
+    elif 'area_living_room' in tags:
         return 'Salotto'
-    elif any(word in name_lower for word in ['garage', 'cantina', 'basement']):
+    elif 'area_garage' in tags:
         return 'Garage'
-    elif any(word in name_lower for word in ['esterno', 'outdoor', 'giardino', 'balcone']):
+    elif 'area_outdoor' in tags:
         return 'Esterno'
     
     # Default fallback
     return 'Casa'
 
 
+def _create_rule_result(hass: HomeAssistant, state: State, classification: dict) -> dict:
+    """Create a result from a confident rule-based classification (thresholds are added by the caller)."""
+    result = {
+        "entity_id": state.entity_id,
+        "overall_weight": classification["rating"],
+        "overall_reason": classification["reason"],
+        "category": classification["category"],
+        "management_type": classification["management_type"],
+        "analysis_method": "rule_based",
+        "rule": classification["rule"],
+        "confidence": classification["confidence"],
+        "batch_number": 0,
+    }
+    
+    area_name = _get_entity_area(hass, state.entity_id)
+    if area_name and area_name != "Casa":  # Only add if not default
+        result["area"] = area_name
+    
+    return result
+
+
 def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domain_fallback", state: State = None, hass: HomeAssistant = None) -> dict:
     """Create a fallback result when AI analysis fails."""
     domain = entity_id.split(".")[0]
@@ -1653,17 +2107,17 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
         category = categories if categories else ["DATA"]  # Use all categories, not just the first one
     else:
         # Fallback domain-based categorization: GENERIC, sempre almeno DATA
-        entity_lower = entity_id.lower()
+        tags = keyword_tags(entity_id)
         category = ["DATA"]
         management_type = "USER"
         # Se ha pattern di controllo
-        if any(keyword in entity_lower for keyword in ["switch", "control", "toggle", "button", "command", "conversation"]):
+        if 'fallback_control' in tags:
             category.append("CONTROL")
         # Se ha pattern di alert
-        if any(keyword in entity_lower for keyword in ["battery", "unavailable", "offline", "signal", "error", "connection", "alarm", "alert", "update", "problem", "warning"]):
+        if 'fallback_alert' in tags:
             category.append("ALERTS")
         # Se ha pattern di servizio o è conversation/update/camera
-        if any(keyword in entity_lower for keyword in ["service", "api", "conversation", "update", "camera"]):
+        if 'fallback_service' in tags:
             category.append("SERVICE")
         # Rimuovi duplicati
         category = list(dict.fromkeys(category))
@@ -1682,7 +2136,7 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
         domain = entity_id.split('.')[0] if '.' in entity_id else ''
         if domain == 'weather':
             fallback_reason = f"Weather sensor providing {reason_map[importance].lower()} environmental data for home automation"
-        elif domain == 'sensor' and 'battery' in entity_id.lower():
+        elif domain == 'sensor' and 'battery' in keyword_tags(entity_id):
             fallback_reason = f"Battery level sensor with {reason_map[importance].lower()} for device monitoring and maintenance alerts"
         elif domain == 'sensor':
             fallback_reason = f"Sensor providing {reason_map[importance].lower()} data for home monitoring and automation triggers"
@@ -1694,15 +2148,15 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
     else:
         # Create more descriptive reasons for auto-categorization with enhanced patterns
         domain = entity_id.split('.')[0] if '.' in entity_id else ''
-        entity_lower = entity_id.lower()
+        tags = keyword_tags(entity_id)
         
         if domain == 'conversation':
             fallback_reason = f"Voice assistant control interface with {reason_map[importance].lower()} for smart home voice automation and interaction"
-        elif any(keyword in entity_lower for keyword in ['meteo', 'weather', 'forecast']):
+        elif 'weather_source' in tags:
             fallback_reason = f"Weather information sensor providing {reason_map[importance].lower()} meteorological data for climate-based automations"
         elif domain == 'weather':
             fallback_reason = f"Weather sensor providing {reason_map[importance].lower()} environmental data for automation decisions"
-        elif domain == 'sensor' and 'battery' in entity_lower:
+        elif domain == 'sensor' and 'battery' in tags:
             fallback_reason = f"Battery monitoring sensor with {reason_map[importance].lower()} for preventive maintenance alerts"
         elif domain == 'sensor':
             fallback_reason = f"Data sensor with {reason_map[importance].lower()} utility for home automation and monitoring"
@@ -1734,14 +2188,15 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
             # Create basic fallback thresholds without AI assistance
             domain = entity_id.split('.')[0]
             auto_thresholds = {"auto_generated": True, "entity_type": "fallback", "thresholds": {}}
+            tags = keyword_tags(entity_id)
             
-            if 'battery' in entity_id.lower():
+            if 'battery' in tags:
                 auto_thresholds["thresholds"] = {
                     "LOW": {"value": 30, "condition": "< 30%", "description": "Battery getting low"},
                     "MEDIUM": {"value": 20, "condition": "< 20%", "description": "Battery low"},
                     "HIGH": {"value": 10, "condition": "< 10%", "description": "Battery critical"}
                 }
-            elif domain == 'update' or ('update' in entity_id.lower() and 'auto_update_enabled' not in entity_id.lower()):
+            elif domain == 'update' or ('update' in tags and 'auto_update_enabled' not in tags):
                 # Only for real update entities, not auto_update_enabled switches
                 auto_thresholds["thresholds"] = {
                     "LOW": {"condition": "state == 'on'", "description": "Update available"},
@@ -1754,13 +2209,13 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
                     "MEDIUM": {"condition": "state == 'on' for > 5 min", "description": "Persistent alert"},
                     "HIGH": {"condition": "state == 'on' for > 30 min", "description": "Long-term issue"}
                 }
-            elif 'temperature' in entity_id.lower():
+            elif 'temperature' in tags:
                 auto_thresholds["thresholds"] = {
                     "LOW": {"value": 15, "condition": "< 15°C", "description": "Temperature too cold"},
                     "MEDIUM": {"value": 10, "condition": "< 10°C", "description": "Temperature very cold"}, 
                     "HIGH": {"value": 5, "condition": "< 5°C", "description": "Temperature critically cold"}
                 }
-            elif any(keyword in entity_id.lower() for keyword in ['heart_rate', 'pulse']):
+            elif 'heart_rate_fallback' in tags:
                 auto_thresholds["thresholds"] = {
                     "LOW": {"value": 50, "condition": "< 50 BPM", "description": "Heart rate low"},
                     "MEDIUM": {"value": 40, "condition": "< 40 BPM", "description": "Heart rate very low"},
@@ -1775,75 +2230,136 @@ def _create_fallback_result(entity_id: str, batch_num: int, reason: str = "domai
     return result
 
 
-async def _query_local_agent(hass: HomeAssistant, prompt: str, conversation_agent: str = None) -> str:
-    """Query Home Assistant local conversation agent using HA services."""
-    try:
-        _LOGGER.debug(f"Querying local conversation agent via HA services...")
-        
-        # Determine which agent to use
-        agent_id = None
-        
-        if conversation_agent == "auto" or conversation_agent is None:
-            # Auto-detect: find first non-default agent
-            conversation_agents = []
-            for entity_id in hass.states.async_entity_ids("conversation"):
-                if entity_id != "conversation.home_assistant":  # Skip default agent
-                    conversation_agents.append(entity_id)
-                    _LOGGER.info(f"🔍 Found conversation agent: {entity_id}")
+async def _query_local_agent(hass: HomeAssistant, prompt: str, conversation_agent: str = None, request_lane: str = AGENT_LANE_BACKGROUND, timeout: Optional[float] = None, request_tokens: Optional[int] = None, served: Optional[dict] = None) -> str:
+    """Query Home Assistant local conversation agent using HA services.
+    
+    The request waits for a slot of its priority lane in the shared agent request scheduler.
+    Raises AgentUnavailableError when the agent fails, and AgentCircuitOpenError without
+    calling it while its circuit breaker is open. The timeout only covers the agent call,
+    not the wait for a slot; asyncio.TimeoutError is raised when it runs out.
+    
+    With an agent pool, request_tokens keeps the request away from agents known to be too
+    small for it. When served is given, the request is paced by the adaptive pacer of the
+    agent that serves it, and served gets that agent_id and the latency of the call."""
+    _LOGGER.debug(f"Querying local conversation agent via HA services...")
+    
+    # Determine which agent to use
+    agent_id = None
+    
+    if conversation_agent == "auto" or conversation_agent is None:
+        # Auto-detect: find first non-default agent
+        conversation_agents = []
+        for entity_id in hass.states.async_entity_ids("conversation"):
+            if entity_id != "conversation.home_assistant":  # Skip default agent
+                conversation_agents.append(entity_id)
+                _LOGGER.info(f"🔍 Found conversation agent: {entity_id}")
+        
+        agent_id = conversation_agents[0] if conversation_agents else None
+        _LOGGER.info(f"🎯 Auto-detected agent: {agent_id}")
+        
+    elif conversation_agent and conversation_agent != "auto":
+        # Use specifically configured agent
+        agent_id = conversation_agent
+        _LOGGER.info(f"🎯 Using configured agent: {agent_id}")
+    
+    if agent_id:
+        _LOGGER.debug(f"Using conversation agent: {agent_id}")
+    else:
+        _LOGGER.warning(f"⚠️ No custom conversation agents found, using default (may not work well)")
+    
+    # Use Home Assistant service to process conversation
+    _LOGGER.info(f"� Sending conversation via service (prompt length: {len(prompt)} chars)")
+    
+    service_data = {
+        "text": prompt,
+        "language": hass.config.language
+    }
+    
+    # Add agent_id if we found a custom agent
+    if agent_id:
+        service_data["agent_id"] = agent_id
+    
+    # Call the conversation.process service once the scheduler grants the lane a slot
+    async with agent_request_slot(hass, request_lane):
+        async with agent_lease(hass, request_tokens) as lease:
+            if lease is not None:
+                # Agent pool: the request goes to the agent the pool picked
+                service_data["agent_id"] = lease["agent_id"]
+                _LOGGER.debug(f"Agent pool routed the request to {lease['agent_id']}")
             
-            agent_id = conversation_agents[0] if conversation_agents else None
-            _LOGGER.info(f"🎯 Auto-detected agent: {agent_id}")
+            if served is not None:
+                # Adaptive pacing: only waits when this agent has been rate limiting or is overloaded
+                served["agent_id"] = lease["agent_id"] if lease is not None else conversation_agent
+                await get_agent_pacer(served["agent_id"]).async_wait()
             
-        elif conversation_agent and conversation_agent != "auto":
-            # Use specifically configured agent
-            agent_id = conversation_agent
-            _LOGGER.info(f"🎯 Using configured agent: {agent_id}")
-        
-        if agent_id:
-            _LOGGER.debug(f"Using conversation agent: {agent_id}")
-        else:
-            _LOGGER.warning(f"⚠️ No custom conversation agents found, using default (may not work well)")
-        
-        # Use Home Assistant service to process conversation
-        _LOGGER.info(f"� Sending conversation via service (prompt length: {len(prompt)} chars)")
-        
-        service_data = {
-            "text": prompt,
-            "language": hass.config.language
-        }
-        
-        # Add agent_id if we found a custom agent
-        if agent_id:
-            service_data["agent_id"] = agent_id
-        
-        # Call the conversation.process service
-        response = await hass.services.async_call(
-            "conversation", 
-            "process", 
-            service_data, 
-            blocking=True, 
-            return_response=True
-        )
-        
-        _LOGGER.info(f"� Service response: {response}")
-        
-        # Extract the response text
-        if response and "response" in response and "speech" in response["response"]:
-            response_text = response["response"]["speech"]["plain"]["speech"]
-            _LOGGER.info(f"📄 Extracted response text: {response_text[:200]}...")
-            return response_text
-        else:
-            _LOGGER.error(f"❌ Unexpected service response format: {response}")
-            raise Exception(f"Invalid service response format: {response}")
-        
-    except Exception as e:
-        _LOGGER.error(f"❌ Error querying conversation service: {type(e).__name__}: {e}")
-        _LOGGER.error(f"🔧 Make sure you have a proper conversation agent configured")
-        _LOGGER.error(f"💡 Check Settings > Voice Assistants > Conversation Agent")
-        # Return a simple structured response as fallback
-        return """[
-{"entity_id": "fallback", "rating": 2, "reason": "Servizio conversazione non disponibile - verifica configurazione agente in Impostazioni > Assistenti vocali", "category": ["DATA"], "management_type": "USER"}
-]"""
+            # Fail fast instead of waiting on an agent that keeps failing
+            breaker = get_agent_circuit_breaker(service_data.get("agent_id"))
+            if not breaker.allow_request():
+                raise AgentCircuitOpenError(
+                    f"Circuit open for agent {breaker.name}, retry in {breaker.retry_after():.0f}s",
+                    breaker.name, breaker.retry_after()
+                )
+            
+            try:
+                service_call = hass.services.async_call(
+                    "conversation", 
+                    "process", 
+                    service_data, 
+                    blocking=True, 
+                    return_response=True
+                )
+                request_started = time.monotonic()
+                response = await (asyncio.wait_for(service_call, timeout) if timeout else service_call)
+                if served is not None:
+                    served["latency"] = time.monotonic() - request_started
+            except asyncio.CancelledError:
+                breaker.record_cancelled()
+                raise
+            except asyncio.TimeoutError:
+                # A hung agent counts against its circuit, the caller decides what a timeout means
+                breaker.record_failure()
+                _LOGGER.warning(f"⏱️ Conversation agent {breaker.name} did not answer within {timeout}s")
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                _LOGGER.error(f"❌ Error querying conversation service: {type(e).__name__}: {e}")
+                _LOGGER.error(f"🔧 Make sure you have a proper conversation agent configured")
+                _LOGGER.error(f"💡 Check Settings > Voice Assistants > Conversation Agent")
+                # With a pool the next request goes to another agent right away
+                raise AgentUnavailableError(
+                    f"Conversation agent {breaker.name} failed: {type(e).__name__}: {e}",
+                    breaker.name, breaker.retry_after() if lease is None else 0.0
+                ) from e
+            
+            _LOGGER.info(f"� Service response: {response}")
+            
+            # Extract the response text (never raises: a probe must record its outcome to leave half-open)
+            response_text = _conversation_response_text(response)
+            if response_text is None:
+                breaker.record_failure()
+                _LOGGER.error(f"❌ Unexpected service response format: {response}")
+                raise AgentUnavailableError(
+                    f"Invalid service response format from agent {breaker.name}: {response}",
+                    breaker.name, breaker.retry_after() if lease is None else 0.0
+                )
+            
+            breaker.record_success()
+            if lease is not None:
+                # The agent answered; a too large request is the caller's problem, an overloaded agent is not
+                lease["success"] = not is_rate_limited_response(response_text)
+    
+    _LOGGER.info(f"📄 Extracted response text: {response_text[:200]}...")
+    return response_text
+
+
+def _conversation_response_text(response) -> Optional[str]:
+    """Speech text of a conversation.process response, None if the format is unexpected."""
+    speech = response
+    for key in ("response", "speech", "plain", "speech"):
+        if not isinstance(speech, dict):
+            return None
+        speech = speech.get(key)
+    return speech if isinstance(speech, str) else None
 
 
 def _extract_room_from_entity(entity_id: str) -> str:
@@ -1902,32 +2418,32 @@ async def find_entity_correlations(hass: HomeAssistant, target_entity: dict, all
         # Define smart correlation patterns
         if target_domain == 'switch' or target_domain == 'light':
             # For switches/lights, prioritize presence, motion, time-based entities
-            priority_patterns = ['person', 'device_tracker', 'presence', 'motion', 'occupancy', 'binary_sensor', 'sun', 'time']
+            priority_patterns = {'person', 'device_tracker', 'presence', 'motion', 'occupancy', 'binary_sensor', 'sun', 'time'}
             room_name = _extract_room_from_entity(target_id)
             
         elif target_domain == 'climate':
             # For climate, prioritize temperature, weather, presence
-            priority_patterns = ['temperature', 'weather', 'presence', 'person', 'window', 'door', 'humidity']
+            priority_patterns = {'temperature', 'weather', 'presence', 'person', 'window', 'door', 'humidity'}
             room_name = _extract_room_from_entity(target_id)
             
         elif target_domain == 'cover':
             # For covers, prioritize sun, weather, temperature
-            priority_patterns = ['sun', 'weather', 'temperature', 'wind', 'rain', 'brightness', 'illuminance']
+            priority_patterns = {'sun', 'weather', 'temperature', 'wind', 'rain', 'brightness', 'illuminance'}
             room_name = _extract_room_from_entity(target_id)
             
         elif target_domain == 'media_player':
             # For media, prioritize presence, time
-            priority_patterns = ['person', 'presence', 'device_tracker', 'time', 'sun']
+            priority_patterns = {'person', 'presence', 'device_tracker', 'time', 'sun'}
             room_name = _extract_room_from_entity(target_id)
             
         elif target_domain == 'alarm_control_panel':
             # For alarms, prioritize presence, doors, windows
-            priority_patterns = ['person', 'device_tracker', 'door', 'window', 'motion', 'presence']
+            priority_patterns = {'person', 'device_tracker', 'door', 'window', 'motion', 'presence'}
             room_name = None
             
         else:
             # Default patterns for other entities
-            priority_patterns = ['person', 'presence', 'motion', 'time', 'sun']
+            priority_patterns = {'person', 'presence', 'motion', 'time', 'sun'}
             room_name = _extract_room_from_entity(target_id)
         
         # Filter candidates intelligently
@@ -1950,7 +2466,6 @@ async def find_entity_correlations(hass: HomeAssistant, target_entity: dict, all
                 
             entity_id = entity["entity_id"]
             entity_domain = entity_id.split('.')[0]
-            entity_lower = entity_id.lower()
             
             # Priority score calculation
             score = 0
@@ -1960,12 +2475,10 @@ async def find_entity_correlations(hass: HomeAssistant, target_entity: dict, all
                 score += 10
             
             # Check name pattern matches
-            for pattern in priority_patterns:
-                if pattern in entity_lower:
-                    score += 5
+            score += 5 * len(priority_patterns & matched_keywords(entity_id))
                     
             # Room correlation boost
-            if room_name and room_name in entity_lower:
+            if room_name and room_name in entity_id.lower():
                 score += 15
                 
             # Add entity with score
@@ -2036,58 +2549,55 @@ If no useful correlation: []"""
         
         # Query AI for correlations with timeout
         try:
-            response_text = await asyncio.wait_for(_query_local_agent(hass, prompt), timeout=30.0)
+            # User-started analysis; the timeout starts once the request has its slot
+            response_text = await _query_local_agent(hass, prompt, None, AGENT_LANE_INTERACTIVE, timeout=30.0)
         except asyncio.TimeoutError:
             _LOGGER.warning(f"Correlation query timeout for {target_id}")
             return []
-        
-        # Parse the response
-        try:
-            # Clean response text
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            correlations = json.loads(response_text)
-            if isinstance(correlations, list):
-                # Validate and clean up correlations
-                valid_correlations = []
-                for corr in correlations:
-                    if (isinstance(corr, dict) and 
-                        "entity_id" in corr and 
-                        isinstance(corr.get("strength"), (int, float)) and
-                        1 <= corr.get("strength", 0) <= 5):
-                        
-                        # Ensure all required fields
-                        validated_corr = {
-                            "entity_id": corr["entity_id"],
-                            "correlation_type": corr.get("type", corr.get("correlation_type", "functional")),
-                            "strength": int(corr["strength"]),
-                            "reason": corr.get("reason", "AI detected correlation")[:100]  # Limit reason length
-                        }
-                        valid_correlations.append(validated_corr)
-                
-                _LOGGER.info(f"Found {len(valid_correlations)} correlations for {target_id}")
-                return valid_correlations
-            else:
-                _LOGGER.warning(f"Invalid correlation response format for {target_id}: not a list")
-                return []
-                
-        except json.JSONDecodeError as e:
-            _LOGGER.error(f"Failed to parse correlation response for {target_id}: {e}")
+        except AgentUnavailableError:
+            # "No correlations" would be stored as the answer: let the caller stop instead
+            raise
+        
+        # Parse the response item by item: a truncated or partly broken answer keeps its complete correlations
+        correlations, response_parser = parse_json_items(response_text)
+        if not correlations and not response_parser.array_closed:
+            _LOGGER.warning(f"No correlation list in the response for {target_id}")
             _LOGGER.debug(f"Raw response: {response_text[:200]}...")
             return []
+        
+        # Validate and clean up correlations
+        valid_correlations = []
+        for corr in correlations:
+            if (isinstance(corr, dict) and 
+                "entity_id" in corr and 
+                isinstance(corr.get("strength"), (int, float)) and
+                1 <= corr.get("strength", 0) <= 5):
+                
+                # Ensure all required fields
+                validated_corr = {
+                    "entity_id": corr["entity_id"],
+                    "correlation_type": corr.get("type", corr.get("correlation_type", "functional")),
+                    "strength": int(corr["strength"]),
+                    "reason": str(corr.get("reason", "AI detected correlation"))[:100]  # Limit reason length
+                }
+                valid_correlations.append(validated_corr)
+        
+        if response_parser.items_malformed or response_parser.truncated:
+            _LOGGER.warning(f"Correlation response for {target_id} was truncated or partly malformed, kept {len(valid_correlations)} correlations")
+        _LOGGER.info(f"Found {len(valid_correlations)} correlations for {target_id}")
+        return valid_correlations
             
+    except AgentUnavailableError:
+        raise
     except Exception as e:
         _LOGGER.error(f"Error finding correlations for {target_entity.get('entity_id', 'unknown')}: {e}")
         return []
 
 
-async def generate_thresholds_for_entities(hass: HomeAssistant, entities: list, agent, ai_provider: str, api_key: str) -> dict:
-    """Generate AI thresholds for multiple entities."""
+async def generate_thresholds_for_entities(hass: HomeAssistant, entities: list, agent, ai_provider: str, api_key: str, conversation_agent: str = None, request_lane: str = AGENT_LANE_BACKGROUND) -> dict:
+    """Generate AI thresholds for multiple entities (one agent request per THRESHOLD_BATCH_MAX_ENTITIES).
+    
+    Raises AgentUnavailableError when the agent does not answer, so the entities stay to do."""
     results = {}
     
     if not entities:
@@ -2095,30 +2605,31 @@ async def generate_thresholds_for_entities(hass: HomeAssistant, entities: list,
         
     _LOGGER.info(f"Generating thresholds for {len(entities)} entities")
     
+    states = []
     for entity_data in entities:
         entity_id = entity_data.get("entity_id")
         if not entity_id:
             continue
-            
-        try:
-            # Get current state
-            state = hass.states.get(entity_id)
-            if not state:
-                _LOGGER.warning(f"Entity {entity_id} not found in state registry")
-                continue
-                
-            # Generate thresholds using existing function
-            threshold_result = await _generate_auto_thresholds(hass, entity_id, state)
-            
-            if threshold_result and threshold_result.get("thresholds"):
-                results[entity_id] = threshold_result["thresholds"]
-                _LOGGER.debug(f"Generated thresholds for {entity_id}: {threshold_result['thresholds']}")
-            else:
-                _LOGGER.debug(f"No thresholds generated for {entity_id}")
-                
-        except Exception as e:
-            _LOGGER.error(f"Error generating thresholds for {entity_id}: {e}")
+        state = hass.states.get(entity_id)
+        if not state:
+            _LOGGER.warning(f"Entity {entity_id} not found in state registry")
             continue
+        states.append(state)
+    
+    try:
+        threshold_results = await generate_auto_thresholds_batch(hass, states, conversation_agent, request_lane)
+    except AgentUnavailableError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Error generating thresholds for {len(states)} entities: {e}")
+        return results
+    
+    for entity_id, threshold_result in threshold_results.items():
+        if threshold_result.get("thresholds"):
+            results[entity_id] = threshold_result["thresholds"]
+            _LOGGER.debug(f"Generated thresholds for {entity_id}: {threshold_result['thresholds']}")
+        else:
+            _LOGGER.debug(f"No thresholds generated for {entity_id}")
     
     _LOGGER.info(f"Successfully generated thresholds for {len(results)} out of {len(entities)} entities")
     return results
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+HASS AI Job Manager
+Runs scans, threshold runs and correlation runs as cancellable jobs
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+JOB_MANAGER_KEY = f"{DOMAIN}_job_manager"  # hass.data key of the running job manager
+
+
+class OperationJob:
+    """One user-started operation, running in its own task."""
+
+    def __init__(self, job_type: str, connection=None, msg_id: int = None):
+        self.job_id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.connection = connection
+        self.msg_id = msg_id
+        self.started = dt.utcnow().isoformat()
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "type": self.job_type,
+            "started": self.started,
+            "cancelled": self.cancelled,
+        }
+
+
+class JobManager:
+    """Active jobs by id, with real cancellation.
+
+    Jobs of different types run side by side, their agent requests share the
+    slots of the agent request scheduler; a second job of a type that is
+    already running is refused (it would share its checkpoint). Cancelling a job
+    sets its cancelled flag and cancels its task, which interrupts the agent call
+    it is waiting on.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.jobs: Dict[str, OperationJob] = {}
+
+    @callback
+    def async_start(
+        self,
+        job_type: str,
+        run: Callable[[OperationJob], Awaitable[None]],
+        connection=None,
+        msg_id: int = None,
+    ) -> Optional[OperationJob]:
+        """Start a job in its own task, or return None if one of this type is running."""
+        if self.get_running(job_type) is not None:
+            return None
+
+        job = OperationJob(job_type, connection, msg_id)
+        self.jobs[job.job_id] = job
+        job.task = self.hass.async_create_task(self._async_run(job, run))
+        _LOGGER.info(f"▶️ Started {job_type} job {job.job_id}")
+        return job
+
+    async def _async_run(self, job: OperationJob, run: Callable[[OperationJob], Awaitable[None]]) -> None:
+        try:
+            await run(job)
+        finally:
+            self.jobs.pop(job.job_id, None)
+            _LOGGER.debug(f"Job {job.job_id} ({job.job_type}) finished")
+
+    def get_running(self, job_type: str) -> Optional[OperationJob]:
+        """Return the running job of a type, if any."""
+        return next((job for job in self.jobs.values() if job.job_type == job_type), None)
+
+    @callback
+    def async_cancel(self, job_id: str = None) -> List[str]:
+        """Cancel one job, or all jobs when no id is given; returns the cancelled ids."""
+        if job_id is None:
+            jobs = list(self.jobs.values())
+        else:
+            jobs = [self.jobs[job_id]] if job_id in self.jobs else []
+        for job in jobs:
+            job.cancelled = True
+            if job.task and not job.task.done():
+                job.task.cancel()
+            _LOGGER.info(f"🛑 Cancelled {job.job_type} job {job.job_id}")
+        return [job.job_id for job in jobs]
+
+    def has_active_jobs(self) -> bool:
+        """Whether a user-started job is running (background work yields to it)."""
+        return bool(self.jobs)
+
+    async def async_shutdown(self) -> None:
+        """Cancel all jobs and wait for them to save their progress."""
+        tasks = [job.task for job in self.jobs.values() if job.task]
+        self.async_cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_status(self) -> dict:
+        """Return the running jobs."""
+        return {
+            "jobs": [job.as_dict() for job in self.jobs.values()],
+        }
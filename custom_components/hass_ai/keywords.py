@@ -0,0 +1,210 @@
+"""
+HASS AI Keyword Matcher
+Tags an entity_id once with every keyword class it matches, for all name-based heuristics
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Tuple
+
+KEYWORD_TAG_CACHE_SIZE = 50000
+
+# Keyword classes: an entity matches a class when its entity_id contains any of the keywords
+KEYWORD_CLASSES: Dict[str, Tuple[str, ...]] = {
+    # Single keywords
+    "battery": ("battery",),
+    "battery_level": ("battery_level",),
+    "update": ("update",),
+    "auto_update_enabled": ("auto_update_enabled",),
+    "temperature": ("temperature",),
+    "health": ("health",),
+    "hp_printer": ("hp_",),
+    "ink": ("ink",),
+    "oxygen_saturation": ("oxygen", "saturation"),
+    "hass_ai_alerts": ("hass_ai_alerts",),
+    "air_quality": ("air_quality",),
+    "poor": ("poor",),
+
+    # Auto-categorization of sensors
+    "health_metric": (
+        "heart_rate", "calories", "steps", "distance", "sleep", "weight", "blood", "fitness",
+        "oxygen", "saturation", "pulse", "bp", "pressure", "glucose", "cholesterol", "bmi",
+        "body_mass", "hydration", "stress", "recovery",
+    ),
+    "severe_weather": ("wind", "storm", "flood", "earthquake", "emergency"),
+    "temperature_any": ("temperature", "temp", "temperatura"),
+    "humidity_any": ("humidity", "umidita", "umidità", "moisture"),
+    "average": ("media", "average", "mean", "avg"),
+    "average_metric": ("temperature", "temp", "humidity", "umidita", "energia", "energy", "power", "potenza"),
+    "system_diagnostic": ("rssi", "linkquality", "uptime", "memory", "cpu", "disk", "connection"),
+
+    # Auto-categorization of other domains
+    "weather_info": (
+        "meteo", "weather", "forecast", "temperatura", "temperature", "humidity", "pressure",
+        "wind", "rain", "snow", "precipitation",
+    ),
+    "wellness": (
+        "health", "heart", "calories", "steps", "fitness", "sleep", "weight", "oxygen",
+        "saturation", "pulse", "blood", "pressure", "glucose", "bmi", "hydration", "stress", "recovery",
+    ),
+    "alert_word": ("error", "warning", "alert", "alarm"),
+    "control_word": ("switch", "control", "toggle", "button", "command"),
+
+    # Fallback categorization without a state
+    "fallback_control": ("switch", "control", "toggle", "button", "command", "conversation"),
+    "fallback_alert": (
+        "battery", "unavailable", "offline", "signal", "error", "connection", "alarm", "alert",
+        "update", "problem", "warning",
+    ),
+    "fallback_service": ("service", "api", "conversation", "update", "camera"),
+    "weather_source": ("meteo", "weather", "forecast"),
+
+    # Threshold generation
+    "threshold_candidate": ("temperature", "humidity", "cpu", "memory", "disk", "heart_rate", "signal"),
+    "configuration": ("auto_update_enabled", "_enabled", "_config", "_setting"),
+    "binary_threshold": ("battery", "update", "problem", "error", "warning", "alert"),
+    "numeric_threshold": (
+        "battery", "temperature", "humidity", "wind", "cpu", "memory", "disk",
+        "signal", "rssi", "heart_rate", "blood", "weight", "calories", "steps",
+        "oxygen", "saturation", "spo2", "pulse", "pressure", "ink", "toner",
+        "cartridge", "level", "remaining", "health", "sensor", "monitor",
+    ),
+    "text_threshold": ("battery", "update", "status", "state", "error", "warning", "ink", "toner"),
+    "binary_alert": (
+        "battery", "problem", "error", "offline", "disconnected", "fault", "alarm", "warning",
+        "update", "maintenance",
+    ),
+    "problem": ("problem", "error", "fault", "smoke", "gas"),
+    "disconnected": ("offline", "disconnected", "connection"),
+    "opening": ("door", "window"),
+    "heart_rate": ("heart_rate", "pulse", "bpm"),
+    "heart_rate_fallback": ("heart_rate", "pulse"),
+    "system_usage": ("cpu", "memory", "disk"),
+    "signal": ("rssi", "signal", "linkquality"),
+
+    # Area fallback (Italian and English room names)
+    "area_kitchen": ("cucina", "kitchen"),
+    "area_bathroom": ("bagno", "bathroom", "wc"),
+    "area_bedroom": ("camera", "bedroom", "letto"),
+    "area_living_room": ("salotto", "living", "soggiorno"),
+    "area_garage": ("garage", "cantina", "basement"),
+    "area_outdoor": ("esterno", "outdoor", "giardino", "balcone"),
+
+    # Alert entity validation
+    "measurable": ("co2", "aqi", "pm", "noise", "signal"),
+    "text_sensor": ("status", "mode", "text", "message", "name"),
+    "vital_sign": ("heart", "oxygen", "blood", "steps"),
+    "binary_event": ("open", "closed", "detected", "alarm", "alert"),
+    "safety_switch": ("security", "alarm", "emergency", "safety"),
+    "indicator_light": ("emergency", "alarm", "indicator", "warning"),
+
+    # Alert entity types
+    "type_temperature": ("temp", "temperature"),
+    "type_humidity": ("humid", "moisture"),
+    "type_battery": ("batt", "battery"),
+    "type_co2": ("co2", "carbon"),
+    "type_pressure": ("pressure", "press"),
+    "type_door": ("door", "porta"),
+    "type_window": ("window", "finestra"),
+    "type_motion": ("motion", "movimento", "pir"),
+    "type_smoke": ("smoke", "fumo"),
+    "type_gas": ("gas", "leak"),
+    "type_security": ("security", "alarm"),
+    "type_emergency": ("emergency", "emer"),
+
+    # Sensors that alert when their value is low
+    "low_value": (
+        "battery", "batteria", "power_level",
+        "signal", "rssi", "wifi", "segnale", "strength",
+        "available", "free", "remaining", "libero", "disponibile",
+        "uptime", "connectivity", "connettivita",
+        "ink", "toner", "cartridge", "cartuccia",
+    ),
+    "low_value_percent": ("battery", "signal", "storage", "disk", "available", "free"),
+
+    # Pre-classification
+    "diagnostic": ("rssi", "linkquality", "link_quality", "signal_strength", "_lqi", "last_seen", "uptime"),
+
+    # Correlation candidates (scored per matching keyword)
+    "correlation_subject": (
+        "person", "device_tracker", "presence", "motion", "occupancy", "binary_sensor", "sun", "time",
+        "temperature", "weather", "window", "door", "humidity", "wind", "rain", "brightness", "illuminance",
+    ),
+}
+
+
+class KeywordMatcher:
+    """Finds every keyword contained in a text with a single precompiled regex.
+
+    A zero-width lookahead tries the keywords at every position, longest
+    first, so overlapping keywords are all found: the shorter keywords that
+    start at the same position are prefixes of the longest one and are added
+    from a precomputed table.
+    """
+
+    def __init__(self, classes: Dict[str, Iterable[str]]):
+        self._keyword_classes: Dict[str, set] = {}
+        for class_name, keywords in classes.items():
+            for keyword in keywords:
+                self._keyword_classes.setdefault(keyword, set()).add(class_name)
+
+        keywords = sorted(self._keyword_classes, key=len, reverse=True)
+        self._prefixes: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(other for other in keywords if keyword.startswith(other))
+            for keyword in keywords
+        }
+        self._pattern = re.compile(f"(?=({_trie_pattern(keywords)}))")
+
+    def keywords(self, text: str) -> FrozenSet[str]:
+        """All keywords contained in text."""
+        found = set()
+        for match in self._pattern.finditer(text):
+            found |= self._prefixes[match.group(1)]
+        return frozenset(found)
+
+    def tags(self, text: str) -> FrozenSet[str]:
+        """All keyword classes matched by text."""
+        tags = set()
+        for keyword in self.keywords(text):
+            tags |= self._keyword_classes[keyword]
+        return frozenset(tags)
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Regex alternation factored by common prefixes, so each position tries few branches."""
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        # Branches start with different characters, so at most one of them can match
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if "" in node:
+            # Optional and greedy: the longest keyword wins
+            if not branches:
+                return ""
+            return f"(?:{'|'.join(branches)})?"
+        if len(branches) == 1:
+            return branches[0]
+        return f"(?:{'|'.join(branches)})"
+
+    return build(trie)
+
+
+_MATCHER = KeywordMatcher(KEYWORD_CLASSES)
+
+
+@lru_cache(maxsize=KEYWORD_TAG_CACHE_SIZE)
+def keyword_tags(entity_id: str) -> FrozenSet[str]:
+    """Keyword classes matched by an entity_id (case-insensitive, cached)."""
+    return _MATCHER.tags(entity_id.lower())
+
+
+@lru_cache(maxsize=KEYWORD_TAG_CACHE_SIZE)
+def matched_keywords(entity_id: str) -> FrozenSet[str]:
+    """Keywords contained in an entity_id (case-insensitive, cached)."""
+    return _MATCHER.keywords(entity_id.lower())
@@ -0,0 +1,132 @@
+"""
+HASS AI Adaptive Pacing
+Delays agent requests only when the conversation agent is rate limiting or overloaded
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from .const import (
+    PACING_MAX_DELAY,
+    PACING_BACKOFF_STEP,
+    PACING_RECOVERY_FACTOR,
+    PACING_OVERLOAD_LATENCY_FACTOR,
+    PACING_LATENCY_SMOOTHING,
+    RATE_LIMIT_ERROR_KEYWORDS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdaptivePacer:
+    """Adaptive delay between agent requests, driven by observed latency and errors.
+
+    The delay starts at zero. Rate-limit/overload errors double it (starting from
+    PACING_BACKOFF_STEP), responses much slower than the usual latency raise it a
+    little, and every normal response shrinks it back towards zero.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self.delay = 0.0
+        self.avg_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self.total_requests = 0
+        self.rate_limited_requests = 0
+        self.overloaded_requests = 0
+        self.total_delay = 0.0
+
+    async def async_wait(self) -> float:
+        """Wait for the current pacing delay (no-op when the agent is healthy)."""
+        delay = self.delay
+        if delay <= 0:
+            return 0.0
+        _LOGGER.debug(f"⏳ Pacing agent {self.name}: waiting {delay:.2f}s before next request")
+        self.total_delay += delay
+        await asyncio.sleep(delay)
+        return delay
+
+    def record_success(self, latency: float, expected_latency: Optional[float] = None) -> None:
+        """Record a normal response and its latency.
+
+        expected_latency (for the size of this request) replaces the baseline
+        when known, so large prompts are not mistaken for an overloaded agent.
+        """
+        self.total_requests += 1
+
+        if self.avg_latency is None:
+            self.avg_latency = latency
+            self.baseline_latency = latency
+            return
+
+        reference_latency = expected_latency if expected_latency else self.baseline_latency
+        overloaded = latency > reference_latency * PACING_OVERLOAD_LATENCY_FACTOR
+
+        self.avg_latency = (PACING_LATENCY_SMOOTHING * latency) + ((1 - PACING_LATENCY_SMOOTHING) * self.avg_latency)
+        # Baseline follows fast responses immediately and slow ones only gradually
+        if latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += (latency - self.baseline_latency) * (PACING_LATENCY_SMOOTHING / 4)
+
+        if overloaded:
+            self.overloaded_requests += 1
+            self._increase(PACING_BACKOFF_STEP / 2)
+            _LOGGER.debug(f"🐢 Agent {self.name} looks overloaded ({latency:.1f}s vs {self.baseline_latency:.1f}s baseline), delay now {self.delay:.2f}s")
+        else:
+            self._recover()
+
+    def record_rate_limited(self) -> None:
+        """Record a rate-limit or overload error returned by the agent."""
+        self.total_requests += 1
+        self.rate_limited_requests += 1
+        self._increase(max(PACING_BACKOFF_STEP, self.delay))
+        _LOGGER.warning(f"🚦 Agent {self.name} is rate limiting, delay now {self.delay:.2f}s")
+
+    def _increase(self, amount: float) -> None:
+        self.delay = min(PACING_MAX_DELAY, self.delay + amount)
+
+    def _recover(self) -> None:
+        if self.delay <= 0:
+            return
+        self.delay *= PACING_RECOVERY_FACTOR
+        if self.delay < 0.05:
+            self.delay = 0.0
+
+    def get_stats(self) -> dict:
+        """Return pacing statistics for logs and scan reports."""
+        return {
+            "agent": self.name,
+            "current_delay": round(self.delay, 2),
+            "average_latency": round(self.avg_latency, 2) if self.avg_latency is not None else None,
+            "baseline_latency": round(self.baseline_latency, 2) if self.baseline_latency is not None else None,
+            "total_requests": self.total_requests,
+            "rate_limited_requests": self.rate_limited_requests,
+            "overloaded_requests": self.overloaded_requests,
+            "total_delay": round(self.total_delay, 2),
+        }
+
+
+# One pacer per conversation agent, shared by every scan
+_pacers: Dict[str, AdaptivePacer] = {}
+
+
+def get_agent_pacer(agent_id: Optional[str]) -> AdaptivePacer:
+    """Get or create the pacer for a conversation agent."""
+    key = agent_id or "auto"
+    if key not in _pacers:
+        _pacers[key] = AdaptivePacer(key)
+    return _pacers[key]
+
+
+def is_rate_limited_response(response_text: str) -> bool:
+    """Check if the agent response is a rate-limit/overload error rather than an answer."""
+    if not response_text:
+        return False
+    # A JSON answer is never an error message, whatever its reasons say
+    if response_text.lstrip().startswith(("[", "{", "```")):
+        return False
+    response_lower = response_text.lower()
+    return any(keyword in response_lower for keyword in RATE_LIMIT_ERROR_KEYWORDS)
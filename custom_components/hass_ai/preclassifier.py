@@ -0,0 +1,90 @@
+"""
+HASS AI Rule-Based Pre-Classifier
+Classifies entities whose rating and category are obvious without asking the agent
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from homeassistant.core import HomeAssistant, State
+
+from .keywords import keyword_tags
+
+_LOGGER = logging.getLogger(__name__)
+
+DIAGNOSTIC_DEVICE_CLASSES = {"signal_strength"}
+
+
+def _classification(rating: int, category: list, management_type: str, confidence: float, rule: str, reason: str) -> dict:
+    return {
+        "rating": rating,
+        "category": category,
+        "management_type": management_type,
+        "confidence": confidence,
+        "rule": rule,
+        "reason": reason,
+    }
+
+
+def _get_entity_category(hass: HomeAssistant, entity_id: str) -> Optional[str]:
+    """Entity category (config/diagnostic) from the entity registry, if any."""
+    try:
+        from homeassistant.helpers import entity_registry as er
+
+        entry = er.async_get(hass).async_get(entity_id)
+    except Exception:
+        return None
+    if entry is None or entry.entity_category is None:
+        return None
+    return str(getattr(entry.entity_category, "value", entry.entity_category))
+
+
+def preclassify_entity(hass: HomeAssistant, state: State) -> Optional[dict]:
+    """Rule-based rating and category of an entity with a confidence score.
+
+    Returns None when no rule applies; the entity then needs the agent.
+    """
+    domain = state.domain
+    tags = keyword_tags(state.entity_id)
+    attributes = state.attributes
+    device_class = attributes.get("device_class")
+    unit = attributes.get("unit_of_measurement")
+
+    if domain == "sun":
+        return _classification(1, ["DATA"], "service", 0.95, "sun",
+                               "Sun position, used only as a timing reference for automations")
+
+    if domain == "update":
+        return _classification(2, ["DATA", "ALERTS"], "service", 0.95, "update",
+                               "Firmware/software update entity, useful for maintenance alerts")
+
+    if domain == "zone":
+        return _classification(1, ["DATA"], "service", 0.9, "zone",
+                               "Zone definition used by presence tracking, rarely used directly")
+
+    if domain in ("sensor", "binary_sensor"):
+        if device_class == "battery":
+            return _classification(2, ["DATA", "ALERTS"], "user", 0.95, "battery",
+                                   "Battery level sensor for device maintenance and low battery alerts")
+        if "battery" in tags and (unit == "%" or domain == "binary_sensor"):
+            return _classification(2, ["DATA", "ALERTS"], "user", 0.9, "battery",
+                                   "Battery level sensor for device maintenance and low battery alerts")
+
+        if (
+            device_class in DIAGNOSTIC_DEVICE_CLASSES
+            or unit == "dBm"
+            or "diagnostic" in tags
+        ):
+            return _classification(1, ["DATA"], "service", 0.9, "diagnostic",
+                                   "Radio/connection diagnostic value, rarely useful in automations")
+
+    entity_category = _get_entity_category(hass, state.entity_id)
+    if entity_category == "diagnostic":
+        return _classification(1, ["DATA"], "service", 0.85, "registry_diagnostic",
+                               "Marked as a diagnostic entity by its integration")
+    if entity_category == "config":
+        return _classification(1, ["CONTROL"], "service", 0.85, "registry_config",
+                               "Device configuration entity, rarely changed after setup")
+
+    return None
@@ -0,0 +1,64 @@
+"""
+HASS AI Prompt Encoding
+Compact tabular encoding of entity batches: one row per entity, repeated values coded once per prompt
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Optional, Tuple
+
+TABLE_SEPARATOR = "|"
+TABLE_HEADER = "entity_id|state|name|area"
+TABLE_MAX_STATE_LENGTH = 24
+TABLE_MAX_NAME_LENGTH = 20
+NO_AREA_CODE = "-"
+SAME_AS_ID = "-"
+
+
+def _cell(value, max_length: int) -> str:
+    text = str(value).replace(TABLE_SEPARATOR, "/").replace("\n", " ").strip()
+    return text[:max_length]
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def table_row(entity_id: str, state_value, name: Optional[str], area_name: Optional[str]) -> str:
+    """Row of an entity with its area still spelled out; encode_entity_table codes the area.
+
+    The domain is not a column: it is already the prefix of the entity_id. A name
+    that only repeats the object_id ("Kitchen Light" for light.kitchen_light) is
+    replaced by "-".
+    """
+    object_id = entity_id.split(".", 1)[-1]
+    if not name or _slug(name) == object_id:
+        name = SAME_AS_ID
+    return TABLE_SEPARATOR.join((
+        entity_id,
+        _cell(state_value, TABLE_MAX_STATE_LENGTH),
+        _cell(name, TABLE_MAX_NAME_LENGTH),
+        _cell(area_name, 40) if area_name else "",
+    ))
+
+
+def encode_entity_table(rows: List[str], numbered: bool = False) -> Tuple[str, str]:
+    """Replace the area column of table rows by codes.
+
+    Returns the area legend ("1=Kitchen, 2=Living room") and the table with
+    its header. Codes are assigned in order of first appearance. With numbered,
+    each row starts with its index, which positional answers refer to.
+    """
+    area_codes = {}
+    encoded_rows = [f"#{TABLE_SEPARATOR}{TABLE_HEADER}" if numbered else TABLE_HEADER]
+    for index, row in enumerate(rows):
+        head, _separator, area_name = row.rpartition(TABLE_SEPARATOR)
+        if area_name:
+            code = area_codes.setdefault(area_name, str(len(area_codes) + 1))
+        else:
+            code = NO_AREA_CODE
+        prefix = f"{index}{TABLE_SEPARATOR}" if numbered else ""
+        encoded_rows.append(f"{prefix}{head}{TABLE_SEPARATOR}{code}")
+
+    legend = ", ".join(f"{code}={area_name}" for area_name, code in area_codes.items())
+    return legend, "\n".join(encoded_rows)
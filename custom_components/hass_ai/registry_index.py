@@ -0,0 +1,96 @@
+"""
+HASS AI Registry Index
+Read-only snapshot of entity areas and devices, built once and dropped on registry changes
+"""
+from __future__ import annotations
+
+import logging
+from typing import Callable, Dict, Optional
+
+from homeassistant.core import HomeAssistant, Event, callback
+from homeassistant.helpers import entity_registry as er, device_registry as dr, area_registry as ar
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+REGISTRY_INDEX_KEY = f"{DOMAIN}_registry_index"  # hass.data key of the current snapshot
+
+
+class RegistryIndex:
+    """Area name and device name of every registered entity.
+
+    Built in one pass over the three registries; an entity's own area wins
+    over the area of its device, as in the area registry UI.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.entity_areas: Dict[str, str] = {}
+        self.entity_devices: Dict[str, str] = {}
+
+        try:
+            entity_registry = er.async_get(hass)
+            device_registry = dr.async_get(hass)
+            area_registry = ar.async_get(hass)
+        except Exception as e:
+            _LOGGER.warning(f"Could not access registries for area information: {e}")
+            return
+        if entity_registry is None or device_registry is None or area_registry is None:
+            return
+
+        area_names = {area.id: area.name for area in area_registry.async_list_areas()}
+        devices = {
+            device.id: (device.area_id, device.name_by_user or device.name)
+            for device in device_registry.devices.values()
+        }
+
+        for entry in entity_registry.entities.values():
+            device_area_id, device_name = devices.get(entry.device_id, (None, None))
+            area_id = entry.area_id or device_area_id
+            if area_id in area_names:
+                self.entity_areas[entry.entity_id] = area_names[area_id]
+            if device_name:
+                self.entity_devices[entry.entity_id] = device_name
+
+        _LOGGER.debug(f"Registry index built: {len(self.entity_areas)} entities with an area, {len(self.entity_devices)} with a device")
+
+    def area_name(self, entity_id: str) -> Optional[str]:
+        """Name of the entity's area, if it has one."""
+        return self.entity_areas.get(entity_id)
+
+    def device_name(self, entity_id: str) -> Optional[str]:
+        """Name of the entity's device, if it belongs to one."""
+        return self.entity_devices.get(entity_id)
+
+
+@callback
+def async_get_registry_index(hass: HomeAssistant) -> RegistryIndex:
+    """Get the current registry snapshot, building it after a registry change."""
+    index = hass.data.get(REGISTRY_INDEX_KEY)
+    if index is None:
+        index = RegistryIndex(hass)
+        hass.data[REGISTRY_INDEX_KEY] = index
+    return index
+
+
+@callback
+def async_track_registry_index(hass: HomeAssistant) -> Callable[[], None]:
+    """Drop the snapshot whenever the entity, device or area registry changes."""
+
+    @callback
+    def _invalidate(event: Event) -> None:
+        hass.data.pop(REGISTRY_INDEX_KEY, None)
+
+    unsub_listeners = [
+        hass.bus.async_listen(er.EVENT_ENTITY_REGISTRY_UPDATED, _invalidate),
+        hass.bus.async_listen(dr.EVENT_DEVICE_REGISTRY_UPDATED, _invalidate),
+        hass.bus.async_listen(ar.EVENT_AREA_REGISTRY_UPDATED, _invalidate),
+    ]
+
+    @callback
+    def _unsub() -> None:
+        for unsub in unsub_listeners:
+            unsub()
+        hass.data.pop(REGISTRY_INDEX_KEY, None)
+
+    return _unsub
@@ -0,0 +1,130 @@
+"""
+HASS AI Agent Request Scheduler
+Orders the conversation agent requests of all features by priority lane
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    AGENT_LANE_BACKGROUND,
+    AGENT_REQUEST_LANES,
+    AGENT_LANE_WEIGHTS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+AGENT_SCHEDULER_KEY = f"{DOMAIN}_agent_scheduler"  # hass.data key of the running scheduler
+
+
+class AgentRequestScheduler:
+    """Shared agent request slots, granted by priority lane with weighted fair sharing.
+
+    Waiting requests are served in AGENT_REQUEST_LANES order (alerts, interactive,
+    background), but while several lanes are waiting each lane only gets its
+    AGENT_LANE_WEIGHTS share of the grants of a round. An alert message never
+    queues behind a whole scan, and a scan still moves while alerts keep coming.
+    """
+
+    def __init__(self, max_concurrent_requests: int):
+        self.max_concurrent_requests = max(1, int(max_concurrent_requests))
+        self._in_flight = 0
+        self._waiters: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {lane: deque() for lane in AGENT_REQUEST_LANES}
+        self._credits = dict(AGENT_LANE_WEIGHTS)
+        self._lane_stats = {lane: {"in_flight": 0, "granted": 0, "max_wait": 0.0} for lane in AGENT_REQUEST_LANES}
+
+    @contextlib.asynccontextmanager
+    async def request_slot(self, lane: str = AGENT_LANE_BACKGROUND):
+        """Hold one request slot, waiting for the turn of the lane."""
+        if lane not in self._waiters:
+            lane = AGENT_LANE_BACKGROUND
+        await self._async_acquire(lane)
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    async def _async_acquire(self, lane: str) -> None:
+        queued_at = time.monotonic()
+        if self._in_flight < self.max_concurrent_requests and not self._queue_depth():
+            self._grant(lane, queued_at)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append((future, queued_at))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted right before the cancellation: hand the slot on
+                self._release(lane)
+            else:
+                self._waiters[lane] = deque(waiter for waiter in self._waiters[lane] if waiter[0] is not future)
+            raise
+
+    def _grant(self, lane: str, queued_at: float) -> None:
+        self._in_flight += 1
+        self._credits[lane] -= 1
+        stats = self._lane_stats[lane]
+        stats["in_flight"] += 1
+        stats["granted"] += 1
+        stats["max_wait"] = max(stats["max_wait"], time.monotonic() - queued_at)
+
+    def _release(self, lane: str) -> None:
+        self._in_flight -= 1
+        self._lane_stats[lane]["in_flight"] -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        """Grant free slots to the waiting requests, lane by lane."""
+        while self._in_flight < self.max_concurrent_requests:
+            waiting = [lane for lane in AGENT_REQUEST_LANES if self._waiters[lane]]
+            if not waiting:
+                return
+            ready = [lane for lane in waiting if self._credits[lane] > 0]
+            if not ready:
+                # New round: every lane gets its share again
+                self._credits = dict(AGENT_LANE_WEIGHTS)
+                ready = waiting
+
+            lane = ready[0]
+            future, queued_at = self._waiters[lane].popleft()
+            if future.done():
+                continue
+            self._grant(lane, queued_at)
+            future.set_result(None)
+
+    def _queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def get_status(self) -> dict:
+        """Return the queue depth and activity of every lane."""
+        return {
+            "max_concurrent_requests": self.max_concurrent_requests,
+            "in_flight": self._in_flight,
+            "lanes": {
+                lane: {
+                    "queued": len(self._waiters[lane]),
+                    "in_flight": stats["in_flight"],
+                    "granted": stats["granted"],
+                    "max_wait": round(stats["max_wait"], 2),
+                }
+                for lane, stats in self._lane_stats.items()
+            },
+        }
+
+
+def agent_request_slot(hass: HomeAssistant, lane: str = AGENT_LANE_BACKGROUND):
+    """Request slot of the lane, or no limit before the scheduler is set up."""
+    scheduler = hass.data.get(AGENT_SCHEDULER_KEY)
+    if scheduler is None:
+        return contextlib.nullcontext()
+    return scheduler.request_slot(lane)
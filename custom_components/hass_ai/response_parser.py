@@ -0,0 +1,145 @@
+"""
+HASS AI Response Parser
+Incremental JSON parser that extracts each complete item of an agent response
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, List, Optional
+
+from .const import POSITIONAL_CATEGORY_BITS, POSITIONAL_REASON_MAX_LENGTH
+
+_LOGGER = logging.getLogger(__name__)
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class JsonItemStreamParser:
+    """Extracts the objects of a JSON array one by one as text arrives.
+
+    Text can be fed in any number of chunks. Every object that is complete is
+    returned by feed() as soon as its closing brace arrives, so a truncated
+    answer or a broken item only loses the affected items instead of the whole
+    response. Text around the JSON (markdown fences, explanations) is ignored.
+    Items are the objects or arrays (positional rows) inside the top-level
+    array. When the answer is a bare sequence of objects instead of an array,
+    each top-level object is an item.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._base_depth: Optional[int] = None  # 1 inside a top-level array, 0 for bare objects
+        self._item_start: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+        self.items_parsed = 0
+        self.items_malformed = 0
+        self.array_closed = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add text and return the items completed by it."""
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+
+        while self._position < len(buffer):
+            char = buffer[self._position]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in "[{":
+                if self._base_depth is None:
+                    self._base_depth = 1 if char == "[" else 0
+                if self._depth == self._base_depth and (char == "{" or self._base_depth == 1):
+                    self._item_start = self._position
+                self._depth += 1
+            elif char in "]}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == self._base_depth and self._item_start is not None:
+                    item = self._parse_item(buffer[self._item_start:self._position + 1])
+                    self._item_start = None
+                    if item is not None:
+                        items.append(item)
+                elif char == "]" and self._depth == 0 and self._base_depth == 1:
+                    self.array_closed = True
+
+            self._position += 1
+
+        # Drop text that can no longer be part of an item
+        keep_from = self._item_start if self._item_start is not None else self._position
+        self._buffer = buffer[keep_from:]
+        self._position -= keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+
+        return items
+
+    @property
+    def truncated(self) -> bool:
+        """True when the text ended in the middle of the JSON."""
+        return self._base_depth is not None and self._depth > 0
+
+    def _parse_item(self, text: str) -> Optional[Any]:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            # Most common LLM slip: trailing commas
+            try:
+                item = json.loads(_TRAILING_COMMA.sub(r"\1", text))
+            except json.JSONDecodeError as e:
+                self.items_malformed += 1
+                _LOGGER.debug(f"Skipping malformed response item ({e}): {text[:200]}")
+                return None
+        self.items_parsed += 1
+        return item
+
+
+def decode_positional_item(item: Any, entity_ids: List[str]) -> Optional[dict]:
+    """Map a positional row [index, rating, category bits, "U"/"S", reason] to a result item.
+
+    The index refers to the row number of the entity in the prompt. Returns the
+    same dict a keyed answer would have, or None when the row is unusable.
+    """
+    if not isinstance(item, list) or len(item) < 2:
+        return None
+    try:
+        index = int(item[0])
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= index < len(entity_ids):
+        return None
+
+    try:
+        category_bits = int(item[2]) if len(item) > 2 else 0
+    except (TypeError, ValueError):
+        category_bits = 0
+    categories = [category for category, bit in POSITIONAL_CATEGORY_BITS.items() if category_bits & bit]
+    management = str(item[3]).strip().upper()[:1] if len(item) > 3 else "U"
+    reason = str(item[4]).strip() if len(item) > 4 else ""
+
+    return {
+        "entity_id": entity_ids[index],
+        "rating": item[1],
+        "reason": reason[:POSITIONAL_REASON_MAX_LENGTH],
+        "category": categories or ["DATA"],
+        "management_type": "service" if management == "S" else "user",
+    }
+
+
+def parse_json_items(text: str) -> tuple[List[Any], JsonItemStreamParser]:
+    """Parse every recoverable item of a complete response text."""
+    parser = JsonItemStreamParser()
+    items = parser.feed(text)
+    return items, parser
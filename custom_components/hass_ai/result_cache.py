@@ -0,0 +1,166 @@
+"""
+HASS AI Result Cache
+Content-addressed cache of AI analysis results keyed by an entity fingerprint
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers import storage
+
+from .const import (
+    DOMAIN,
+    RESULT_CACHE_TTL_DAYS,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_SAVE_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+RESULT_CACHE_KEY = f"{DOMAIN}_result_cache"  # Storage key and hass.data key of the loaded cache
+
+
+def entity_fingerprint(state: State, area: str, language: str, prompt_version: str) -> str:
+    """Fingerprint of everything that identifies an entity for the AI analysis.
+
+    The live state value is deliberately not part of it: a temperature changing
+    from 20.5 to 21 does not change what the entity is.
+    """
+    attributes = state.attributes
+    identity = [
+        state.entity_id,
+        state.domain,
+        attributes.get("device_class") or "",
+        attributes.get("unit_of_measurement") or "",
+        attributes.get("friendly_name") or "",
+        area or "",
+        "it" if language.startswith("it") else "en",
+        prompt_version,
+    ]
+    return hashlib.sha1(json.dumps(identity, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Persistent AI result cache with TTL and size based eviction"""
+
+    def __init__(self, hass: HomeAssistant, prompt_version: str):
+        self.hass = hass
+        self.prompt_version = prompt_version
+        self._store = storage.Store(hass, STORAGE_VERSION, RESULT_CACHE_KEY)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def async_load(self) -> None:
+        """Load cached results, dropping entries made with other prompt templates."""
+        try:
+            data = await self._store.async_load() or {}
+        except Exception as e:
+            _LOGGER.warning(f"Could not load AI result cache: {e}")
+            data = {}
+
+        if data.get("prompt_version") != self.prompt_version:
+            if data.get("entries"):
+                _LOGGER.info(f"🧹 Prompt templates changed, invalidating {len(data['entries'])} cached AI results")
+            self._entries = {}
+        else:
+            self._entries = data.get("entries", {})
+
+        removed = self._evict()
+        _LOGGER.info(f"📂 Loaded AI result cache: {len(self._entries)} entries ({removed} expired)")
+
+    def get(self, fingerprint: str) -> Optional[dict]:
+        """Return a copy of the cached result for a fingerprint, if fresh."""
+        entry = self._entries.get(fingerprint)
+        if entry is None or self._is_expired(entry):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry["last_hit"] = time.time()
+        return dict(entry["result"])
+
+    def put(self, fingerprint: str, result: dict) -> None:
+        """Store an AI result under its entity fingerprint."""
+        now = time.time()
+        self._entries[fingerprint] = {
+            "entity_id": result.get("entity_id"),
+            "stored_at": now,
+            "last_hit": now,
+            "result": dict(result),
+        }
+
+    def update_entity(self, entity_id: str, fields: dict) -> int:
+        """Update fields of every cached result of an entity (e.g. thresholds generated later)."""
+        updated = 0
+        for entry in self._entries.values():
+            if entry.get("entity_id") == entity_id:
+                entry["result"].update(fields)
+                updated += 1
+        return updated
+
+    def invalidate_entity(self, entity_id: str) -> int:
+        """Remove every cached result of an entity."""
+        stale = [key for key, entry in self._entries.items() if entry.get("entity_id") == entity_id]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def async_schedule_save(self) -> None:
+        """Evict old entries and save the cache after a short delay."""
+        self._evict()
+        self._store.async_delay_save(self._data_to_save, RESULT_CACHE_SAVE_DELAY)
+
+    def get_stats(self) -> dict:
+        """Return cache statistics."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "prompt_version": self.prompt_version,
+        }
+
+    def _data_to_save(self) -> dict:
+        return {
+            "prompt_version": self.prompt_version,
+            "entries": self._entries,
+        }
+
+    def _is_expired(self, entry: dict) -> bool:
+        return time.time() - entry.get("stored_at", 0) > RESULT_CACHE_TTL_DAYS * 86400
+
+    def _evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above the size limit."""
+        expired = [key for key, entry in self._entries.items() if self._is_expired(entry)]
+        for key in expired:
+            del self._entries[key]
+
+        overflow = len(self._entries) - RESULT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            least_recent = sorted(self._entries, key=lambda key: self._entries[key].get("last_hit", 0))[:overflow]
+            for key in least_recent:
+                del self._entries[key]
+
+        return len(expired) + max(0, overflow)
+
+
+async def async_get_result_cache(hass: HomeAssistant, prompt_version: str) -> ResultCache:
+    """Get the loaded result cache, (re)loading it when the prompt version changes."""
+    cache = hass.data.get(RESULT_CACHE_KEY)
+    if cache is None or cache.prompt_version != prompt_version:
+        cache = ResultCache(hass, prompt_version)
+        await cache.async_load()
+        hass.data[RESULT_CACHE_KEY] = cache
+    return cache
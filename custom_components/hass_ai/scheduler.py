@@ -0,0 +1,229 @@
+"""
+HASS AI Background Scan Scheduler
+Keeps AI results current by rescanning stale entities a little at a time
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, State, callback
+from homeassistant.util import dt
+
+from .const import (
+    DOMAIN,
+    AI_PROVIDER_LOCAL,
+    CONF_CONVERSATION_AGENT,
+    CONF_PROMPT_TOKEN_BUDGET,
+    CONF_BACKGROUND_SCAN,
+    CONF_BACKGROUND_TIME_BUDGET,
+    CONF_BACKGROUND_TOKEN_BUDGET,
+    CONF_QUIET_HOURS_START,
+    CONF_QUIET_HOURS_END,
+    CONF_SCAN_MODE,
+    CONF_GROUP_SIMILAR,
+    CONF_PROMPT_FORMAT,
+    DEFAULT_PROMPT_FORMAT,
+    CONF_RESPONSE_FORMAT,
+    DEFAULT_RESPONSE_FORMAT,
+    DEFAULT_SCAN_MODE,
+    SCAN_MODE_HYBRID,
+    DEFAULT_PROMPT_TOKEN_BUDGET,
+    DEFAULT_BACKGROUND_TIME_BUDGET,
+    DEFAULT_BACKGROUND_TOKEN_BUDGET,
+    BACKGROUND_SCAN_CHUNK_SIZE,
+    EXCLUDED_SCAN_DOMAINS,
+    INVALID_STATES,
+)
+from .exceptions import AgentUnavailableError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BackgroundScanScheduler:
+    """Rescans the stalest, most important entities within a per-run budget"""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        load_results_data: Callable[[], Awaitable[Optional[dict]]],
+        store_results: Callable[[list], Awaitable[None]],
+        interactive_active: Callable[[], bool],
+    ):
+        self.hass = hass
+        self.entry = entry
+        self._load_results_data = load_results_data
+        self._store_results = store_results
+        self._interactive_active = interactive_active
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: dict = {}
+
+    @callback
+    def async_schedule_run(self, now: datetime = None) -> None:
+        """Start a background run unless one is still in progress."""
+        if self._task and not self._task.done():
+            _LOGGER.debug("Background scan still running, skipping this tick")
+            return
+        self._task = self.hass.async_create_task(self.async_run(now))
+
+    async def async_unload(self) -> None:
+        """Cancel a background run in progress."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def async_run(self, now: datetime = None) -> None:
+        """Rescan stale entities until the run's time or token budget is used up."""
+        options = self.entry.options
+        if not options.get(CONF_BACKGROUND_SCAN, True):
+            return
+
+        now = now or dt.now()
+        if self._in_quiet_hours(now, options.get(CONF_QUIET_HOURS_START), options.get(CONF_QUIET_HOURS_END)):
+            _LOGGER.debug("🌙 Quiet hours, skipping background scan")
+            return
+
+        if self._interactive_active():
+            _LOGGER.debug("Interactive operation in progress, skipping background scan")
+            return
+
+        results_data = await self._load_results_data()
+        if not results_data or not results_data.get("results"):
+            # Nothing to keep current until the user has run a first scan
+            return
+
+        queue = self._select_stale_states(results_data)
+        if not queue:
+            _LOGGER.debug("No stale entities to rescan")
+            return
+
+        from .intelligence import get_entities_importance_batched, _estimate_batch_tokens
+
+        time_budget = options.get(CONF_BACKGROUND_TIME_BUDGET, DEFAULT_BACKGROUND_TIME_BUDGET) * 60
+        token_budget = options.get(CONF_BACKGROUND_TOKEN_BUDGET, DEFAULT_BACKGROUND_TOKEN_BUDGET)
+        prompt_token_budget = options.get(CONF_PROMPT_TOKEN_BUDGET, DEFAULT_PROMPT_TOKEN_BUDGET)
+        conversation_agent = self.entry.data.get(CONF_CONVERSATION_AGENT, "auto")
+        language = self.hass.config.language or "en"
+        preclassify = options.get(CONF_SCAN_MODE, DEFAULT_SCAN_MODE) == SCAN_MODE_HYBRID
+        group_similar = options.get(CONF_GROUP_SIMILAR, False)
+        prompt_format = options.get(CONF_PROMPT_FORMAT, DEFAULT_PROMPT_FORMAT)
+        response_format = options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT)
+
+        deadline = time.monotonic() + time_budget
+        tokens_used = 0
+        rescanned = 0
+        stop_reason = "done"
+
+        def should_stop() -> bool:
+            return self._interactive_active() or time.monotonic() >= deadline
+
+        _LOGGER.info(f"🕰️ Background scan: {len(queue)} stale entities, budget {time_budget // 60} min / {token_budget} tokens")
+
+        for start in range(0, len(queue), BACKGROUND_SCAN_CHUNK_SIZE):
+            if self._interactive_active():
+                stop_reason = "interactive_scan"
+                break
+            if time.monotonic() >= deadline:
+                stop_reason = "time_budget"
+                break
+
+            chunk = queue[start:start + BACKGROUND_SCAN_CHUNK_SIZE]
+            chunk_tokens = _estimate_batch_tokens(self.hass, chunk, language, prompt_format=prompt_format, response_format=response_format)
+            if tokens_used + chunk_tokens > token_budget:
+                stop_reason = "token_budget"
+                break
+
+            try:
+                results = await get_entities_importance_batched(
+                    self.hass, chunk, BACKGROUND_SCAN_CHUNK_SIZE, AI_PROVIDER_LOCAL, None, None, None,
+                    conversation_agent, language,
+                    analysis_type="importance",
+                    cancellation_check=should_stop,
+                    max_concurrent_batches=1,
+                    token_budget=prompt_token_budget,
+                    use_cache=False,
+                    preclassify=preclassify,
+                    group_similar=group_similar,
+                    prompt_format=prompt_format,
+                    response_format=response_format,
+                )
+            except AgentUnavailableError as e:
+                # The stale entities stay stale and are picked up by the next run
+                _LOGGER.warning(f"🔌 Background scan stopped, agent unavailable: {e}")
+                stop_reason = "agent_unavailable"
+                break
+            tokens_used += chunk_tokens
+
+            fresh = [result for result in results if result.get("analysis_method") in ("ai_conversation", "rule_based")]
+            if fresh:
+                await self._store_results(fresh)
+                rescanned += len(fresh)
+
+        self.last_run = {
+            "timestamp": dt.utcnow().isoformat(),
+            "stale_entities": len(queue),
+            "rescanned_entities": rescanned,
+            "estimated_tokens": tokens_used,
+            "stop_reason": stop_reason,
+        }
+        _LOGGER.info(f"🕰️ Background scan finished: {rescanned}/{len(queue)} entities rescanned, ~{tokens_used} tokens, stop reason: {stop_reason}")
+
+    def _select_stale_states(self, results_data: dict) -> list[State]:
+        """Entities older than the scan interval, stalest and most important first."""
+        stored = results_data.get("results", {})
+        scan_interval_days = self.entry.options.get("scan_interval") or self.entry.data.get("scan_interval", 7)
+        stale_after = timedelta(days=scan_interval_days).total_seconds()
+        scan_time = _parse_timestamp(results_data.get("last_scan_timestamp"))
+        now = dt.utcnow()
+
+        candidates = []
+        for state in self.hass.states.async_all():
+            if state.domain == DOMAIN or state.domain in EXCLUDED_SCAN_DOMAINS:
+                continue
+            if state.state is None or str(state.state).lower() in INVALID_STATES:
+                continue
+
+            result = stored.get(state.entity_id)
+            if result is None:
+                # Never analyzed: stalest of all
+                candidates.append((float("inf"), 0, state))
+                continue
+
+            analyzed_at = _parse_timestamp(result.get("analyzed_at")) or scan_time
+            age = (now - analyzed_at).total_seconds() if analyzed_at else float("inf")
+            if age < stale_after:
+                continue
+            # Whole days of staleness, so that weight orders entities of similar age
+            candidates.append((age // 86400, result.get("overall_weight", 0), state))
+
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[1]), reverse=True)
+        return [state for _age, _weight, state in candidates]
+
+    @staticmethod
+    def _in_quiet_hours(now: datetime, start: Optional[int], end: Optional[int]) -> bool:
+        """Check if now is inside the quiet-hours window (which may wrap midnight)."""
+        if start is None or end is None or start == end:
+            return False
+        if start < end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    def get_status(self) -> dict:
+        """Return the background scheduler status."""
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "last_run": self.last_run,
+        }
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = dt.parse_datetime(value)
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.UTC)
+    return parsed
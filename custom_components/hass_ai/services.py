@@ -9,7 +9,21 @@ from homeassistant.core import HomeAssistant, ServiceCall
 from homeassistant.helpers import config_validation as cv
 from homeassistant.exceptions import ServiceValidationError
 
-from .const import DOMAIN, CONF_CONVERSATION_AGENT
+from .const import (
+    DOMAIN,
+    CONF_CONVERSATION_AGENT,
+    CONF_MAX_CONCURRENT_BATCHES,
+    CONF_SCAN_MODE,
+    CONF_GROUP_SIMILAR,
+    CONF_PROMPT_FORMAT,
+    DEFAULT_PROMPT_FORMAT,
+    CONF_RESPONSE_FORMAT,
+    DEFAULT_RESPONSE_FORMAT,
+    DEFAULT_MAX_CONCURRENT_BATCHES,
+    DEFAULT_SCAN_MODE,
+    SCAN_MODE_HYBRID,
+    AGENT_LANE_INTERACTIVE,
+)
 from .intelligence import get_entities_importance_batched
 
 _LOGGER = logging.getLogger(__name__)
@@ -75,11 +89,23 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             # Get config entry to access conversation agent setting
             config_entries = hass.config_entries.async_entries(DOMAIN)
             conversation_agent = "auto"
+            max_concurrent_batches = DEFAULT_MAX_CONCURRENT_BATCHES
+            scan_mode = DEFAULT_SCAN_MODE
+            group_similar = False
+            prompt_format = DEFAULT_PROMPT_FORMAT
+            response_format = DEFAULT_RESPONSE_FORMAT
             if config_entries:
                 conversation_agent = config_entries[0].data.get(CONF_CONVERSATION_AGENT, "auto")
+                max_concurrent_batches = config_entries[0].options.get(CONF_MAX_CONCURRENT_BATCHES, DEFAULT_MAX_CONCURRENT_BATCHES)
+                scan_mode = config_entries[0].options.get(CONF_SCAN_MODE, DEFAULT_SCAN_MODE)
+                group_similar = config_entries[0].options.get(CONF_GROUP_SIMILAR, False)
+                prompt_format = config_entries[0].options.get(CONF_PROMPT_FORMAT, DEFAULT_PROMPT_FORMAT)
+                response_format = config_entries[0].options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT)
             
             results = await get_entities_importance_batched(
-                hass, filtered_states, batch_size, ai_provider, api_key, None, None, conversation_agent
+                hass, filtered_states, batch_size, ai_provider, api_key, None, None, conversation_agent,
+                max_concurrent_batches=max_concurrent_batches, preclassify=scan_mode == SCAN_MODE_HYBRID,
+                group_similar=group_similar, prompt_format=prompt_format, response_format=response_format
             )
             
             _LOGGER.info(f"Entity scan completed: {len(results)} entities analyzed using {ai_provider}")
@@ -108,7 +134,9 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             if config_entries:
                 conversation_agent = config_entries[0].data.get(CONF_CONVERSATION_AGENT, "auto")
             
-            results = await get_entities_importance_batched(hass, [state], 1, None, None, None, None, conversation_agent)
+            results = await get_entities_importance_batched(
+                hass, [state], 1, None, None, None, None, conversation_agent, request_lane=AGENT_LANE_INTERACTIVE
+            )
             
             if results:
                 importance_data = results[0]
@@ -0,0 +1,187 @@
+"""
+HASS AI Threshold Work Queue
+Generates alert thresholds for scan results in the background, persisted across restarts
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import storage
+from homeassistant.util import dt
+
+from .const import (
+    DOMAIN,
+    CONF_CONVERSATION_AGENT,
+    INVALID_STATES,
+    THRESHOLD_BATCH_MAX_ENTITIES,
+    THRESHOLD_QUEUE_CONCURRENCY,
+    THRESHOLD_QUEUE_MIN_INTERVAL,
+    THRESHOLD_QUEUE_IDLE_DELAY,
+    THRESHOLD_QUEUE_SAVE_DELAY,
+    EVENT_THRESHOLDS_UPDATED,
+    AGENT_UNAVAILABLE_RETRY_DELAY,
+)
+from .exceptions import AgentUnavailableError
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+THRESHOLD_QUEUE_KEY = f"{DOMAIN}_threshold_queue"  # Storage key and hass.data key of the running queue
+
+
+class ThresholdWorkQueue:
+    """Entities waiting for AI thresholds, drained by a background worker.
+
+    Scans enqueue the entities that warrant thresholds and return without
+    waiting for them. The worker sends up to THRESHOLD_BATCH_MAX_ENTITIES
+    entities per request, with at most THRESHOLD_QUEUE_CONCURRENCY requests in
+    flight and THRESHOLD_QUEUE_MIN_INTERVAL seconds between request starts, and
+    pauses while an interactive operation is running. While the agent is
+    unavailable the entities stay queued and the worker waits for its circuit
+    breaker to allow a new request.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        store_thresholds: Callable[[dict], Awaitable[None]],
+        interactive_active: Callable[[], bool],
+    ):
+        self.hass = hass
+        self.entry = entry
+        self._store_thresholds = store_thresholds
+        self._interactive_active = interactive_active
+        self._store = storage.Store(hass, STORAGE_VERSION, THRESHOLD_QUEUE_KEY)
+        self.pending: Dict[str, str] = {}  # entity_id -> enqueue timestamp, in queue order
+        self._in_flight: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_request = 0.0
+        self._paused_until = 0.0
+        self.generated_count = 0
+        self.request_count = 0
+
+    async def async_load(self) -> None:
+        """Load the entities left in the queue and resume draining it."""
+        try:
+            data = await self._store.async_load() or {}
+        except Exception as e:
+            _LOGGER.warning(f"Could not load the threshold queue: {e}")
+            data = {}
+        self.pending = data.get("pending", {})
+        if self.pending:
+            _LOGGER.info(f"🧮 Resuming threshold generation for {len(self.pending)} queued entities")
+            self._async_start()
+
+    async def async_unload(self) -> None:
+        """Stop the worker; queued entities are kept for the next start."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def async_enqueue(self, entity_ids: Iterable[str]) -> int:
+        """Queue entities for threshold generation and wake the worker."""
+        enqueued_at = dt.utcnow().isoformat()
+        added = 0
+        for entity_id in entity_ids:
+            self.pending[entity_id] = enqueued_at
+            added += 1
+        if added:
+            _LOGGER.debug(f"🧮 Queued {added} entities for threshold generation ({len(self.pending)} pending)")
+            self._store.async_delay_save(self._data_to_save, THRESHOLD_QUEUE_SAVE_DELAY)
+            self._async_start()
+        return added
+
+    @callback
+    def _async_start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = self.hass.async_create_task(self._async_drain())
+
+    async def _async_drain(self) -> None:
+        """Send queued entities to the agent until the queue is empty."""
+        workers: Set[asyncio.Task] = set()
+        try:
+            while True:
+                available = [entity_id for entity_id in self.pending if entity_id not in self._in_flight]
+                if not available and not workers:
+                    break
+
+                if available and len(workers) < THRESHOLD_QUEUE_CONCURRENCY and not self._interactive_active():
+                    # Rate budget: space the request starts (longer while the agent is unavailable)
+                    wait = max(self._last_request + THRESHOLD_QUEUE_MIN_INTERVAL, self._paused_until) - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._last_request = time.monotonic()
+
+                    chunk = {entity_id: self.pending[entity_id] for entity_id in available[:THRESHOLD_BATCH_MAX_ENTITIES]}
+                    self._in_flight.update(chunk)
+                    workers.add(self.hass.async_create_task(self._async_process_chunk(chunk)))
+                    continue
+
+                if workers:
+                    _done, workers = await asyncio.wait(workers, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    # Paused: an interactive scan has priority and would overwrite the stored results
+                    await asyncio.sleep(THRESHOLD_QUEUE_IDLE_DELAY)
+        except asyncio.CancelledError:
+            for worker in workers:
+                worker.cancel()
+            raise
+        _LOGGER.info(f"🧮 Threshold queue drained: {self.generated_count} entities got thresholds in {self.request_count} requests")
+
+    async def _async_process_chunk(self, chunk: Dict[str, str]) -> None:
+        """Generate, store and publish the thresholds of one chunk of queued entities."""
+        from .intelligence import generate_auto_thresholds_batch
+
+        keep_pending = False
+        try:
+            states = []
+            for entity_id in chunk:
+                state = self.hass.states.get(entity_id)
+                if state is not None and str(state.state).lower() not in INVALID_STATES:
+                    states.append(state)
+
+            if states:
+                conversation_agent = self.entry.data.get(CONF_CONVERSATION_AGENT, "auto")
+                results = await generate_auto_thresholds_batch(self.hass, states, conversation_agent)
+                self.request_count += 1
+                updates = {entity_id: result for entity_id, result in results.items() if result.get("thresholds")}
+                if updates:
+                    await self._store_thresholds(updates)
+                    self.generated_count += len(updates)
+                    self.hass.bus.async_fire(EVENT_THRESHOLDS_UPDATED, {"thresholds": updates})
+        except AgentUnavailableError as e:
+            # Keep the entities for the agent instead of settling for rule-based thresholds
+            keep_pending = True
+            self._paused_until = time.monotonic() + max(e.retry_after, AGENT_UNAVAILABLE_RETRY_DELAY)
+            _LOGGER.warning(f"🔌 Agent unavailable, {len(chunk)} queued entities wait {self._paused_until - time.monotonic():.0f}s: {e}")
+        except Exception as e:
+            _LOGGER.warning(f"❌ Threshold generation failed for {len(chunk)} queued entities: {e}")
+        finally:
+            for entity_id, enqueued_at in chunk.items():
+                self._in_flight.discard(entity_id)
+                # Keep entities that were queued again while their request was in flight
+                if not keep_pending and self.pending.get(entity_id) == enqueued_at:
+                    del self.pending[entity_id]
+            self._store.async_delay_save(self._data_to_save, THRESHOLD_QUEUE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"pending": self.pending}
+
+    def get_status(self) -> dict:
+        """Return the threshold queue status."""
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "pending": len(self.pending),
+            "in_flight": len(self._in_flight),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "generated": self.generated_count,
+            "requests": self.request_count,
+        }
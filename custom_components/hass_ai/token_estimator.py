@@ -0,0 +1,241 @@
+"""
+HASS AI Token Estimation
+Pluggable prompt token estimators: calibrated heuristic or a local BPE tokenizer
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Optional
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    CONTEXT_LENGTH_ERROR_KEYWORDS,
+    TOKEN_ESTIMATE_CACHE_SIZE,
+    TOKEN_CALIBRATION_SMOOTHING,
+    TOKEN_CALIBRATION_MIN,
+    TOKEN_CALIBRATION_MAX,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# One match per run of characters of the same class
+_TOKEN_PIECES = re.compile(
+    r"(?P<ascii_word>[A-Za-z]+)"
+    r"|(?P<word>[^\W\d_]+)"                                 # Words with accented/non-Latin letters
+    r"|(?P<number>\d+)"
+    r"|(?P<newline>\n+)"
+    r"|(?P<space>[^\S\n]+)"
+    r"|(?P<punctuation>(?:[^\w\s\u2000-\U0010FFFF]|_)+)"
+    r"|(?P<symbol>.)",                                        # Emoji and other pictographs
+    re.UNICODE | re.DOTALL,
+)
+
+# Request sizes reported in context-length errors of common backends
+_ACTUAL_TOKENS_PATTERNS = [
+    re.compile(r"(\d+) in the messages", re.IGNORECASE),                    # OpenAI (prompt part)
+    re.compile(r"resulted in (\d+) tokens", re.IGNORECASE),                 # OpenAI
+    re.compile(r"requested (\d+) tokens", re.IGNORECASE),                   # OpenAI (newer)
+    re.compile(r"n_prompt_tokens\s*[=:]\s*(\d+)", re.IGNORECASE),           # llama.cpp
+    re.compile(r"prompt is too long:\s*(\d+) tokens", re.IGNORECASE),       # Anthropic
+]
+
+
+class TokenEstimator:
+    """Interface of a token estimator."""
+
+    name = "base"
+
+    def estimate(self, text: str) -> int:
+        """Estimated number of tokens of text."""
+        raise NotImplementedError
+
+    def estimate_line(self, text: str) -> int:
+        """Estimated number of tokens of a short line that repeats across batches (may be cached)."""
+        return self.estimate(text)
+
+    def observe(self, text: str, actual_tokens: int) -> None:
+        """Learn from an exact token count reported for text (optional)."""
+
+    def get_state(self) -> dict:
+        """Learned state to persist between restarts (optional)."""
+        return {}
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the state returned by get_state (optional)."""
+
+    def get_stats(self) -> dict:
+        return {"estimator": self.name}
+
+
+class HeuristicTokenEstimator(TokenEstimator):
+    """Character-class heuristic calibrated on BPE tokenizers, self-correcting from reported usage.
+
+    Common English words cost one token, accented/Italian words and numbers
+    about one per 3 characters, JSON punctuation one per 2 characters, each
+    newline run one token and each emoji two.
+    """
+
+    name = "heuristic"
+
+    def __init__(self):
+        self.calibration = 1.0
+        self.observations = 0
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        return max(1, round(_raw_heuristic_tokens(text) * self.calibration))
+
+    def estimate_line(self, text: str) -> int:
+        if not text:
+            return 0
+        return max(1, round(_raw_line_tokens(text) * self.calibration))
+
+    def observe(self, text: str, actual_tokens: int) -> None:
+        raw = _raw_heuristic_tokens(text)
+        if raw <= 0 or actual_tokens <= 0:
+            return
+        ratio = actual_tokens / raw
+        if not TOKEN_CALIBRATION_MIN <= ratio <= TOKEN_CALIBRATION_MAX:
+            # Mostly the agent's own system prompt, not an estimation error
+            _LOGGER.debug(f"Ignoring token count {actual_tokens} for a {raw}-token estimate")
+            return
+        if self.observations == 0:
+            self.calibration = ratio
+        else:
+            self.calibration += (ratio - self.calibration) * TOKEN_CALIBRATION_SMOOTHING
+        self.observations += 1
+        _LOGGER.info(f"🎯 Token estimator calibrated: {actual_tokens} actual vs {raw} estimated, factor now {self.calibration:.2f}")
+
+    def get_state(self) -> dict:
+        return {"calibration": self.calibration, "observations": self.observations}
+
+    def restore_state(self, state: dict) -> None:
+        calibration = state.get("calibration")
+        if isinstance(calibration, (int, float)) and TOKEN_CALIBRATION_MIN <= calibration <= TOKEN_CALIBRATION_MAX:
+            self.calibration = float(calibration)
+            self.observations = int(state.get("observations") or 0)
+
+    def get_stats(self) -> dict:
+        return {
+            "estimator": self.name,
+            "calibration": round(self.calibration, 3),
+            "observations": self.observations,
+        }
+
+
+class BpeTokenEstimator(TokenEstimator):
+    """Exact counts from a local BPE tokenizer (tiktoken)."""
+
+    name = "bpe"
+
+    def __init__(self, encoding):
+        self._encoding = encoding
+        self._count_line = lru_cache(maxsize=TOKEN_ESTIMATE_CACHE_SIZE)(self._encode_count)
+
+    def _encode_count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._encode_count(text)
+
+    def estimate_line(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._count_line(text)
+
+    def get_stats(self) -> dict:
+        return {"estimator": self.name, "encoding": getattr(self._encoding, "name", None)}
+
+
+def _raw_heuristic_tokens(text: str) -> int:
+    """Uncalibrated heuristic count of text."""
+    tokens = 0
+    for match in _TOKEN_PIECES.finditer(text):
+        kind = match.lastgroup
+        length = match.end() - match.start()
+        if kind == "ascii_word":
+            # Common English words are a single token, long ones two or three
+            tokens += max(1, round(length / 6))
+        elif kind in ("word", "number"):
+            tokens += math.ceil(length / 3)
+        elif kind == "punctuation":
+            # JSON punctuation pairs such as ", and {" usually merge into one token
+            tokens += math.ceil(length / 2)
+        elif kind == "newline":
+            tokens += 1
+        elif kind == "symbol":
+            tokens += 2
+        # Single spaces are merged into the following word by BPE tokenizers
+    return tokens
+
+
+# Only entity lines are cached: they repeat across batches and scans, whole prompts never do
+_raw_line_tokens = lru_cache(maxsize=TOKEN_ESTIMATE_CACHE_SIZE)(_raw_heuristic_tokens)
+
+
+_estimator: TokenEstimator = HeuristicTokenEstimator()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """The active token estimator."""
+    return _estimator
+
+
+def set_token_estimator(estimator: TokenEstimator) -> None:
+    """Plug in another token estimator."""
+    global _estimator
+    _estimator = estimator
+    _LOGGER.info(f"🔢 Using {estimator.name} token estimator")
+
+
+async def async_setup_token_estimator(hass: HomeAssistant) -> None:
+    """Use a local BPE tokenizer when tiktoken is installed, otherwise keep the heuristic."""
+    if isinstance(_estimator, BpeTokenEstimator):
+        return
+    try:
+        # Importing tiktoken and loading the encoding read (and may download) files: keep it off the event loop
+        encoding = await hass.async_add_executor_job(_load_bpe_encoding)
+    except Exception as e:
+        _LOGGER.warning(f"Could not load the BPE tokenizer, using the heuristic token estimator: {e}")
+        return
+    if encoding is None:
+        _LOGGER.debug("tiktoken not installed, using the heuristic token estimator")
+        return
+    set_token_estimator(BpeTokenEstimator(encoding))
+
+
+def _load_bpe_encoding():
+    """Load the cl100k_base encoding, or None when tiktoken is not installed (runs in the executor)."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def extract_actual_tokens(error_text: str) -> Optional[int]:
+    """Exact request size reported in a context-length error message, if any."""
+    if not error_text:
+        return None
+    for pattern in _ACTUAL_TOKENS_PATTERNS:
+        match = pattern.search(error_text)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def is_context_length_error(error_text: str) -> bool:
+    """Whether an error message reports a request larger than the agent's context."""
+    if not error_text:
+        return False
+    if extract_actual_tokens(error_text) is not None:
+        return True
+    error_lower = error_text.lower()
+    return any(keyword in error_lower for keyword in CONTEXT_LENGTH_ERROR_KEYWORDS)
@@ -102,6 +102,24 @@ class HassAiPanel extends LitElement {
           this._handleMonitoringSignal(event.data);
         }
       }, 'hass_ai_monitoring_signal');
+
+      // Thresholds generated in the background after a scan
+      this.hass.connection.subscribeEvents((event) => {
+        this._handleThresholdsUpdated(event.data);
+      }, 'hass_ai_thresholds_updated');
+    }
+  }
+
+  _handleThresholdsUpdated(data) {
+    let updated = false;
+    Object.entries(data?.thresholds || {}).forEach(([entityId, autoThresholds]) => {
+      if (this.entities[entityId]) {
+        this.entities[entityId] = { ...this.entities[entityId], auto_thresholds: autoThresholds };
+        updated = true;
+      }
+    });
+    if (updated) {
+      this.requestUpdate("entities");
     }
   }
 
@@ -2085,6 +2103,15 @@ Nothing dramatic, but worth checking when you have a minute! 😉`;
         'info'
       );
     }
+    if (message.type === "agent_unavailable") {
+      // The agent did not answer: the batch waits for it instead of being padded with fallbacks
+      this._showSimpleNotification(
+        isItalian ?
+          `🔌 Agente non disponibile da ${Math.round(message.data.unavailable_for)}s, nuovo tentativo tra ${Math.round(message.data.retry_after)}s` :
+          `🔌 Agent unavailable for ${Math.round(message.data.unavailable_for)}s, retrying in ${Math.round(message.data.retry_after)}s`,
+        'warning'
+      );
+    }
     if (message.type === "token_limit_exceeded") {
       this.loading = false;
       this.scanProgress = {
@@ -0,0 +1 @@
+"""Tests for the HASS AI integration."""
@@ -0,0 +1,16 @@
+"""Shared fixtures for the HASS AI tests.
+
+The suite runs against a real Home Assistant core through
+pytest-homeassistant-custom-component, which provides the ``hass`` and
+``hass_storage`` fixtures used here:
+
+    pip install -r requirements_test.txt
+    pytest
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Let Home Assistant load the integration from custom_components."""
+    yield
@@ -0,0 +1,133 @@
+"""Tests for the conversation agent pool."""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.hass_ai import circuit_breaker
+from custom_components.hass_ai.agent_pool import AGENT_POOL_KEY, AgentPool, agent_lease
+from custom_components.hass_ai.capacity import async_get_capacity_model
+from custom_components.hass_ai.const import AGENT_CIRCUIT_FAILURE_THRESHOLD
+from custom_components.hass_ai.exceptions import AgentCircuitOpenError
+
+FAST = "conversation.fast"
+SLOW = "conversation.slow"
+
+
+@pytest.fixture(autouse=True)
+def breakers():
+    """Every test starts with closed circuits."""
+    with patch.dict(circuit_breaker._breakers, clear=True):
+        yield
+
+
+def _open_circuit(agent_id: str) -> None:
+    breaker = circuit_breaker.get_agent_circuit_breaker(agent_id)
+    for _ in range(AGENT_CIRCUIT_FAILURE_THRESHOLD):
+        breaker.allow_request()
+        breaker.record_failure()
+
+
+async def test_leases_stay_within_the_per_agent_limit():
+    pool = AgentPool([FAST, SLOW, FAST], 2)
+    in_flight = {FAST: 0, SLOW: 0}
+    max_in_flight = {FAST: 0, SLOW: 0}
+
+    async def _request() -> None:
+        async with pool.async_lease() as lease:
+            agent_id = lease["agent_id"]
+            in_flight[agent_id] += 1
+            max_in_flight[agent_id] = max(max_in_flight[agent_id], in_flight[agent_id])
+            await asyncio.sleep(0.01)
+            in_flight[agent_id] -= 1
+            lease["success"] = True
+
+    await asyncio.gather(*(_request() for _ in range(12)))
+
+    assert pool.agent_ids == [FAST, SLOW]
+    assert pool.capacity == 4
+    assert max(max_in_flight.values()) <= 2
+    status = pool.get_status()["agents"]
+    assert status[FAST]["requests"] + status[SLOW]["requests"] == 12
+    assert status[FAST]["in_flight"] == status[SLOW]["in_flight"] == 0
+
+
+async def test_lease_limited_to_candidates():
+    pool = AgentPool([FAST, SLOW], 1)
+
+    for _ in range(5):
+        async with pool.async_lease([SLOW]) as lease:
+            assert lease["agent_id"] == SLOW
+    # Unknown candidates fall back to the whole pool
+    async with pool.async_lease(["conversation.unknown"]) as lease:
+        assert lease["agent_id"] in (FAST, SLOW)
+
+
+async def test_waiter_gets_the_slot_of_its_own_candidate():
+    pool = AgentPool([FAST, SLOW], 1)
+    slow_lease = pool.async_lease([SLOW])
+    await slow_lease.__aenter__()
+
+    waiting_lease = pool.async_lease([SLOW])
+    waiting_for_slow = asyncio.create_task(waiting_lease.__aenter__())
+    await asyncio.sleep(0)
+    # A slot of the other agent does not help the waiter
+    async with pool.async_lease([FAST]) as lease:
+        assert lease["agent_id"] == FAST
+    await asyncio.sleep(0)
+    assert not waiting_for_slow.done()
+
+    await slow_lease.__aexit__(None, None, None)
+    lease = await asyncio.wait_for(waiting_for_slow, timeout=1)
+    assert lease["agent_id"] == SLOW
+    await waiting_lease.__aexit__(None, None, None)
+
+
+async def test_failed_request_counts_against_the_agent():
+    pool = AgentPool([FAST], 1)
+
+    with pytest.raises(RuntimeError):
+        async with pool.async_lease():
+            raise RuntimeError("Agent error")
+    # Cancelled or unjudged requests say nothing about the agent
+    async with pool.async_lease():
+        pass
+
+    status = pool.get_status()["agents"][FAST]
+    assert status["requests"] == 1
+    assert status["failures"] == 1
+
+
+async def test_open_circuits_are_skipped_then_fail_fast():
+    pool = AgentPool([FAST, SLOW], 1)
+    _open_circuit(FAST)
+
+    async with pool.async_lease() as lease:
+        assert lease["agent_id"] == SLOW
+
+    _open_circuit(SLOW)
+    with pytest.raises(AgentCircuitOpenError) as error:
+        async with pool.async_lease():
+            pass
+    assert error.value.retry_after > 0
+
+
+async def test_agent_lease_without_pool(hass):
+    async with agent_lease(hass, 5000) as lease:
+        assert lease is None
+
+
+async def test_agent_lease_skips_agents_too_small_for_the_request(hass):
+    hass.data[AGENT_POOL_KEY] = AgentPool([FAST, SLOW], 2)
+    capacity = await async_get_capacity_model(hass)
+    capacity.record_token_limit(FAST, 3000)
+
+    for _ in range(5):
+        async with agent_lease(hass, 4000) as lease:
+            assert lease["agent_id"] == SLOW
+    # Requests the small agent handles can go to both
+    agents = set()
+    for _ in range(50):
+        async with agent_lease(hass, 1000) as lease:
+            agents.add(lease["agent_id"])
+    assert agents == {FAST, SLOW}
@@ -0,0 +1,41 @@
+"""Tests for token-budget batching."""
+from custom_components.hass_ai.batching import pack_by_token_budget
+
+
+def test_empty():
+    assert pack_by_token_budget([], 100, 10) == []
+
+
+def test_first_fit_decreasing():
+    items = [("a", 6), ("b", 5), ("c", 4), ("d", 1)]
+    assert pack_by_token_budget(items, 10, 10) == [["a", "c"], ["b", "d"]]
+
+
+def test_every_item_packed_once_within_budget():
+    items = [(f"sensor.s{index}", 1 + index * 7 % 13) for index in range(60)]
+    costs = dict(items)
+    batches = pack_by_token_budget(items, 40, 8)
+
+    packed = [key for batch in batches for key in batch]
+    assert sorted(packed) == sorted(costs)
+    for batch in batches:
+        assert len(batch) <= 8
+        assert sum(costs[key] for key in batch) <= 40
+
+
+def test_oversized_item_isolated():
+    items = [("small", 2), ("huge", 500), ("other", 3)]
+    batches = pack_by_token_budget(items, 100, 10)
+    assert ["huge"] in batches
+    assert ["small", "other"] in batches
+
+
+def test_max_items_per_batch():
+    items = [(index, 1) for index in range(7)]
+    assert pack_by_token_budget(items, 100, 3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_keeps_original_order():
+    items = [("a", 1), ("b", 9), ("c", 1), ("d", 9)]
+    batches = pack_by_token_budget(items, 10, 10)
+    assert batches == [["a", "b"], ["c", "d"]]
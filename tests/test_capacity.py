@@ -0,0 +1,129 @@
+"""Tests for the agent capacity model."""
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.util import dt
+
+from custom_components.hass_ai.capacity import (
+    CAPACITY_KEY,
+    STORAGE_VERSION,
+    AgentCapacityModel,
+    async_get_capacity_model,
+)
+from custom_components.hass_ai.const import (
+    CAPACITY_LIMIT_TTL_DAYS,
+    CAPACITY_SAFETY_MARGIN,
+    MIN_PROMPT_TOKEN_BUDGET,
+)
+
+AGENT_ID = "conversation.test"
+
+
+def _stored(profile: dict) -> dict:
+    return {
+        "version": STORAGE_VERSION,
+        "key": CAPACITY_KEY,
+        "data": {"agents": {AGENT_ID: {"max_success_tokens": None, "latency_samples": [], **profile}}},
+    }
+
+
+@pytest.fixture
+def capacity(hass) -> AgentCapacityModel:
+    return AgentCapacityModel(hass)
+
+
+def test_unknown_agent_keeps_the_configured_budget(capacity):
+    assert capacity.recommended_token_budget(AGENT_ID, 3000) == 3000
+    assert capacity.recommended_token_budget(AGENT_ID, None) is None
+    assert capacity.fits(AGENT_ID, 100000)
+
+
+def test_token_limit_caps_the_budget(capacity):
+    capacity.record_token_limit(AGENT_ID, 4000)
+
+    learned_budget = int(4000 * CAPACITY_SAFETY_MARGIN)
+    assert capacity.recommended_token_budget(AGENT_ID, 8000) == learned_budget
+    assert capacity.recommended_token_budget(AGENT_ID, 2000) == 2000
+    assert capacity.recommended_token_budget(AGENT_ID, None) == learned_budget
+    assert capacity.fits(AGENT_ID, 3999)
+    assert not capacity.fits(AGENT_ID, 4000)
+    # Other agents are not affected
+    assert capacity.fits("conversation.other", 4000)
+
+
+def test_budget_never_below_the_minimum(capacity):
+    capacity.record_token_limit(AGENT_ID, 100)
+
+    assert capacity.recommended_token_budget(AGENT_ID, None) == MIN_PROMPT_TOKEN_BUDGET
+
+
+def test_smaller_failure_lowers_the_limit_and_drops_old_successes(capacity):
+    capacity.record_success(AGENT_ID, 3000, 2.0)
+    capacity.record_token_limit(AGENT_ID, 5000)
+    capacity.record_token_limit(AGENT_ID, 6000)
+    assert capacity.get_stats(AGENT_ID)["min_failure_tokens"] == 5000
+
+    capacity.record_token_limit(AGENT_ID, 2500)
+
+    stats = capacity.get_stats(AGENT_ID)
+    assert stats["min_failure_tokens"] == 2500
+    assert stats["max_success_tokens"] is None
+
+
+def test_success_above_the_limit_forgets_it(capacity):
+    capacity.record_token_limit(AGENT_ID, 4000)
+
+    capacity.record_success(AGENT_ID, 4500, 3.0)
+
+    assert capacity.fits(AGENT_ID, 10000)
+    assert capacity.get_stats(AGENT_ID)["max_success_tokens"] == 4500
+
+
+async def test_recent_limit_is_restored(hass, hass_storage):
+    hass_storage[CAPACITY_KEY] = _stored({"min_failure_tokens": 4000, "min_failure_at": dt.utcnow().isoformat()})
+
+    capacity = await async_get_capacity_model(hass)
+
+    assert not capacity.fits(AGENT_ID, 4000)
+    assert await async_get_capacity_model(hass) is capacity
+
+
+@pytest.mark.parametrize(
+    "profile",
+    [
+        {"min_failure_tokens": 4000, "min_failure_at": (dt.utcnow() - timedelta(days=CAPACITY_LIMIT_TTL_DAYS + 1)).isoformat()},
+        # Limits stored before they were dated may come from any error mentioning tokens
+        {"min_failure_tokens": 4000},
+    ],
+)
+async def test_old_limit_expires(hass, hass_storage, profile):
+    hass_storage[CAPACITY_KEY] = _stored(profile)
+
+    capacity = await async_get_capacity_model(hass)
+
+    assert capacity.fits(AGENT_ID, 100000)
+    assert capacity.recommended_token_budget(AGENT_ID, None) is None
+    assert capacity.get_stats(AGENT_ID)["min_failure_tokens"] is None
+
+
+def test_expected_latency_grows_with_request_size(capacity):
+    assert capacity.expected_latency(AGENT_ID, 1000) is None
+
+    capacity.record_success(AGENT_ID, 1000, 2.0)
+    capacity.record_success(AGENT_ID, 2000, 4.0)
+    capacity.record_success(AGENT_ID, 3000, 6.0)
+
+    assert capacity.expected_latency(AGENT_ID, 4000) == pytest.approx(8.0)
+
+
+def test_prompt_format_stats(capacity):
+    capacity.record_prompt_format(AGENT_ID, "compact", 10, 300, 9, 100)
+    capacity.record_prompt_format(AGENT_ID, "compact", 10, 320, 10, 120)
+
+    assert capacity.get_stats(AGENT_ID)["prompt_formats"]["compact"] == {
+        "requests": 2,
+        "tokens_per_entity": 31.0,
+        "response_tokens_per_entity": 11.0,
+        "parse_success_rate": 0.95,
+    }
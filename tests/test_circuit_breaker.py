@@ -0,0 +1,130 @@
+"""Tests for the agent circuit breaker."""
+import pytest
+
+from custom_components.hass_ai import circuit_breaker
+from custom_components.hass_ai.circuit_breaker import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    AgentCircuitBreaker,
+    get_agent_circuit_breaker,
+)
+from custom_components.hass_ai.const import (
+    AGENT_CIRCUIT_FAILURE_THRESHOLD,
+    AGENT_CIRCUIT_MAX_OPEN_SECONDS,
+    AGENT_CIRCUIT_OPEN_SECONDS,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def _open_breaker() -> AgentCircuitBreaker:
+    breaker = AgentCircuitBreaker("conversation.test")
+    for _ in range(AGENT_CIRCUIT_FAILURE_THRESHOLD):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    return breaker
+
+
+def test_stays_closed_below_threshold(clock):
+    breaker = AgentCircuitBreaker()
+    for _ in range(AGENT_CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    assert breaker.state == CIRCUIT_CLOSED
+    assert breaker.allow_request()
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = AgentCircuitBreaker()
+    for _ in range(AGENT_CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CIRCUIT_CLOSED
+    assert breaker.consecutive_failures == 1
+
+
+def test_opens_after_threshold_and_rejects(clock):
+    breaker = _open_breaker()
+    assert breaker.state == CIRCUIT_OPEN
+    assert not breaker.allow_request()
+    assert breaker.rejected_requests == 1
+    assert breaker.retry_after() == pytest.approx(AGENT_CIRCUIT_OPEN_SECONDS)
+
+    clock.now += 10
+    assert breaker.retry_after() == pytest.approx(AGENT_CIRCUIT_OPEN_SECONDS - 10)
+
+
+def test_single_probe_after_wait(clock):
+    breaker = _open_breaker()
+    clock.now += AGENT_CIRCUIT_OPEN_SECONDS
+
+    assert breaker.is_available()
+    assert breaker.allow_request()
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.is_available()
+    assert not breaker.allow_request()
+
+
+def test_probe_success_closes(clock):
+    breaker = _open_breaker()
+    clock.now += AGENT_CIRCUIT_OPEN_SECONDS
+    assert breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CIRCUIT_CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.open_seconds == AGENT_CIRCUIT_OPEN_SECONDS
+    assert breaker.allow_request()
+
+
+def test_probe_failure_reopens_with_doubled_wait(clock):
+    breaker = _open_breaker()
+    wait = AGENT_CIRCUIT_OPEN_SECONDS
+    for _ in range(12):
+        clock.now += wait
+        assert breaker.allow_request()
+        breaker.record_failure()
+        wait = min(wait * 2, AGENT_CIRCUIT_MAX_OPEN_SECONDS)
+        assert breaker.state == CIRCUIT_OPEN
+        assert breaker.open_seconds == wait
+    assert breaker.open_seconds == AGENT_CIRCUIT_MAX_OPEN_SECONDS
+
+
+def test_cancelled_probe_lets_another_probe_go(clock):
+    breaker = _open_breaker()
+    clock.now += AGENT_CIRCUIT_OPEN_SECONDS
+    assert breaker.allow_request()
+
+    breaker.record_cancelled()
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_status(clock):
+    breaker = _open_breaker()
+    status = breaker.get_status()
+    assert status["state"] == CIRCUIT_OPEN
+    assert status["total_failures"] == AGENT_CIRCUIT_FAILURE_THRESHOLD
+    assert status["times_opened"] == 1
+
+
+def test_one_breaker_per_agent():
+    breaker = get_agent_circuit_breaker("conversation.breaker_registry")
+    assert get_agent_circuit_breaker("conversation.breaker_registry") is breaker
+    assert get_agent_circuit_breaker(None) is get_agent_circuit_breaker("auto")
+    assert get_agent_circuit_breaker(None) is not breaker
@@ -0,0 +1,81 @@
+"""Tests for near-duplicate entity grouping."""
+import pytest
+
+from homeassistant.core import State
+
+from custom_components.hass_ai.grouping import (
+    cluster_key,
+    entity_pattern,
+    fan_out_result,
+    group_similar_states,
+)
+
+
+@pytest.mark.parametrize(
+    ("entity_id", "device_slug", "pattern"),
+    [
+        ("sensor.kitchen_motion_battery", "kitchen_motion", "battery"),
+        ("sensor.hall_door_battery", "hall_door", "battery"),
+        ("sensor.meter_power_l1", "meter", "power_l#"),
+        ("sensor.power_1", None, "power#"),
+        ("sensor.power2", None, "power#"),
+        ("sensor.outlet_12", "kitchen", "outlet#"),
+        ("binary_sensor.front_door", None, None),
+        ("binary_sensor.fridge_door", "kitchen", None),
+        ("sensor.123", None, None),
+    ],
+)
+def test_entity_pattern(entity_id, device_slug, pattern):
+    assert entity_pattern(State(entity_id, "1"), device_slug) == pattern
+
+
+def test_cluster_key_includes_device_class_and_unit():
+    power = State("sensor.power_1", "10", {"device_class": "power", "unit_of_measurement": "W"})
+    energy = State("sensor.power_2", "10", {"device_class": "energy", "unit_of_measurement": "kWh"})
+
+    assert cluster_key(power) == ("sensor", "power", "W", "power#")
+    assert cluster_key(power) != cluster_key(energy)
+    assert cluster_key(State("binary_sensor.front_door", "off")) is None
+
+
+def test_group_similar_states_without_devices(hass):
+    states = [
+        State("sensor.power_1", "10", {"unit_of_measurement": "W"}),
+        State("binary_sensor.front_door", "off", {"device_class": "door"}),
+        State("sensor.power_2", "12", {"unit_of_measurement": "W"}),
+        State("binary_sensor.fridge_door", "off", {"device_class": "door"}),
+        State("sensor.power_3", "14", {"unit_of_measurement": "W"}),
+        State("sensor.light_1", "on"),
+    ]
+
+    representatives, members = group_similar_states(hass, states, min_cluster_size=2)
+
+    assert [state.entity_id for state in representatives] == [
+        "sensor.power_1", "binary_sensor.front_door", "binary_sensor.fridge_door", "sensor.light_1"
+    ]
+    assert {key: [state.entity_id for state in cluster] for key, cluster in members.items()} == {
+        "sensor.power_1": ["sensor.power_2", "sensor.power_3"]
+    }
+
+
+def test_fan_out_result_replaces_identity_area_and_reason():
+    result = {
+        "entity_id": "sensor.power_1",
+        "overall_weight": 3,
+        "reason": "Power of the kitchen outlet",
+        "area": "Kitchen",
+        "category": ["DATA"],
+    }
+
+    member_result = fan_out_result(result, State("sensor.power_2", "12"), "Garage", "Rating shared with similar entities")
+
+    assert member_result == {
+        "entity_id": "sensor.power_2",
+        "grouped_from": "sensor.power_1",
+        "overall_weight": 3,
+        "reason": "Rating shared with similar entities",
+        "area": "Garage",
+        "category": ["DATA"],
+    }
+    assert result["entity_id"] == "sensor.power_1"
+    assert "area" not in fan_out_result(result, State("sensor.power_3", "14"))
@@ -0,0 +1,110 @@
+"""Tests for the incremental scanner."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from custom_components.hass_ai.const import (
+    AGENT_UNAVAILABLE_RETRY_DELAY,
+    CONF_CONVERSATION_AGENT,
+    INCREMENTAL_MAX_RETRIES,
+)
+from custom_components.hass_ai.exceptions import AgentUnavailableError
+from custom_components.hass_ai.incremental import IncrementalScanner
+
+ENTITY_IDS = ["sensor.kitchen_temperature", "light.kitchen"]
+
+
+def _result(entity_id: str, analysis_method: str = "ai_conversation") -> dict:
+    return {"entity_id": entity_id, "overall_weight": 3, "analysis_method": analysis_method}
+
+
+@pytest.fixture
+def call_later():
+    with patch("custom_components.hass_ai.incremental.async_call_later") as call_later:
+        yield call_later
+
+
+@pytest.fixture
+def scanner(hass, call_later) -> IncrementalScanner:
+    hass.states.async_set("sensor.kitchen_temperature", "21.5")
+    hass.states.async_set("light.kitchen", "on")
+    scanner = IncrementalScanner(hass, {CONF_CONVERSATION_AGENT: "conversation.test"}, AsyncMock(), AsyncMock())
+    scanner._mark_dirty(ENTITY_IDS)
+    call_later.reset_mock()
+    return scanner
+
+
+def _scan_returning(results=None, error=None):
+    return patch(
+        "custom_components.hass_ai.intelligence.get_entities_importance_batched",
+        AsyncMock(return_value=results, side_effect=error),
+    )
+
+
+async def test_fresh_results_are_stored(scanner, call_later):
+    results = [_result(entity_id) for entity_id in ENTITY_IDS]
+
+    with _scan_returning(results) as scan:
+        await scanner._async_process_dirty()
+
+    scan.assert_awaited_once()
+    assert scan.call_args.kwargs == {"max_concurrent_batches": 1}
+    scanner._store_results.assert_awaited_once_with(results)
+    assert scanner.dirty_entities == set()
+    assert scanner.analyzed_count == 2
+    call_later.assert_not_called()
+
+
+async def test_fallback_results_are_retried_then_given_up(scanner, call_later):
+    results = [_result("sensor.kitchen_temperature"), _result("light.kitchen", "domain_fallback")]
+
+    with _scan_returning(results):
+        await scanner._async_process_dirty()
+
+    # Only the real analysis is stored, the fallback is retried with the next run
+    scanner._store_results.assert_awaited_once_with(results[:1])
+    assert scanner.dirty_entities == {"light.kitchen"}
+    assert call_later.call_args.args[1] == AGENT_UNAVAILABLE_RETRY_DELAY
+
+    with _scan_returning([_result("light.kitchen", "domain_fallback")]):
+        for _ in range(INCREMENTAL_MAX_RETRIES):
+            await scanner._async_process_dirty()
+    assert scanner.dirty_entities == set()
+
+
+async def test_failed_run_is_retried(scanner, call_later):
+    with _scan_returning(error=RuntimeError("boom")):
+        await scanner._async_process_dirty()
+
+    assert scanner.dirty_entities == set(ENTITY_IDS)
+    assert call_later.call_args.args[1] == AGENT_UNAVAILABLE_RETRY_DELAY
+
+
+async def test_unavailable_agent_keeps_entities_without_using_retries(scanner, call_later):
+    error = AgentUnavailableError("Agent did not answer", "conversation.test", retry_after=42.0)
+
+    with _scan_returning(error=error):
+        for _ in range(INCREMENTAL_MAX_RETRIES + 1):
+            await scanner._async_process_dirty()
+
+    assert scanner.dirty_entities == set(ENTITY_IDS)
+    assert call_later.call_args.args[1] == 42.0
+
+
+async def test_new_change_resets_the_retries(scanner):
+    with _scan_returning([_result(entity_id, "domain_fallback") for entity_id in ENTITY_IDS]):
+        for _ in range(INCREMENTAL_MAX_RETRIES):
+            await scanner._async_process_dirty()
+        scanner._mark_dirty(["light.kitchen"])
+        await scanner._async_process_dirty()
+
+    assert scanner.dirty_entities == {"light.kitchen"}
+
+
+def test_own_and_excluded_domains_are_not_scanned(hass, call_later):
+    scanner = IncrementalScanner(hass, {}, AsyncMock(), AsyncMock())
+
+    scanner._mark_dirty(["hass_ai.status", "persistent_notification.scan", "switch.heater"])
+
+    assert scanner.dirty_entities == {"switch.heater"}
+    call_later.assert_called_once()
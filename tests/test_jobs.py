@@ -0,0 +1,84 @@
+"""Tests for the operation job manager."""
+import asyncio
+
+from custom_components.hass_ai.jobs import JobManager, OperationJob
+
+
+async def _wait_forever(job: OperationJob) -> None:
+    await asyncio.Event().wait()
+
+
+async def test_one_running_job_per_type(hass):
+    manager = JobManager(hass)
+
+    scan = manager.async_start("scan", _wait_forever)
+    thresholds = manager.async_start("thresholds", _wait_forever)
+
+    assert scan is not None and thresholds is not None
+    assert manager.async_start("scan", _wait_forever) is None
+    assert manager.get_running("scan") is scan
+    assert manager.has_active_jobs()
+    assert {job["type"] for job in manager.get_status()["jobs"]} == {"scan", "thresholds"}
+
+    await manager.async_shutdown()
+
+
+async def test_finished_job_is_removed(hass):
+    manager = JobManager(hass)
+    done = []
+
+    async def _run(job: OperationJob) -> None:
+        done.append(job.job_id)
+
+    job = manager.async_start("scan", _run)
+    await job.task
+
+    assert done == [job.job_id]
+    assert not manager.has_active_jobs()
+    assert manager.async_start("scan", _run) is not None
+
+
+async def test_cancel_interrupts_the_job(hass):
+    manager = JobManager(hass)
+    interrupted = asyncio.Event()
+
+    async def _run(job: OperationJob) -> None:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            assert job.cancelled
+            interrupted.set()
+            raise
+
+    scan = manager.async_start("scan", _run)
+    thresholds = manager.async_start("thresholds", _wait_forever)
+    await asyncio.sleep(0)
+
+    assert manager.async_cancel(scan.job_id) == [scan.job_id]
+    assert manager.async_cancel("unknown") == []
+    await asyncio.wait_for(interrupted.wait(), timeout=1)
+    await asyncio.sleep(0)
+
+    assert manager.get_running("scan") is None
+    assert manager.get_running("thresholds") is thresholds
+    await manager.async_shutdown()
+
+
+async def test_shutdown_cancels_and_waits_for_all_jobs(hass):
+    manager = JobManager(hass)
+    saved = []
+
+    async def _run(job: OperationJob) -> None:
+        try:
+            await asyncio.Event().wait()
+        finally:
+            saved.append(job.job_type)
+
+    manager.async_start("scan", _run)
+    manager.async_start("correlations", _run)
+    await asyncio.sleep(0)
+
+    await manager.async_shutdown()
+
+    assert sorted(saved) == ["correlations", "scan"]
+    assert not manager.has_active_jobs()
@@ -0,0 +1,251 @@
+"""Tests for the shared keyword matcher.
+
+The name-based heuristics used to test every keyword with ``keyword in entity_id.lower()``.
+The reference functions below are those checks as they were before the matcher, and
+the matcher-based heuristics must give the same answer for every entity_id.
+"""
+import random
+
+import pytest
+
+from homeassistant.core import State, valid_entity_id
+
+from custom_components.hass_ai.alert_monitor import AlertMonitor
+from custom_components.hass_ai.keywords import (
+    KEYWORD_CLASSES,
+    KeywordMatcher,
+    keyword_tags,
+    matched_keywords,
+)
+
+ALL_KEYWORDS = sorted({keyword for keywords in KEYWORD_CLASSES.values() for keyword in keywords})
+
+ENTITY_IDS = [
+    "sensor.kitchen_temperature",
+    "sensor.Kitchen_Temperature",
+    "sensor.temperatura_cucina",
+    "sensor.cpu_temp",
+    "sensor.batteria_telecomando",
+    "sensor.phone_battery_level",
+    "sensor.remote_batt",
+    "sensor.bathroom_humidity",
+    "sensor.plant_moisture",
+    "sensor.living_co2",
+    "sensor.carbon_monoxide",
+    "sensor.barometric_pressure",
+    "sensor.impressora_status",
+    "binary_sensor.porta_ingresso",
+    "binary_sensor.front_door_open",
+    "binary_sensor.finestra_bagno",
+    "binary_sensor.window_closed",
+    "binary_sensor.hall_motion_detected",
+    "binary_sensor.movimento_sala",
+    "binary_sensor.pir_garage",
+    "binary_sensor.pirate_flag",
+    "binary_sensor.smoke_alarm",
+    "binary_sensor.rilevatore_fumo",
+    "binary_sensor.gas_leak",
+    "binary_sensor.water_leak_alert",
+    "switch.security_mode",
+    "switch.safety_lock",
+    "switch.emergency_stop",
+    "switch.heater",
+    "light.emergenza_scale",
+    "light.alarm_indicator",
+    "light.warning_beacon",
+    "light.kitchen",
+    "sensor.air_quality",
+    "sensor.air_quality_poor",
+    "sensor.wifi_signal_strength",
+    "sensor.router_rssi",
+    "sensor.segnale_wifi",
+    "sensor.disk_free",
+    "sensor.storage_available",
+    "sensor.spazio_libero",
+    "sensor.memoria_disponibile",
+    "sensor.filter_remaining",
+    "sensor.server_uptime",
+    "sensor.connettivita_rete",
+    "sensor.printer_ink_black",
+    "sensor.hp_toner",
+    "sensor.cartuccia_ciano",
+    "sensor.ups_power_level",
+    "sensor.pm25",
+    "sensor.aqi",
+    "sensor.street_noise",
+    "sensor.device_name",
+    "sensor.hvac_mode",
+    "sensor.last_message",
+    "sensor.heart_rate",
+    "sensor.blood_oxygen",
+    "sensor.daily_steps",
+    "sensor.energy_today",
+]
+
+
+def _generated_entity_ids(count: int = 2000) -> list[str]:
+    """Random keyword combinations, joined with and without separators so that keywords overlap."""
+    generator = random.Random(42)
+    filler = ["", "x", "1", "kitchen", "Living", "ÀÈ", "-"]
+    entity_ids = []
+    for index in range(count):
+        parts = generator.sample(ALL_KEYWORDS, generator.randint(1, 3))
+        parts.insert(generator.randint(0, len(parts)), generator.choice(filler))
+        separator = generator.choice(["_", ""])
+        object_id = separator.join(parts)
+        if generator.random() < 0.2:
+            object_id = object_id.upper()
+        domain = ["sensor", "binary_sensor", "switch", "light"][index % 4]
+        entity_ids.append(f"{domain}.{object_id}")
+    return entity_ids
+
+
+CORPUS = ENTITY_IDS + _generated_entity_ids()
+# Entity ids Home Assistant accepts for a state
+STATE_CORPUS = [entity_id for entity_id in CORPUS if valid_entity_id(entity_id)]
+
+
+# Heuristics as they were with substring checks
+
+
+def reference_entity_type(entity_id: str) -> str:
+    entity_lower = entity_id.lower()
+    if any(term in entity_lower for term in ['temp', 'temperature']):
+        return 'temperature'
+    elif any(term in entity_lower for term in ['humid', 'moisture']):
+        return 'humidity'
+    elif any(term in entity_lower for term in ['batt', 'battery']):
+        return 'battery'
+    elif any(term in entity_lower for term in ['co2', 'carbon']):
+        return 'co2'
+    elif any(term in entity_lower for term in ['pressure', 'press']):
+        return 'pressure'
+    elif any(term in entity_lower for term in ['door', 'porta']):
+        return 'door'
+    elif any(term in entity_lower for term in ['window', 'finestra']):
+        return 'window'
+    elif any(term in entity_lower for term in ['motion', 'movimento', 'pir']):
+        return 'motion'
+    elif any(term in entity_lower for term in ['smoke', 'fumo']):
+        return 'smoke'
+    elif any(term in entity_lower for term in ['gas', 'leak']):
+        return 'gas'
+    elif any(term in entity_lower for term in ['security', 'alarm']):
+        return 'security'
+    elif any(term in entity_lower for term in ['emergency', 'emer']):
+        return 'emergency'
+    return 'generic'
+
+
+def reference_alert_on_low_value(entity_id: str, state: State) -> bool:
+    entity_lower = entity_id.lower()
+    device_class = state.attributes.get('device_class', '').lower()
+    unit = state.attributes.get('unit_of_measurement', '').lower()
+    low_value_indicators = [
+        'battery', 'batteria', 'power_level',
+        'signal', 'rssi', 'wifi', 'segnale', 'strength',
+        'available', 'free', 'remaining', 'libero', 'disponibile',
+        'uptime', 'connectivity', 'connettivita',
+        'ink', 'toner', 'cartridge', 'cartuccia',
+        'air_quality' if 'poor' not in entity_lower else None
+    ]
+    if any(keyword and keyword in entity_lower for keyword in low_value_indicators):
+        return True
+    if device_class in ['battery', 'signal_strength', 'power']:
+        return True
+    if unit in ['%', 'percent'] and any(keyword in entity_lower for keyword in ['battery', 'signal', 'storage', 'disk', 'available', 'free']):
+        return True
+    return False
+
+
+def reference_valid_alert_entity(entity_id: str, state: State) -> bool:
+    """The name-dependent part of is_valid_alert_entity, for states without a device class."""
+    domain = entity_id.split('.')[0]
+    current_state = state.state
+    unit = state.attributes.get("unit_of_measurement")
+    is_numeric = current_state.replace(".", "", 1).isdigit()
+    if domain == "sensor":
+        if "battery" in entity_id.lower():
+            return True
+        if unit and is_numeric:
+            return True
+        if any(keyword in entity_id.lower() for keyword in ["co2", "aqi", "pm", "noise", "signal"]):
+            return is_numeric
+        if any(keyword in entity_id.lower() for keyword in ["status", "mode", "text", "message", "name"]):
+            return False
+        if any(keyword in entity_id.lower() for keyword in ["heart", "oxygen", "blood", "steps"]):
+            return is_numeric
+        return False
+    elif domain == "binary_sensor":
+        return any(keyword in entity_id.lower() for keyword in ["open", "closed", "detected", "alarm", "alert"])
+    elif domain == "switch":
+        return any(keyword in entity_id.lower() for keyword in ["security", "alarm", "emergency", "safety"])
+    elif domain == "light":
+        return any(keyword in entity_id.lower() for keyword in ["emergency", "alarm", "indicator", "warning"])
+    return False
+
+
+@pytest.fixture
+def monitor(hass) -> AlertMonitor:
+    return AlertMonitor(hass)
+
+
+def test_tags_match_substring_checks():
+    for entity_id in CORPUS:
+        entity_lower = entity_id.lower()
+        expected = {
+            class_name
+            for class_name, keywords in KEYWORD_CLASSES.items()
+            if any(keyword in entity_lower for keyword in keywords)
+        }
+        assert keyword_tags(entity_id) == expected, entity_id
+
+
+def test_matched_keywords_match_substring_checks():
+    for entity_id in CORPUS:
+        entity_lower = entity_id.lower()
+        assert matched_keywords(entity_id) == {keyword for keyword in ALL_KEYWORDS if keyword in entity_lower}, entity_id
+
+
+def test_overlapping_keywords_are_all_found():
+    matcher = KeywordMatcher({"short": ("temp", "emer"), "long": ("temperature", "emergency"), "inner": ("era",)})
+
+    assert matcher.keywords("sensor.temperature_emergency") == {"temp", "temperature", "emer", "emergency", "era"}
+    assert matcher.tags("sensor.temp") == {"short"}
+    assert matcher.tags("light.kitchen") == frozenset()
+
+
+def test_entity_type_matches_reference(monitor):
+    for entity_id in CORPUS:
+        assert monitor._detect_entity_type(entity_id, {}) == reference_entity_type(entity_id), entity_id
+
+
+@pytest.mark.parametrize(
+    "attributes",
+    [
+        {},
+        {"unit_of_measurement": "%"},
+        {"unit_of_measurement": "GB"},
+        {"device_class": "signal_strength", "unit_of_measurement": "dBm"},
+    ],
+)
+def test_alert_on_low_value_matches_reference(monitor, attributes):
+    state = State("sensor.test", "42", attributes)
+    for entity_id in CORPUS:
+        assert monitor._should_alert_on_low_value(entity_id, state) == reference_alert_on_low_value(entity_id, state), entity_id
+
+
+@pytest.mark.parametrize(
+    ("value", "attributes"),
+    [
+        ("42", {}),
+        ("42", {"unit_of_measurement": "ppm"}),
+        ("on", {}),
+        ("running", {}),
+    ],
+)
+def test_valid_alert_entity_matches_reference(hass, monitor, value, attributes):
+    for entity_id in STATE_CORPUS:
+        hass.states.async_set(entity_id, value, attributes)
+        state = hass.states.get(entity_id)
+        assert monitor.is_valid_alert_entity(entity_id, {}) == reference_valid_alert_entity(entity_id, state), entity_id
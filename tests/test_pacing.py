@@ -0,0 +1,90 @@
+"""Tests for the adaptive agent pacer."""
+from unittest.mock import AsyncMock, patch
+
+from custom_components.hass_ai.const import (
+    PACING_BACKOFF_STEP,
+    PACING_MAX_DELAY,
+    PACING_OVERLOAD_LATENCY_FACTOR,
+    PACING_RECOVERY_FACTOR,
+)
+from custom_components.hass_ai.pacing import (
+    AdaptivePacer,
+    get_agent_pacer,
+    is_rate_limited_response,
+)
+
+
+async def test_healthy_agent_is_not_delayed():
+    pacer = AdaptivePacer("conversation.test")
+    for _ in range(5):
+        pacer.record_success(1.0)
+
+    with patch("custom_components.hass_ai.pacing.asyncio.sleep", AsyncMock()) as sleep:
+        assert await pacer.async_wait() == 0.0
+
+    sleep.assert_not_called()
+    assert pacer.delay == 0.0
+
+
+async def test_rate_limit_doubles_the_delay_up_to_the_maximum():
+    pacer = AdaptivePacer("conversation.test")
+
+    pacer.record_rate_limited()
+    assert pacer.delay == PACING_BACKOFF_STEP
+    pacer.record_rate_limited()
+    assert pacer.delay == PACING_BACKOFF_STEP * 2
+    for _ in range(20):
+        pacer.record_rate_limited()
+    assert pacer.delay == PACING_MAX_DELAY
+
+    with patch("custom_components.hass_ai.pacing.asyncio.sleep", AsyncMock()) as sleep:
+        assert await pacer.async_wait() == PACING_MAX_DELAY
+    sleep.assert_awaited_once_with(PACING_MAX_DELAY)
+    assert pacer.get_stats()["rate_limited_requests"] == 22
+
+
+def test_healthy_responses_recover_the_delay():
+    pacer = AdaptivePacer("conversation.test")
+    pacer.record_success(1.0)
+    pacer.record_rate_limited()
+
+    pacer.record_success(1.0)
+    assert pacer.delay == PACING_BACKOFF_STEP * PACING_RECOVERY_FACTOR
+    for _ in range(10):
+        pacer.record_success(1.0)
+    assert pacer.delay == 0.0
+
+
+def test_slow_response_counts_as_overload():
+    pacer = AdaptivePacer("conversation.test")
+    pacer.record_success(1.0)
+
+    pacer.record_success(PACING_OVERLOAD_LATENCY_FACTOR * 2)
+
+    assert pacer.delay > 0
+    assert pacer.get_stats()["overloaded_requests"] == 1
+
+
+def test_expected_latency_of_a_large_request_is_not_overload():
+    pacer = AdaptivePacer("conversation.test")
+    pacer.record_success(1.0)
+
+    pacer.record_success(PACING_OVERLOAD_LATENCY_FACTOR * 2, expected_latency=PACING_OVERLOAD_LATENCY_FACTOR * 2)
+
+    assert pacer.delay == 0.0
+    assert pacer.get_stats()["overloaded_requests"] == 0
+
+
+def test_one_pacer_per_agent():
+    assert get_agent_pacer("conversation.pacing_a") is get_agent_pacer("conversation.pacing_a")
+    assert get_agent_pacer("conversation.pacing_a") is not get_agent_pacer("conversation.pacing_b")
+    assert get_agent_pacer(None).name == "auto"
+
+
+def test_rate_limited_response_detection():
+    assert is_rate_limited_response("Error 429: Too Many Requests")
+    assert is_rate_limited_response("The model is overloaded, try again later")
+    assert not is_rate_limited_response("")
+    assert not is_rate_limited_response("Sorry, I could not understand the request")
+    # Reasons inside a JSON answer are not errors
+    assert not is_rate_limited_response('[{"entity_id": "sensor.api_rate_limit", "rating": 2}]')
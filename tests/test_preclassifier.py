@@ -0,0 +1,63 @@
+"""Tests for the rule-based pre-classifier."""
+import pytest
+
+from homeassistant.const import EntityCategory
+from homeassistant.core import State
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.hass_ai.preclassifier import preclassify_entity
+
+
+@pytest.mark.parametrize(
+    ("entity_id", "state", "attributes", "rule", "rating", "category"),
+    [
+        ("sun.sun", "above_horizon", {}, "sun", 1, ["DATA"]),
+        ("update.router_firmware", "off", {}, "update", 2, ["DATA", "ALERTS"]),
+        ("zone.home", "2", {}, "zone", 1, ["DATA"]),
+        ("sensor.phone_level", "80", {"device_class": "battery"}, "battery", 2, ["DATA", "ALERTS"]),
+        ("sensor.remote_battery", "55", {"unit_of_measurement": "%"}, "battery", 2, ["DATA", "ALERTS"]),
+        ("binary_sensor.remote_battery_low", "off", {}, "battery", 2, ["DATA", "ALERTS"]),
+        ("sensor.plug_wifi", "-61", {"unit_of_measurement": "dBm"}, "diagnostic", 1, ["DATA"]),
+        ("sensor.plug_signal", "-61", {"device_class": "signal_strength"}, "diagnostic", 1, ["DATA"]),
+        ("sensor.door_linkquality", "120", {}, "diagnostic", 1, ["DATA"]),
+        ("sensor.plug_uptime", "3600", {"unit_of_measurement": "s"}, "diagnostic", 1, ["DATA"]),
+    ],
+)
+def test_rules(hass, entity_id, state, attributes, rule, rating, category):
+    classification = preclassify_entity(hass, State(entity_id, state, attributes))
+
+    assert classification["rule"] == rule
+    assert classification["rating"] == rating
+    assert classification["category"] == category
+    assert 0 < classification["confidence"] <= 1
+
+
+@pytest.mark.parametrize(
+    ("entity_id", "state", "attributes"),
+    [
+        ("light.kitchen", "on", {}),
+        ("sensor.kitchen_temperature", "21.5", {"device_class": "temperature", "unit_of_measurement": "°C"}),
+        # A battery voltage is not a level
+        ("sensor.remote_battery_voltage", "3.1", {"unit_of_measurement": "V"}),
+    ],
+)
+def test_no_rule_leaves_the_entity_to_the_agent(hass, entity_id, state, attributes):
+    assert preclassify_entity(hass, State(entity_id, state, attributes)) is None
+
+
+@pytest.mark.parametrize(
+    ("entity_category", "rule", "category"),
+    [
+        (EntityCategory.DIAGNOSTIC, "registry_diagnostic", ["DATA"]),
+        (EntityCategory.CONFIG, "registry_config", ["CONTROL"]),
+    ],
+)
+def test_registry_entity_category(hass, entity_category, rule, category):
+    entry = er.async_get(hass).async_get_or_create(
+        "switch", "test", "plug_child_lock", suggested_object_id="plug_child_lock", entity_category=entity_category
+    )
+
+    classification = preclassify_entity(hass, State(entry.entity_id, "off"))
+
+    assert classification["rule"] == rule
+    assert classification["category"] == category
@@ -0,0 +1,64 @@
+"""Tests for the compact tabular prompt encoding."""
+from custom_components.hass_ai.prompt_encoding import (
+    TABLE_HEADER,
+    TABLE_MAX_NAME_LENGTH,
+    TABLE_MAX_STATE_LENGTH,
+    encode_entity_table,
+    table_row,
+)
+
+
+def test_table_row():
+    assert table_row("sensor.temp_1", "21.5", "Boiler temperature", "Kitchen") == "sensor.temp_1|21.5|Boiler temperature|Kitchen"
+
+
+def test_name_repeating_the_object_id_is_dropped():
+    assert table_row("light.kitchen_light", "on", "Kitchen Light", None) == "light.kitchen_light|on|-|"
+    assert table_row("light.kitchen_light", "on", None, None) == "light.kitchen_light|on|-|"
+
+
+def test_cells_are_truncated_and_cannot_break_the_table():
+    row = table_row("sensor.status", "a|b\n" + "x" * 100, "Name|" + "y" * 100, "Living | Dining")
+
+    entity_id, state, name, area = row.split("|")
+    assert entity_id == "sensor.status"
+    assert state.startswith("a/b x")
+    assert len(state) == TABLE_MAX_STATE_LENGTH
+    assert name.startswith("Name/")
+    assert len(name) == TABLE_MAX_NAME_LENGTH
+    assert area == "Living / Dining"
+
+
+def test_areas_are_coded_in_order_of_first_appearance():
+    rows = [
+        table_row("light.kitchen", "on", None, "Kitchen"),
+        table_row("sensor.sofa_temp", "20", "Sofa", "Living room"),
+        table_row("sun.sun", "above_horizon", "Sun", None),
+        table_row("switch.oven", "off", None, "Kitchen"),
+    ]
+
+    legend, table = encode_entity_table(rows)
+
+    assert legend == "1=Kitchen, 2=Living room"
+    assert table.split("\n") == [
+        TABLE_HEADER,
+        "light.kitchen|on|-|1",
+        "sensor.sofa_temp|20|Sofa|2",
+        "sun.sun|above_horizon|-|-",
+        "switch.oven|off|-|1",
+    ]
+
+
+def test_empty_table():
+    assert encode_entity_table([]) == ("", TABLE_HEADER)
+
+
+def test_numbered_rows_for_positional_answers():
+    rows = [
+        table_row("light.kitchen", "on", None, "Kitchen"),
+        table_row("switch.oven", "off", None, None),
+    ]
+
+    _legend, table = encode_entity_table(rows, numbered=True)
+
+    assert table.split("\n") == [f"#|{TABLE_HEADER}", "0|light.kitchen|on|-|1", "1|switch.oven|off|-|-"]
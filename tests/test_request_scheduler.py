@@ -0,0 +1,96 @@
+"""Tests for the agent request scheduler."""
+import asyncio
+
+import pytest
+
+from custom_components.hass_ai.const import (
+    AGENT_LANE_ALERTS,
+    AGENT_LANE_BACKGROUND,
+    AGENT_LANE_INTERACTIVE,
+    AGENT_LANE_WEIGHTS,
+)
+from custom_components.hass_ai.request_scheduler import (
+    AGENT_SCHEDULER_KEY,
+    AgentRequestScheduler,
+    agent_request_slot,
+)
+
+
+async def _request(scheduler: AgentRequestScheduler, lane: str, order: list) -> None:
+    async with scheduler.request_slot(lane):
+        order.append(lane)
+        await asyncio.sleep(0)
+
+
+async def _queue(scheduler: AgentRequestScheduler, lanes: list, order: list) -> list:
+    """Start requests one lane at a time while the caller holds every slot."""
+    tasks = []
+    for lane in lanes:
+        tasks.append(asyncio.create_task(_request(scheduler, lane, order)))
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def test_grants_free_slots_immediately():
+    scheduler = AgentRequestScheduler(2)
+    async with scheduler.request_slot(AGENT_LANE_BACKGROUND):
+        async with scheduler.request_slot(AGENT_LANE_BACKGROUND):
+            assert scheduler.get_status()["in_flight"] == 2
+    status = scheduler.get_status()
+    assert status["in_flight"] == 0
+    assert status["lanes"][AGENT_LANE_BACKGROUND]["granted"] == 2
+
+
+async def test_waiting_requests_served_by_lane_priority():
+    scheduler = AgentRequestScheduler(1)
+    order = []
+    async with scheduler.request_slot(AGENT_LANE_BACKGROUND):
+        tasks = await _queue(scheduler, [AGENT_LANE_BACKGROUND, AGENT_LANE_INTERACTIVE, AGENT_LANE_ALERTS], order)
+        assert scheduler.get_status()["lanes"][AGENT_LANE_ALERTS]["queued"] == 1
+    await asyncio.gather(*tasks)
+
+    assert order == [AGENT_LANE_ALERTS, AGENT_LANE_INTERACTIVE, AGENT_LANE_BACKGROUND]
+
+
+async def test_background_lane_keeps_its_share():
+    scheduler = AgentRequestScheduler(1)
+    alerts = AGENT_LANE_WEIGHTS[AGENT_LANE_ALERTS] * 2
+    order = []
+    async with scheduler.request_slot(AGENT_LANE_ALERTS):
+        tasks = await _queue(scheduler, [AGENT_LANE_ALERTS] * alerts + [AGENT_LANE_BACKGROUND], order)
+    await asyncio.gather(*tasks)
+
+    # The holder used one alert grant of the round, the background request gets its turn before the next round
+    assert order.index(AGENT_LANE_BACKGROUND) == AGENT_LANE_WEIGHTS[AGENT_LANE_ALERTS] - 1
+    assert order.count(AGENT_LANE_ALERTS) == alerts
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = AgentRequestScheduler(1)
+    order = []
+    async with scheduler.request_slot(AGENT_LANE_BACKGROUND):
+        cancelled, waiting = await _queue(scheduler, [AGENT_LANE_INTERACTIVE, AGENT_LANE_BACKGROUND], order)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert scheduler.get_status()["lanes"][AGENT_LANE_INTERACTIVE]["queued"] == 0
+    await waiting
+
+    assert order == [AGENT_LANE_BACKGROUND]
+    assert scheduler.get_status()["in_flight"] == 0
+
+
+async def test_unknown_lane_uses_background():
+    scheduler = AgentRequestScheduler(1)
+    async with scheduler.request_slot("unknown"):
+        assert scheduler.get_status()["lanes"][AGENT_LANE_BACKGROUND]["in_flight"] == 1
+
+
+async def test_no_limit_before_setup(hass):
+    hass.data.pop(AGENT_SCHEDULER_KEY, None)
+    async with agent_request_slot(hass, AGENT_LANE_ALERTS):
+        pass
+
+    scheduler = hass.data[AGENT_SCHEDULER_KEY] = AgentRequestScheduler(1)
+    async with agent_request_slot(hass, AGENT_LANE_ALERTS):
+        assert scheduler.get_status()["lanes"][AGENT_LANE_ALERTS]["in_flight"] == 1
@@ -0,0 +1,101 @@
+"""Tests for the agent response parser."""
+import json
+
+from custom_components.hass_ai.const import POSITIONAL_REASON_MAX_LENGTH
+from custom_components.hass_ai.response_parser import (
+    JsonItemStreamParser,
+    decode_positional_item,
+    parse_json_items,
+)
+
+ENTITY_IDS = ["light.kitchen", "sensor.temperature", "switch.heater"]
+
+
+def test_parses_array():
+    items, parser = parse_json_items('[{"entity_id": "light.kitchen", "rating": 4}, {"entity_id": "switch.heater", "rating": 2}]')
+    assert items == [{"entity_id": "light.kitchen", "rating": 4}, {"entity_id": "switch.heater", "rating": 2}]
+    assert parser.items_parsed == 2
+    assert parser.array_closed
+    assert not parser.truncated
+
+
+def test_ignores_text_around_json():
+    text = 'Here is the analysis:\n```json\n[{"entity_id": "light.kitchen", "rating": 4}]\n```\nDone {really}.'
+    items, _parser = parse_json_items(text)
+    assert items == [{"entity_id": "light.kitchen", "rating": 4}]
+
+
+def test_braces_and_quotes_inside_strings():
+    item = {"entity_id": "light.kitchen", "reason": 'uses "{" and "]" \\ in text'}
+    items, _parser = parse_json_items(json.dumps([item]))
+    assert items == [item]
+
+
+def test_recovers_trailing_commas():
+    items, parser = parse_json_items('[{"entity_id": "light.kitchen", "category": ["DATA",],},]')
+    assert items == [{"entity_id": "light.kitchen", "category": ["DATA"]}]
+    assert parser.items_malformed == 0
+
+
+def test_skips_malformed_item():
+    items, parser = parse_json_items('[{"entity_id": "light.kitchen"}, {"entity_id": oops}, {"entity_id": "switch.heater"}]')
+    assert [item["entity_id"] for item in items] == ["light.kitchen", "switch.heater"]
+    assert parser.items_malformed == 1
+
+
+def test_truncated_answer_keeps_complete_items():
+    items, parser = parse_json_items('[{"entity_id": "light.kitchen", "rating": 4}, {"entity_id": "sensor.temp')
+    assert items == [{"entity_id": "light.kitchen", "rating": 4}]
+    assert parser.truncated
+    assert not parser.array_closed
+
+
+def test_streamed_chunks():
+    parser = JsonItemStreamParser()
+    assert parser.feed('[{"entity_id": "light.ki') == []
+    assert parser.feed('tchen"}, {"entity_id"') == [{"entity_id": "light.kitchen"}]
+    assert parser.feed(': "switch.heater"}]') == [{"entity_id": "switch.heater"}]
+    assert parser.array_closed
+
+
+def test_bare_objects():
+    items, _parser = parse_json_items('{"entity_id": "light.kitchen"}\n{"entity_id": "switch.heater"}')
+    assert [item["entity_id"] for item in items] == ["light.kitchen", "switch.heater"]
+
+
+def test_positional_rows():
+    items, _parser = parse_json_items('[[0, 4, 3, "U", "Main light"], [2, 1, 8, "S", ""]]')
+    assert items == [[0, 4, 3, "U", "Main light"], [2, 1, 8, "S", ""]]
+
+
+def test_decode_positional_item():
+    result = decode_positional_item([1, 5, 5, "s", " Room temperature "], ENTITY_IDS)
+    assert result == {
+        "entity_id": "sensor.temperature",
+        "rating": 5,
+        "reason": "Room temperature",
+        "category": ["DATA", "ALERTS"],
+        "management_type": "service",
+    }
+
+
+def test_decode_positional_item_defaults():
+    result = decode_positional_item([0, 3], ENTITY_IDS)
+    assert result["entity_id"] == "light.kitchen"
+    assert result["category"] == ["DATA"]
+    assert result["management_type"] == "user"
+    assert result["reason"] == ""
+
+
+def test_decode_positional_item_truncates_reason():
+    result = decode_positional_item([0, 3, "x", "U", "r" * 500], ENTITY_IDS)
+    assert len(result["reason"]) == POSITIONAL_REASON_MAX_LENGTH
+    assert result["category"] == ["DATA"]
+
+
+def test_decode_positional_item_rejects_unusable_rows():
+    assert decode_positional_item({"entity_id": "light.kitchen"}, ENTITY_IDS) is None
+    assert decode_positional_item([0], ENTITY_IDS) is None
+    assert decode_positional_item(["first", 3], ENTITY_IDS) is None
+    assert decode_positional_item([3, 3], ENTITY_IDS) is None
+    assert decode_positional_item([-1, 3], ENTITY_IDS) is None
@@ -0,0 +1,132 @@
+"""Tests for the AI result cache."""
+
+from homeassistant.core import State
+
+from custom_components.hass_ai import result_cache
+from custom_components.hass_ai.result_cache import (
+    RESULT_CACHE_KEY,
+    STORAGE_VERSION,
+    ResultCache,
+    async_get_result_cache,
+    entity_fingerprint,
+)
+from custom_components.hass_ai.const import RESULT_CACHE_TTL_DAYS
+
+PROMPT_VERSION = "prompt-v1"
+RESULT = {"entity_id": "sensor.temperature", "overall_weight": 4, "reason": "Room temperature"}
+
+
+def _state(value: str = "20.5", **attributes) -> State:
+    attributes.setdefault("friendly_name", "Temperature")
+    attributes.setdefault("device_class", "temperature")
+    return State("sensor.temperature", value, attributes)
+
+
+def _stored(entries: dict, prompt_version: str = PROMPT_VERSION) -> dict:
+    return {
+        "version": STORAGE_VERSION,
+        "key": RESULT_CACHE_KEY,
+        "data": {"prompt_version": prompt_version, "entries": entries},
+    }
+
+
+def _entry(entity_id: str, stored_at: float, last_hit: float = None) -> dict:
+    return {
+        "entity_id": entity_id,
+        "stored_at": stored_at,
+        "last_hit": last_hit if last_hit is not None else stored_at,
+        "result": {"entity_id": entity_id},
+    }
+
+
+def test_fingerprint_ignores_state_value():
+    assert entity_fingerprint(_state("20.5"), "Kitchen", "en", PROMPT_VERSION) == entity_fingerprint(
+        _state("21"), "Kitchen", "en", PROMPT_VERSION
+    )
+
+
+def test_fingerprint_identity_changes():
+    fingerprint = entity_fingerprint(_state(), "Kitchen", "en", PROMPT_VERSION)
+    assert entity_fingerprint(_state(friendly_name="Boiler"), "Kitchen", "en", PROMPT_VERSION) != fingerprint
+    assert entity_fingerprint(_state(), "Bedroom", "en", PROMPT_VERSION) != fingerprint
+    assert entity_fingerprint(_state(), "Kitchen", "it", PROMPT_VERSION) != fingerprint
+    assert entity_fingerprint(_state(), "Kitchen", "en", "prompt-v2") != fingerprint
+    # Only the prompt language matters, not the region
+    assert entity_fingerprint(_state(), "Kitchen", "en-GB", PROMPT_VERSION) == fingerprint
+    assert entity_fingerprint(_state(), "Kitchen", "it-IT", PROMPT_VERSION) == entity_fingerprint(
+        _state(), "Kitchen", "it", PROMPT_VERSION
+    )
+
+
+async def test_put_and_get(hass):
+    cache = ResultCache(hass, PROMPT_VERSION)
+    assert cache.get("missing") is None
+
+    cache.put("abc", RESULT)
+    cached = cache.get("abc")
+    assert cached == RESULT
+    cached["overall_weight"] = 1
+    assert cache.get("abc")["overall_weight"] == 4
+    assert cache.get_stats()["hits"] == 2
+    assert cache.get_stats()["misses"] == 1
+
+
+async def test_expired_entry_misses(hass, monkeypatch):
+    cache = ResultCache(hass, PROMPT_VERSION)
+    cache.put("abc", RESULT)
+
+    now = result_cache.time.time()
+    monkeypatch.setattr(result_cache.time, "time", lambda: now + RESULT_CACHE_TTL_DAYS * 86400 + 1)
+    assert cache.get("abc") is None
+
+
+async def test_update_and_invalidate_entity(hass):
+    cache = ResultCache(hass, PROMPT_VERSION)
+    cache.put("abc", RESULT)
+    cache.put("def", RESULT)
+    cache.put("ghi", {"entity_id": "light.kitchen"})
+
+    assert cache.update_entity("sensor.temperature", {"auto_thresholds": {"high": 30}}) == 2
+    assert cache.get("def")["auto_thresholds"] == {"high": 30}
+    assert "auto_thresholds" not in cache.get("ghi")
+
+    assert cache.invalidate_entity("sensor.temperature") == 2
+    assert cache.get("abc") is None
+    assert cache.get_stats()["entries"] == 1
+
+
+async def test_load_drops_other_prompt_versions(hass, hass_storage):
+    now = result_cache.time.time()
+    hass_storage[RESULT_CACHE_KEY] = _stored({"abc": _entry("sensor.temperature", now)}, "prompt-v0")
+
+    cache = ResultCache(hass, PROMPT_VERSION)
+    await cache.async_load()
+    assert cache.get_stats()["entries"] == 0
+
+
+async def test_load_evicts_expired_and_least_recent(hass, hass_storage, monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_ENTRIES", 2)
+    now = result_cache.time.time()
+    hass_storage[RESULT_CACHE_KEY] = _stored({
+        "expired": _entry("sensor.old", now - RESULT_CACHE_TTL_DAYS * 86400 - 1),
+        "oldest_hit": _entry("sensor.a", now - 30, now - 30),
+        "recent_hit": _entry("sensor.b", now - 30, now - 10),
+        "newest": _entry("sensor.c", now - 5),
+    })
+
+    cache = ResultCache(hass, PROMPT_VERSION)
+    await cache.async_load()
+    assert cache.get_stats()["entries"] == 2
+    assert cache.get("recent_hit") is not None
+    assert cache.get("newest") is not None
+    assert cache.get("oldest_hit") is None
+
+
+async def test_reloaded_on_prompt_change(hass):
+    hass.data.pop(RESULT_CACHE_KEY, None)
+    cache = await async_get_result_cache(hass, PROMPT_VERSION)
+    assert await async_get_result_cache(hass, PROMPT_VERSION) is cache
+
+    changed = await async_get_result_cache(hass, "prompt-v2")
+    assert changed is not cache
+    assert hass.data[RESULT_CACHE_KEY] is changed
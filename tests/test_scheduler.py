@@ -0,0 +1,139 @@
+"""Tests for the background scan scheduler."""
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from homeassistant.util import dt
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.hass_ai.const import (
+    CONF_BACKGROUND_SCAN,
+    CONF_BACKGROUND_TOKEN_BUDGET,
+    CONF_CONVERSATION_AGENT,
+    CONF_PROMPT_TOKEN_BUDGET,
+    CONF_SCAN_MODE,
+    DOMAIN,
+    SCAN_MODE_HYBRID,
+)
+from custom_components.hass_ai.exceptions import AgentUnavailableError
+from custom_components.hass_ai.scheduler import BackgroundScanScheduler
+
+NOON = datetime(2024, 1, 1, 12, 0)
+
+
+def _analyzed(days_ago: float, weight: int = 3) -> dict:
+    analyzed_at = dt.utcnow() - timedelta(days=days_ago)
+    return {"overall_weight": weight, "analyzed_at": analyzed_at.isoformat()}
+
+
+def _scheduler(hass, results: dict, interactive: bool = False, **options) -> BackgroundScanScheduler:
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_CONVERSATION_AGENT: "conversation.test", "scan_interval": 7},
+        options=options,
+    )
+    return BackgroundScanScheduler(
+        hass, entry, AsyncMock(return_value={"results": results}), AsyncMock(), lambda: interactive
+    )
+
+
+@pytest.fixture
+def states(hass):
+    hass.states.async_set("sensor.never_analyzed", "1")
+    hass.states.async_set("sensor.old_low", "1")
+    hass.states.async_set("sensor.old_high", "1")
+    hass.states.async_set("sensor.fresh", "1")
+    hass.states.async_set("sensor.offline", "unavailable")
+    hass.states.async_set("persistent_notification.scan", "notifying")
+    return {
+        "sensor.old_low": _analyzed(20, weight=1),
+        "sensor.old_high": _analyzed(20, weight=5),
+        "sensor.fresh": _analyzed(1),
+    }
+
+
+def test_stale_states_stalest_and_most_important_first(hass, states):
+    scheduler = _scheduler(hass, states)
+
+    stale = scheduler._select_stale_states({"results": states})
+
+    assert [state.entity_id for state in stale] == ["sensor.never_analyzed", "sensor.old_high", "sensor.old_low"]
+
+
+@pytest.mark.parametrize(
+    ("start", "end", "hour", "quiet"),
+    [
+        (None, None, 3, False),
+        (1, 6, 3, True),
+        (1, 6, 12, False),
+        (23, 7, 2, True),
+        (23, 7, 23, True),
+        (23, 7, 12, False),
+    ],
+)
+def test_quiet_hours(start, end, hour, quiet):
+    assert BackgroundScanScheduler._in_quiet_hours(NOON.replace(hour=hour), start, end) is quiet
+
+
+async def test_run_rescans_stale_states_with_the_scan_options(hass, states):
+    scheduler = _scheduler(hass, states, **{CONF_SCAN_MODE: SCAN_MODE_HYBRID, CONF_PROMPT_TOKEN_BUDGET: 1500})
+    results = [
+        {"entity_id": "sensor.never_analyzed", "analysis_method": "ai_conversation"},
+        {"entity_id": "sensor.old_high", "analysis_method": "rule_based"},
+        {"entity_id": "sensor.old_low", "analysis_method": "domain_fallback"},
+    ]
+
+    with patch("custom_components.hass_ai.intelligence._estimate_batch_tokens", return_value=100), patch(
+        "custom_components.hass_ai.intelligence.get_entities_importance_batched", AsyncMock(return_value=results)
+    ) as scan:
+        await scheduler.async_run(NOON)
+
+    args, kwargs = scan.call_args
+    assert args[7:9] == ("conversation.test", hass.config.language)
+    assert kwargs["token_budget"] == 1500
+    assert kwargs["preclassify"] is True
+    assert kwargs["max_concurrent_batches"] == 1
+    assert kwargs["use_cache"] is False
+    # Fallbacks are not stored, so the entity stays stale
+    scheduler._store_results.assert_awaited_once_with(results[:2])
+    assert scheduler.last_run["rescanned_entities"] == 2
+    assert scheduler.last_run["stop_reason"] == "done"
+
+
+async def test_run_stops_at_the_token_budget(hass, states):
+    scheduler = _scheduler(hass, states, **{CONF_BACKGROUND_TOKEN_BUDGET: 1000})
+
+    with patch("custom_components.hass_ai.intelligence._estimate_batch_tokens", return_value=5000), patch(
+        "custom_components.hass_ai.intelligence.get_entities_importance_batched", AsyncMock()
+    ) as scan:
+        await scheduler.async_run(NOON)
+
+    scan.assert_not_called()
+    assert scheduler.last_run["stop_reason"] == "token_budget"
+
+
+async def test_run_stops_when_the_agent_is_unavailable(hass, states):
+    scheduler = _scheduler(hass, states)
+    error = AgentUnavailableError("Agent did not answer", "conversation.test")
+
+    with patch("custom_components.hass_ai.intelligence._estimate_batch_tokens", return_value=100), patch(
+        "custom_components.hass_ai.intelligence.get_entities_importance_batched", AsyncMock(side_effect=error)
+    ):
+        await scheduler.async_run(NOON)
+
+    scheduler._store_results.assert_not_called()
+    assert scheduler.last_run["stop_reason"] == "agent_unavailable"
+
+
+async def test_run_skipped_while_disabled_or_interactive(hass, states):
+    disabled = _scheduler(hass, states, **{CONF_BACKGROUND_SCAN: False})
+    interactive = _scheduler(hass, states, interactive=True)
+
+    with patch("custom_components.hass_ai.intelligence.get_entities_importance_batched", AsyncMock()) as scan:
+        await disabled.async_run(NOON)
+        await interactive.async_run(NOON)
+
+    scan.assert_not_called()
+    assert disabled.last_run == interactive.last_run == {}
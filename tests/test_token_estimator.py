@@ -0,0 +1,120 @@
+"""Tests for prompt token estimation."""
+import pytest
+
+from custom_components.hass_ai import token_estimator
+from custom_components.hass_ai.capacity import CAPACITY_KEY, STORAGE_VERSION, AgentCapacityModel
+from custom_components.hass_ai.const import TOKEN_CALIBRATION_MAX, TOKEN_CALIBRATION_SMOOTHING
+from custom_components.hass_ai.token_estimator import (
+    HeuristicTokenEstimator,
+    extract_actual_tokens,
+    get_token_estimator,
+    is_context_length_error,
+    set_token_estimator,
+)
+
+LINE = "sensor.kitchen_temperature: 21.5 °C (Temperatura cucina) [Cucina]"
+
+
+@pytest.fixture
+def estimator():
+    previous = get_token_estimator()
+    estimator = HeuristicTokenEstimator()
+    set_token_estimator(estimator)
+    yield estimator
+    set_token_estimator(previous)
+
+
+def test_estimates(estimator):
+    assert estimator.estimate("") == 0
+    assert estimator.estimate_line("") == 0
+    assert estimator.estimate("Kitchen") == 1
+    assert estimator.estimate("\n\n\n") == 1
+    assert estimator.estimate("🔥") == 2
+    assert estimator.estimate_line(LINE) == estimator.estimate(LINE)
+    assert estimator.estimate(LINE * 10) > estimator.estimate(LINE) * 9
+
+
+def test_calibration_applies_to_cached_lines(estimator):
+    raw = estimator.estimate_line(LINE)
+
+    estimator.observe(LINE, raw * 2)
+
+    assert estimator.calibration == pytest.approx(2.0)
+    assert estimator.estimate_line(LINE) == raw * 2
+    assert estimator.estimate(LINE) == raw * 2
+
+
+def test_observations_are_smoothed_and_outliers_ignored(estimator):
+    raw = estimator.estimate(LINE)
+    estimator.observe(LINE, raw)
+    assert estimator.calibration == pytest.approx(1.0)
+
+    # Mostly the agent's own system prompt
+    estimator.observe(LINE, raw * (TOKEN_CALIBRATION_MAX + 1))
+    assert estimator.calibration == pytest.approx(1.0)
+
+    estimator.observe(LINE, raw * 2)
+    assert estimator.calibration == pytest.approx(1.0 + TOKEN_CALIBRATION_SMOOTHING)
+    assert estimator.get_stats()["observations"] == 2
+
+
+def test_state_round_trip(estimator):
+    estimator.observe(LINE, round(estimator.estimate(LINE) * 1.5))
+    restored = HeuristicTokenEstimator()
+
+    restored.restore_state(estimator.get_state())
+
+    assert restored.calibration == estimator.calibration
+    assert restored.observations == 1
+
+
+def test_restore_ignores_invalid_state(estimator):
+    estimator.restore_state({"calibration": TOKEN_CALIBRATION_MAX * 10, "observations": 3})
+    estimator.restore_state({"calibration": "fast"})
+
+    assert estimator.calibration == 1.0
+    assert estimator.observations == 0
+
+
+async def test_calibration_is_saved_with_the_capacity_model(hass, hass_storage, estimator):
+    estimator.observe(LINE, round(estimator.estimate(LINE) * 1.5))
+    saved = AgentCapacityModel(hass)._data_to_save()
+    assert saved["token_estimators"]["heuristic"] == estimator.get_state()
+
+    set_token_estimator(HeuristicTokenEstimator())
+    hass_storage[CAPACITY_KEY] = {"version": STORAGE_VERSION, "key": CAPACITY_KEY, "data": saved}
+    await AgentCapacityModel(hass).async_load()
+
+    assert token_estimator.get_token_estimator().calibration == estimator.calibration
+
+
+@pytest.mark.parametrize(
+    ("error_text", "tokens"),
+    [
+        ("This model's maximum context length is 4097 tokens. However, your messages resulted in 5120 tokens.", 5120),
+        ("maximum context length is 8192 tokens, however you requested 9000 tokens", 9000),
+        ("the request exceeds the available context size (n_prompt_tokens = 4500, n_ctx = 4096)", 4500),
+        ("prompt is too long: 210000 tokens > 200000 maximum", 210000),
+        ("Error: context length exceeded", None),
+        ("", None),
+    ],
+)
+def test_extract_actual_tokens(error_text, tokens):
+    assert extract_actual_tokens(error_text) == tokens
+
+
+@pytest.mark.parametrize(
+    ("error_text", "context_error"),
+    [
+        ("This model's maximum context length is 4097 tokens", True),
+        ("Input too large for the context window", True),
+        ("Too many tokens in the request", True),
+        ("n_prompt_tokens = 4500", True),
+        ("Rate limit reached, please retry later", False),
+        ("Invalid API token", False),
+        ("Sorry, I had a problem talking to the model", False),
+        ("", False),
+    ],
+)
+def test_is_context_length_error(error_text, context_error):
+    assert is_context_length_error(error_text) is context_error
@@ -0,0 +1,114 @@
+"""Tests for the batch worker pool of get_entities_importance_batched."""
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from homeassistant.core import State
+
+from custom_components.hass_ai.const import AI_PROVIDER_LOCAL
+from custom_components.hass_ai.exceptions import AgentUnavailableError
+from custom_components.hass_ai.intelligence import get_entities_importance_batched
+
+AGENT_ID = "conversation.test_agent"
+ENTITY_IDS = [f"sensor.pool_{index:02d}" for index in range(12)]
+
+
+class FakeAgent:
+    """Stand-in for _query_local_agent that answers every entity of the prompt."""
+
+    def __init__(self, max_entities=None, failures=0, latency=0.01):
+        self.max_entities = max_entities
+        self.failures = failures
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, hass, prompt, conversation_agent=None, *args, served=None, **kwargs):
+        if served is not None:
+            served.update(agent_id=conversation_agent, latency=self.latency)
+        entity_ids = [entity_id for entity_id in ENTITY_IDS if entity_id in prompt]
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        if self.failures:
+            self.failures -= 1
+            raise AgentUnavailableError("Agent did not answer", conversation_agent)
+        if self.max_entities is not None and len(entity_ids) > self.max_entities:
+            return "Error: context length exceeded, too many tokens in the prompt"
+        return json.dumps([
+            {"entity_id": entity_id, "rating": 3, "reason": "Useful sensor", "category": ["DATA"], "management_type": "USER"}
+            for entity_id in entity_ids
+        ])
+
+
+def _states() -> list[State]:
+    return [State(entity_id, "21.5", {"friendly_name": entity_id.split(".")[1]}) for entity_id in ENTITY_IDS]
+
+
+async def _scan(hass, agent: FakeAgent, batch_size: int, max_concurrent_batches: int) -> list[dict]:
+    with patch("custom_components.hass_ai.intelligence._query_local_agent", agent), patch(
+        "custom_components.hass_ai.intelligence._get_ai_logger", return_value=MagicMock()
+    ):
+        return await get_entities_importance_batched(
+            hass, _states(), batch_size, AI_PROVIDER_LOCAL, None, None, None, AGENT_ID, "en",
+            max_concurrent_batches=max_concurrent_batches,
+            use_cache=False,
+        )
+
+
+def _assert_all_analyzed(results: list[dict]) -> None:
+    assert sorted(result["entity_id"] for result in results) == ENTITY_IDS
+    assert all(result["analysis_method"] == "ai_conversation" for result in results)
+
+
+async def test_batches_in_flight_stay_within_the_limit(hass):
+    """Workers send up to max_concurrent_batches batches at once, never more."""
+    agent = FakeAgent(latency=0.05)
+
+    results = await _scan(hass, agent, batch_size=2, max_concurrent_batches=3)
+
+    _assert_all_analyzed(results)
+    assert agent.max_in_flight == 3
+    assert agent.calls == len(ENTITY_IDS) // 2
+
+
+async def test_scan_ends_after_bisecting_oversized_batches(hass):
+    """Batches over the agent's context are split until they fit, and the workers then stop."""
+    agent = FakeAgent(max_entities=2)
+
+    results = await asyncio.wait_for(_scan(hass, agent, batch_size=12, max_concurrent_batches=4), timeout=10)
+
+    _assert_all_analyzed(results)
+    assert agent.max_in_flight <= 4
+
+
+async def test_scan_ends_after_requeuing_an_unanswered_batch(hass):
+    """A batch the agent did not answer is queued again and analyzed once the agent is back."""
+    agent = FakeAgent(failures=1)
+
+    with patch("custom_components.hass_ai.intelligence.AGENT_UNAVAILABLE_RETRY_DELAY", 0.01):
+        results = await asyncio.wait_for(_scan(hass, agent, batch_size=4, max_concurrent_batches=2), timeout=10)
+
+    _assert_all_analyzed(results)
+    assert agent.calls == len(ENTITY_IDS) // 4 + 1
+
+
+async def test_scan_stops_when_the_agent_stays_unavailable(hass):
+    """After AGENT_UNAVAILABLE_MAX_WAIT without answers the scan raises instead of padding with fallbacks."""
+    agent = FakeAgent(failures=1000)
+
+    with patch("custom_components.hass_ai.intelligence.AGENT_UNAVAILABLE_RETRY_DELAY", 0.01), patch(
+        "custom_components.hass_ai.intelligence.AGENT_UNAVAILABLE_MAX_WAIT", 0.1
+    ):
+        with pytest.raises(AgentUnavailableError):
+            await asyncio.wait_for(_scan(hass, agent, batch_size=4, max_concurrent_batches=2), timeout=10)
+
+    assert agent.calls > 2